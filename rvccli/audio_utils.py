@@ -1,64 +1,369 @@
 import os
 import subprocess
 import numpy as np
-import soundfile as sf
-import pyloudnorm as pyln
-import webrtcvad
-from pydub import AudioSegment
-from typing import List
+from typing import List, Tuple, Iterator, Optional
 import wave
 import contextlib
+from concurrent.futures import ThreadPoolExecutor
 
-def convert_to_32k_mono(input_path: str, output_path: str):
-    """ffmpegで32kHz/mono変換"""
-    cmd = [
-        "ffmpeg", "-y", "-i", input_path,
-        "-ar", "32000", "-ac", "1", output_path
+from .cache import get_cache_dir, file_sha256, atomic_write
+
+# soundfile・pyloudnorm（scipy）・webrtcvad・pydubは読み込みに時間がかかるため、使う関数の中でimportする
+
+def float_to_int16(audio: np.ndarray) -> np.ndarray:
+    """float32バッファ（-1.0〜1.0）をint16に変換"""
+    return np.clip(np.round(audio * 32768.0), -32768, 32767).astype(np.int16)
+
+def int16_to_float(audio: np.ndarray) -> np.ndarray:
+    """int16バッファをfloat32（-1.0〜1.0）に変換"""
+    out = audio.astype(np.float32)
+    out /= 32768.0
+    return out
+
+# ffmpegが出力する生PCM形式と対応するdtype
+PCM_FORMATS = {
+    's16le': np.int16,
+    'f32le': np.float32,
+}
+
+def _ffmpeg_decode_cmd(input_path: str, sample_rate: int, channels: int, pcm_format: str) -> List[str]:
+    """生PCMを標準出力へ書き出すffmpegコマンドを構築"""
+    if pcm_format not in PCM_FORMATS:
+        raise ValueError(f"未対応のPCM形式です: {pcm_format}")
+    return [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error",
+        "-i", input_path,
+        "-ar", str(sample_rate), "-ac", str(channels),
+        "-f", pcm_format, "-acodec", f"pcm_{pcm_format}", "pipe:1"
     ]
-    subprocess.run(cmd, check=True)
 
-def trim_silence_vad(input_path: str, output_path: str, aggressiveness: int = 2):
-    """webrtcvadで無音トリム"""
+def _pcm_to_float(raw, channels: int, pcm_format: str) -> np.ndarray:
+    """生PCMバイト列をfloat32配列（-1.0〜1.0）に変換"""
+    audio = np.frombuffer(raw, dtype=PCM_FORMATS[pcm_format])
+    if pcm_format == 's16le':
+        audio = int16_to_float(audio)
+    if channels > 1:
+        audio = audio.reshape(-1, channels)
+    return audio
+
+def decode_to_array(input_path: str, sample_rate: int = 32000, channels: int = 1,
+                    pcm_format: str = 's16le') -> Tuple[np.ndarray, int]:
+    """ffmpegの標準出力から生PCMを直接NumPy配列に読み込む（中間WAVなし）"""
+    cmd = _ffmpeg_decode_cmd(input_path, sample_rate, channels, pcm_format)
+    result = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return _pcm_to_float(result.stdout, channels, pcm_format), sample_rate
+
+def read_pcm_blocks(stream, block_size: int, channels: int = 1,
+                    pcm_format: str = 's16le') -> Iterator[np.ndarray]:
+    """バイナリストリーム（パイプ・FIFO・標準入力）から生PCMをblock_sizeサンプルずつ読むジェネレータ
+
+    ブロックが揃うまで読み続け、最後のブロックだけはblock_sizeより短い場合がある。
+    """
+    if pcm_format not in PCM_FORMATS:
+        raise ValueError(f"未対応のPCM形式です: {pcm_format}")
+    frame_bytes = np.dtype(PCM_FORMATS[pcm_format]).itemsize * channels
+    block_bytes = block_size * frame_bytes
+    while True:
+        # ブロックごとに新しいバッファへ読み込み、コピーせずに配列化する
+        buf = bytearray(block_bytes)
+        view = memoryview(buf)
+        filled = 0
+        while filled < block_bytes:
+            n = stream.readinto(view[filled:])
+            if not n:
+                break
+            filled += n
+        filled -= filled % frame_bytes
+        if filled:
+            yield _pcm_to_float(view[:filled], channels, pcm_format)
+        if filled < block_bytes:
+            break
+
+def float_to_pcm(audio: np.ndarray, pcm_format: str = 's16le') -> bytes:
+    """float32配列を生PCMバイト列に変換"""
+    if pcm_format == 's16le':
+        return float_to_int16(audio).astype('<i2', copy=False).tobytes()
+    if pcm_format == 'f32le':
+        return np.asarray(audio, dtype='<f4').tobytes()
+    raise ValueError(f"未対応のPCM形式です: {pcm_format}")
+
+def iter_decode_blocks(input_path: str, block_size: int = 32000 * 10, sample_rate: int = 32000,
+                       channels: int = 1, pcm_format: str = 's16le') -> Iterator[np.ndarray]:
+    """ffmpegの出力をblock_sizeサンプルずつfloat32配列として返すジェネレータ
+
+    デコード完了を待たずに後段の処理を開始でき、メモリ使用量はブロックサイズに比例する。
+    最後のブロックはblock_sizeより短い場合がある。
+    """
+    import tempfile
+    cmd = _ffmpeg_decode_cmd(input_path, sample_rate, channels, pcm_format)
+
+    # stderrをパイプにすると、壊れたファイルでエラー出力がパイプの容量を超えたときに
+    # ffmpeg（stderrへの書き込み）とこちら（stdoutの読み込み）が互いを待って止まるため、一時ファイルに書かせる
+    with tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        try:
+            yield from read_pcm_blocks(proc.stdout, block_size, channels, pcm_format)
+
+            if proc.wait() != 0:
+                stderr_file.seek(0)
+                raise subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr_file.read())
+        finally:
+            # 途中で打ち切られた場合もffmpegを確実に終了させる
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+def convert_to_32k_mono(input_path: str, output_path: str):
+    """ffmpegで32kHz/mono変換（互換用: decode_to_arrayの結果をWAVに書き出す）"""
+    audio, sample_rate = decode_to_array(input_path, 32000)
+    with wave.open(output_path, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(float_to_int16(audio).tobytes())
+
+# VADの設定
+VAD_BACKENDS = ('webrtc', 'numpy')
+VAD_FRAME_SEC = 0.03
+# webrtcvadに渡す前に明らかな無音として除外するフレームエネルギー（dBFS）
+VAD_ENERGY_GATE_DB = -60.0
+# 無音区間のうちwebrtcvadに渡し続ける先頭フレーム数
+VAD_GATE_WARMUP_FRAMES = 10
+# numpyバックエンドの判定閾値（アグレッシブネス0〜3）
+_NUMPY_VAD_MARGIN_DB = (3.0, 4.5, 6.0, 9.0)
+_NUMPY_VAD_FLATNESS = (0.5, 0.4, 0.3, 0.2)
+_NUMPY_VAD_BAND_RATIO = (0.3, 0.4, 0.5, 0.6)
+# VADで一度に変換・FFTを行うフレーム数（メモリ使用量の上限）
+_VAD_BATCH = 2048
+
+def check_vad_params(aggressiveness: int, backend: str):
+    """VADのアグレッシブネス（0〜3）とバックエンド名を検証する"""
+    if backend not in VAD_BACKENDS:
+        raise ValueError(f"未対応のVADバックエンドです: {backend}")
+    # numpyバックエンドでは負の値が閾値の表を末尾から参照してしまうため、webrtcvadと同じ範囲に制限する
+    if not 0 <= aggressiveness <= 3:
+        raise ValueError(f"VADアグレッシブネスは0から3の範囲である必要があります: {aggressiveness}")
+
+def frame_signal(audio: np.ndarray, frame_size: int) -> np.ndarray:
+    """信号を重なりのないフレームに分割した2次元ビューを返す（末尾の端数は捨てる）"""
+    n_frames = len(audio) // frame_size
+    if n_frames == 0:
+        return np.zeros((0, frame_size), dtype=audio.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(audio[:n_frames * frame_size], frame_size)
+    return windows[::frame_size]
+
+def frame_energy_db(frames: np.ndarray) -> np.ndarray:
+    """フレームごとのRMSエネルギー（dBFS）"""
+    # einsumで行ごとの二乗和を求め、信号全体の一時コピーを作らない
+    power = np.einsum('ij,ij->i', frames, frames) / max(frames.shape[1], 1)
+    return 10.0 * np.log10(power + 1e-12)
+
+def _webrtc_classify(frames: np.ndarray, sample_rate: int, vad, energy_gate_db: Optional[float],
+                     silent_run: int = 0) -> Tuple[np.ndarray, int]:
+    """フレーム列をwebrtcvadで判定し、(マスク, 末尾の無音フレーム連続数)を返す
+
+    silent_runは直前のフレームまでの無音連続数で、ブロック単位で続けて判定する際に引き継ぐ。
+    """
+    mask = np.zeros(len(frames), dtype=bool)
+    if len(frames) == 0:
+        return mask, silent_run
+
+    if energy_gate_db is None:
+        candidates = np.arange(len(frames))
+        silent_run = 0
+    else:
+        # webrtcvadは内部状態（ノイズ推定・ハングオーバー）を持つため、無音区間の先頭数フレームは
+        # そのまま渡し、それ以降の明らかな無音フレームのみ判定を省略する
+        silent = frame_energy_db(frames) <= energy_gate_db
+        index = np.arange(len(frames))
+        run_begins = silent & ~np.r_[silent_run > 0, silent[:-1]]
+        run_start = np.maximum.accumulate(np.where(run_begins, index, -silent_run))
+        skip = silent & (index - run_start >= VAD_GATE_WARMUP_FRAMES)
+        candidates = np.flatnonzero(~skip)
+        silent_run = int(len(frames) - run_start[-1]) if silent[-1] else 0
+
+    # int16への変換はバッチ単位で行い、信号全体のコピーを作らない
+    for batch_start in range(0, len(frames), _VAD_BATCH):
+        batch_end = batch_start + _VAD_BATCH
+        pcm_frames = float_to_int16(frames[batch_start:batch_end])
+        lo, hi = np.searchsorted(candidates, [batch_start, batch_end])
+        for i in candidates[lo:hi]:
+            mask[i] = vad.is_speech(pcm_frames[i - batch_start].tobytes(), sample_rate)
+    return mask, silent_run
+
+def _webrtc_speech_mask(audio: np.ndarray, sample_rate: int, aggressiveness: int,
+                        energy_gate_db: float) -> np.ndarray:
+    """webrtcvadでフレームごとの音声判定（明らかな無音フレームは事前に除外）"""
+    import webrtcvad
+    frames = frame_signal(audio, int(sample_rate * VAD_FRAME_SEC))
+    vad = webrtcvad.Vad(aggressiveness)
+    return _webrtc_classify(frames, sample_rate, vad, energy_gate_db)[0]
+
+def _numpy_speech_mask(audio: np.ndarray, sample_rate: int, aggressiveness: int) -> np.ndarray:
+    """エネルギーとスペクトル特徴によるベクトル化した音声判定"""
+    frames = frame_signal(audio, int(sample_rate * VAD_FRAME_SEC))
+    return _numpy_classify(frames, sample_rate, aggressiveness)
+
+def _numpy_classify(frames: np.ndarray, sample_rate: int, aggressiveness: int) -> np.ndarray:
+    """フレーム列をエネルギーとスペクトル特徴で判定"""
+    if len(frames) == 0:
+        return np.zeros(0, dtype=bool)
+    frame_size = frames.shape[1]
+
+    energy_db = frame_energy_db(frames)
+
+    # ノイズフロア（下位10%）からの相対閾値と絶対閾値で候補フレームを絞り込む
+    noise_floor = np.percentile(energy_db, 10)
+    threshold = max(noise_floor + _NUMPY_VAD_MARGIN_DB[aggressiveness], VAD_ENERGY_GATE_DB)
+    candidates = np.flatnonzero(energy_db > threshold)
+
+    # 候補フレームのみ音声帯域（300〜4000Hz）のエネルギー比とスペクトル平坦度を計算
+    window = np.hanning(frame_size).astype(np.float32)
+    freqs = np.fft.rfftfreq(frame_size, 1.0 / sample_rate)
+    band = (freqs >= 300.0) & (freqs <= 4000.0)
+    mask = np.zeros(len(frames), dtype=bool)
+    for i in range(0, len(candidates), _VAD_BATCH):
+        index = candidates[i:i + _VAD_BATCH]
+        spec = np.fft.rfft(frames[index] * window, axis=1)
+        power = spec.real ** 2 + spec.imag ** 2 + 1e-12
+        band_power = power[:, band]
+        band_ratio = band_power.sum(axis=1) / power.sum(axis=1)
+        flatness = np.exp(np.mean(np.log(band_power), axis=1)) / np.mean(band_power, axis=1)
+        mask[index] = ((band_ratio > _NUMPY_VAD_BAND_RATIO[aggressiveness])
+                       & (flatness < _NUMPY_VAD_FLATNESS[aggressiveness]))
+
+    # 前後フレームとの多数決で単発の判定揺れを除去
+    if len(mask) >= 3:
+        votes = np.convolve(mask.astype(np.int8), np.ones(3, dtype=np.int8), mode='same')
+        mask = votes >= 2
+    return mask
+
+def compute_speech_mask(audio: np.ndarray, sample_rate: int, aggressiveness: int = 2,
+                        backend: str = 'webrtc', energy_gate_db: float = VAD_ENERGY_GATE_DB) -> np.ndarray:
+    """30msフレームごとの音声判定マスクを返す
+
+    backend: 'webrtc'（webrtcvad, エネルギーによる事前除外付き）または'numpy'（ベクトル化実装）
+    """
+    check_vad_params(aggressiveness, backend)
+    if backend == 'webrtc':
+        return _webrtc_speech_mask(audio, sample_rate, aggressiveness, energy_gate_db)
+    return _numpy_speech_mask(audio, sample_rate, aggressiveness)
+
+# VADマスクのキャッシュ形式のバージョン（判定アルゴリズムを変えたら上げる）
+VAD_CACHE_VERSION = 1
+
+def _speech_mask_cache_path(content_hash: str, sample_rate: int, aggressiveness: int, backend: str,
+                            block_size: int = 0) -> str:
+    """VADマスクのキャッシュファイルパス（内容ハッシュ・判定したサンプリングレート・バックエンド・アグレッシブネスで識別）
+
+    block_sizeはStreamingVADのブロックごとに判定したマスク（numpyバックエンドは一括判定と結果が異なる）を区別する。
+    """
+    cache_dir = get_cache_dir("vad", content_hash[:2])
+    block = f"_b{block_size}" if block_size else ""
+    return os.path.join(cache_dir, f"{content_hash}_{sample_rate}_{backend}_a{aggressiveness}{block}"
+                                   f"_v{VAD_CACHE_VERSION}.npz")
+
+def load_cached_speech_mask(content_hash: str, sample_rate: int, aggressiveness: int = 2,
+                            backend: str = 'webrtc', block_size: int = 0) -> Optional[np.ndarray]:
+    """キャッシュ済みのVADマスクを読み込む（なければNone）
+
+    判定結果はサンプリングレートによって変わる（webrtcvadは対応しないレートもある）ため、
+    同じレートで計算したマスクだけを返す。
+    """
+    path = _speech_mask_cache_path(content_hash, sample_rate, aggressiveness, backend, block_size)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if int(data['sample_rate']) != sample_rate:
+                return None
+            n_frames = int(data['n_frames'])
+            return np.unpackbits(data['packed'], count=n_frames).astype(bool)
+    except Exception:
+        # 壊れたキャッシュは無視して再計算させる
+        return None
+
+def save_cached_speech_mask(content_hash: str, mask: np.ndarray, sample_rate: int,
+                            aggressiveness: int = 2, backend: str = 'webrtc', block_size: int = 0):
+    """VADマスクをビットパックしてキャッシュに保存"""
+    path = _speech_mask_cache_path(content_hash, sample_rate, aggressiveness, backend, block_size)
+    with atomic_write(path) as f:
+        np.savez(f, packed=np.packbits(mask), n_frames=len(mask),
+                 sample_rate=sample_rate, frame_sec=VAD_FRAME_SEC)
+
+def get_speech_mask(audio: np.ndarray, sample_rate: int, aggressiveness: int = 2,
+                    backend: str = 'webrtc', content_hash: str = None) -> np.ndarray:
+    """VADマスクを返す（content_hash指定時は同じサンプリングレートのキャッシュを再利用し、なければ計算して保存）
+
+    キャッシュのフレーム数はデコード後の長さに合わせて調整する。
+    """
+    check_vad_params(aggressiveness, backend)
+    n_frames = len(audio) // int(sample_rate * VAD_FRAME_SEC)
+    if content_hash:
+        mask = load_cached_speech_mask(content_hash, sample_rate, aggressiveness, backend)
+        if mask is not None:
+            if len(mask) >= n_frames:
+                return mask[:n_frames]
+            return np.concatenate([mask, np.zeros(n_frames - len(mask), dtype=bool)])
+
+    mask = compute_speech_mask(audio, sample_rate, aggressiveness, backend)
+    if content_hash:
+        save_cached_speech_mask(content_hash, mask, sample_rate, aggressiveness, backend)
+    return mask
+
+def mask_to_segments(mask: np.ndarray, min_speech_duration: float = 0.5) -> List[tuple]:
+    """音声マスクから連続する音声区間（秒）を求める"""
+    padded = np.concatenate(([False], mask, [False])).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    segments = []
+    for start_frame, end_frame in zip(starts, ends):
+        duration = (end_frame - start_frame) * VAD_FRAME_SEC  # 秒単位
+        if duration >= min_speech_duration:
+            segments.append((start_frame * VAD_FRAME_SEC, end_frame * VAD_FRAME_SEC))
+    return segments
+
+def trim_silence_array(audio: np.ndarray, sample_rate: int, aggressiveness: int = 2,
+                       backend: str = 'webrtc', mask: np.ndarray = None) -> np.ndarray:
+    """VADで無音トリム（float32配列版）
+
+    maskを渡した場合はVADを実行せずにそのマスクを使う。
+    音声が検出されなかった場合は空の配列を返す。
+    """
+    if mask is None:
+        mask = compute_speech_mask(audio, sample_rate, aggressiveness, backend)
+    frame_size = int(sample_rate * VAD_FRAME_SEC)
+    
+    # 音声フレームのみを結合
+    return frame_signal(audio, frame_size)[mask].reshape(-1)
+
+def trim_silence_vad(input_path: str, output_path: str, aggressiveness: int = 2,
+                     backend: str = 'webrtc'):
+    """VADで無音トリム"""
     # 音声ファイルを読み込み
     with wave.open(input_path, 'rb') as wf:
         sample_rate = wf.getframerate()
         frames = wf.readframes(wf.getnframes())
         audio_data = np.frombuffer(frames, dtype=np.int16)
     
-    # VADの初期化
-    vad = webrtcvad.Vad(aggressiveness)
-    
-    # フレームサイズ（30ms）
-    frame_size = int(sample_rate * 0.03)
-    
-    # 音声フレームを分割してVAD処理
-    voice_frames = []
-    for i in range(0, len(audio_data), frame_size):
-        frame = audio_data[i:i + frame_size]
-        if len(frame) == frame_size:  # 完全なフレームのみ処理
-            is_speech = vad.is_speech(frame.tobytes(), sample_rate)
-            if is_speech:
-                voice_frames.append(frame)
-    
-    if not voice_frames:
+    trimmed_audio = trim_silence_array(int16_to_float(audio_data), sample_rate, aggressiveness, backend)
+    if trimmed_audio.size == 0:
         print("音声が検出されませんでした")
         return
     
-    # 音声フレームを結合
-    trimmed_audio = np.concatenate(voice_frames)
-    
     # 出力ファイルに保存
     with wave.open(output_path, 'wb') as wf:
         wf.setnchannels(1)
         wf.setsampwidth(2)
         wf.setframerate(sample_rate)
-        wf.writeframes(trimmed_audio.astype(np.int16).tobytes())
+        wf.writeframes(float_to_int16(trimmed_audio).tobytes())
 
-def normalize_lufs(input_path: str, output_path: str, target_lufs: float = -23.0):
-    """pyloudnormで-23LUFS正規化"""
-    # 音声ファイルを読み込み
-    audio, sample_rate = sf.read(input_path)
-    
+def normalize_lufs_array(audio: np.ndarray, sample_rate: int, target_lufs: float = -23.0) -> np.ndarray:
+    """pyloudnormで-23LUFS正規化（float32配列版）"""
+    import pyloudnorm as pyln
     # ステレオの場合はモノラルに変換
     if len(audio.shape) > 1:
         audio = np.mean(audio, axis=1)
@@ -68,98 +373,371 @@ def normalize_lufs(input_path: str, output_path: str, target_lufs: float = -23.0
     current_lufs = meter.integrated_loudness(audio)
     
     # 目標LUFSに正規化
-    normalized_audio = pyln.loudness.normalize.loudness(audio, current_lufs, target_lufs)
+    normalized_audio = pyln.normalize.loudness(audio, current_lufs, target_lufs)
+    return normalized_audio.astype(np.float32, copy=False)
+
+def normalize_lufs(input_path: str, output_path: str, target_lufs: float = -23.0):
+    """pyloudnormで-23LUFS正規化"""
+    import soundfile as sf
+    # 音声ファイルを読み込み
+    audio, sample_rate = sf.read(input_path, dtype='float32')
+    
+    normalized_audio = normalize_lufs_array(audio, sample_rate, target_lufs)
     
     # 出力ファイルに保存
-    sf.write(output_path, normalized_audio, sample_rate)
+    sf.write(output_path, normalized_audio, sample_rate, subtype='PCM_16')
+
+def chunk_boundaries(n_samples: int, sample_rate: int, chunk_sec: float = 12.0,
+                     snap_points: np.ndarray = None, snap_window_sec: float = 1.0) -> List[Tuple[int, int]]:
+    """chunk_sec秒ごとの(開始, 終了)サンプル位置のリスト
+
+    snap_pointsを渡した場合、各分割位置を±snap_window_sec以内で最も近いスナップ点（無音位置）に移動する。
+    """
+    # チャンクサイズをサンプル数に変換（ミリ秒単位に丸めてsplit_audioと揃える）
+    chunk_samples = int(chunk_sec * 1000) * sample_rate // 1000
+    if snap_points is None or len(snap_points) == 0:
+        return [(i, min(i + chunk_samples, n_samples)) for i in range(0, n_samples, chunk_samples)]
+
+    snap_points = np.sort(np.asarray(snap_points))
+    window = int(snap_window_sec * sample_rate)
+    bounds = []
+    start = 0
+    while start < n_samples:
+        end = start + chunk_samples
+        if end >= n_samples:
+            end = n_samples
+        else:
+            # 目標位置の前後で最も近いスナップ点を探す
+            i = np.searchsorted(snap_points, end)
+            candidates = [int(snap_points[j]) for j in (i - 1, i) if 0 <= j < len(snap_points)]
+            candidates = [p for p in candidates if start < p < n_samples and abs(p - end) <= window]
+            if candidates:
+                end = min(candidates, key=lambda p: abs(p - end))
+        bounds.append((start, end))
+        start = end
+    return bounds
 
-def split_audio(input_path: str, out_dir: str, chunk_sec: float = 12.0) -> List[str]:
-    """約12秒ごとに分割"""
+def silence_snap_points(mask: np.ndarray, frame_size: int, trimmed: bool = False) -> np.ndarray:
+    """VADマスクから分割に適した位置（サンプル）を求める
+
+    trimmed=Trueの場合はマスクでトリムした後の音声上の位置（除去した無音区間のつなぎ目）を、
+    Falseの場合は非音声フレームの中央を返す。
+    """
+    if trimmed:
+        kept_frames = np.flatnonzero(mask)
+        joins = np.flatnonzero(np.diff(kept_frames) > 1) + 1
+        return joins * frame_size
+    return np.flatnonzero(~mask) * frame_size + frame_size // 2
+
+def write_chunks(audio: np.ndarray, sample_rate: int, out_dir: str,
+                 bounds: List[Tuple[int, int]], subtype: str = 'PCM_16', workers: int = 1) -> List[str]:
+    """指定した(開始, 終了)位置でチャンクをchunk_XXXX.wavとして書き出す
+
+    各チャンクはコピーせずにビューのまま書き出す。workers>1の場合はスレッドプールで並列に書き出す。
+    """
+    import soundfile as sf
     # 出力ディレクトリを作成
     os.makedirs(out_dir, exist_ok=True)
+    chunks = [os.path.join(out_dir, f"chunk_{i:04d}.wav") for i in range(len(bounds))]
     
-    # 音声ファイルを読み込み
-    audio = AudioSegment.from_file(input_path)
+    def write(i):
+        start, end = bounds[i]
+        sf.write(chunks[i], audio[start:end], sample_rate, subtype=subtype)
     
-    # チャンクサイズをミリ秒に変換
-    chunk_ms = int(chunk_sec * 1000)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(write, range(len(bounds))))
+    else:
+        for i in range(len(bounds)):
+            write(i)
     
-    # 音声を分割
-    chunks = []
-    for i in range(0, len(audio), chunk_ms):
-        chunk = audio[i:i + chunk_ms]
-        
-        # 出力ファイル名を生成
-        chunk_filename = f"chunk_{i//chunk_ms:04d}.wav"
-        chunk_path = os.path.join(out_dir, chunk_filename)
-        
-        # チャンクを保存
-        chunk.export(chunk_path, format="wav")
-        chunks.append(chunk_path)
+    return chunks
+
+def split_audio_array(audio: np.ndarray, sample_rate: int, out_dir: str, chunk_sec: float = 12.0,
+                      snap_points: np.ndarray = None, workers: int = 1) -> List[str]:
+    """約12秒ごとに分割（float32配列版）"""
+    bounds = chunk_boundaries(len(audio), sample_rate, chunk_sec, snap_points)
+    return write_chunks(audio, sample_rate, out_dir, bounds, workers=workers)
+
+def trimmed_to_source(positions: np.ndarray, mask: np.ndarray, frame_size: int) -> np.ndarray:
+    """トリム後のサンプル位置を、トリム前（元音声）のサンプル位置に変換"""
+    positions = np.asarray(positions)
+    kept_frames = np.flatnonzero(mask)
+    return kept_frames[positions // frame_size] * frame_size + positions % frame_size
+
+def split_audio(input_path: str, out_dir: str, chunk_sec: float = 12.0,
+                snap_to_silence: bool = False, workers: int = 1) -> List[str]:
+    """約12秒ごとに分割
+
+    ファイル全体を元のサンプル形式のまま読み込み、配列のビューをsoundfileで書き出す。
+    snap_to_silenceがTrueの場合、分割位置をVADで検出した無音に合わせる。
+    """
+    import soundfile as sf
+    info = sf.info(input_path)
+    subtype = info.subtype if info.subtype in ('PCM_16', 'PCM_24', 'PCM_32', 'FLOAT') else 'PCM_16'
+    dtype = 'int16' if subtype == 'PCM_16' else 'float32'
+    audio, sample_rate = sf.read(input_path, dtype=dtype)
+    
+    snap_points = None
+    if snap_to_silence:
+        mono = audio if audio.ndim == 1 else audio.mean(axis=1)
+        if dtype == 'int16':
+            mono = int16_to_float(mono)
+        # webrtcvadは8/16/32/48kHzのみ対応のため、それ以外はnumpyバックエンドを使う
+        backend = 'webrtc' if sample_rate in (8000, 16000, 32000, 48000) else 'numpy'
+        mask = get_speech_mask(mono.astype(np.float32, copy=False), sample_rate, backend=backend)
+        snap_points = silence_snap_points(mask, int(sample_rate * VAD_FRAME_SEC))
     
+    bounds = chunk_boundaries(len(audio), sample_rate, chunk_sec, snap_points)
+    return write_chunks(audio, sample_rate, out_dir, bounds, subtype, workers)
+
+def iter_frames(blocks: Iterator[np.ndarray], frame_size: int) -> Iterator[np.ndarray]:
+    """任意長のブロック列を、フレーム境界に揃えた2次元フレーム配列の列に変換
+
+    フレームに満たない端数は次のブロックに繰り越し、最後の端数は捨てる（トリムと同じ扱い）。
+    """
+    remainder = np.zeros(0, dtype=np.float32)
+    for block in blocks:
+        if len(remainder):
+            block = np.concatenate([remainder, block])
+        n = len(block) // frame_size * frame_size
+        remainder = block[n:].copy()
+        if n:
+            yield block[:n].reshape(-1, frame_size)
+
+class StreamingVAD:
+    """ブロック単位で音声判定を行うVAD
+
+    webrtcバックエンドは判定器の状態と無音連続数を引き継ぐため、一括処理と同じ結果になる。
+    numpyバックエンドはブロックごとにノイズフロアを推定する。
+    """
+
+    def __init__(self, sample_rate: int, aggressiveness: int = 2, backend: str = 'webrtc',
+                 energy_gate_db: float = VAD_ENERGY_GATE_DB):
+        check_vad_params(aggressiveness, backend)
+        self.sample_rate = sample_rate
+        self.aggressiveness = aggressiveness
+        self.backend = backend
+        self.energy_gate_db = energy_gate_db
+        self._vad = None
+        if backend == 'webrtc':
+            import webrtcvad
+            self._vad = webrtcvad.Vad(aggressiveness)
+        self._silent_run = 0
+
+    def process(self, frames: np.ndarray) -> np.ndarray:
+        """フレーム配列（iter_framesの出力）を判定してマスクを返す"""
+        if self.backend == 'webrtc':
+            mask, self._silent_run = _webrtc_classify(frames, self.sample_rate, self._vad,
+                                                      self.energy_gate_db, self._silent_run)
+            return mask
+        return _numpy_classify(frames, self.sample_rate, self.aggressiveness)
+
+# BS.1770のKフィルタ（高域シェルフ +4dB/1500Hz と 38Hzのハイパス, pyloudnormの既定と同じ設計値）
+_K_SHELF = (4.0, 1 / np.sqrt(2), 1500.0)
+_K_HIGH_PASS = (0.5, 38.0)
+
+def k_weighting_filters(sample_rate: int) -> List[tuple]:
+    """Kフィルタの2つのバイカッド（b, a）を、サンプリングレートに合わせてRBJ cookbookの式で求める"""
+    gain_db, q, fc = _K_SHELF
+    A = 10 ** (gain_db / 40.0)
+    w0 = 2.0 * np.pi * fc / sample_rate
+    cos, alpha = np.cos(w0), np.sin(w0) / (2.0 * q)
+    shelf_b = np.array([A * ((A + 1) + (A - 1) * cos + 2 * np.sqrt(A) * alpha),
+                        -2 * A * ((A - 1) + (A + 1) * cos),
+                        A * ((A + 1) + (A - 1) * cos - 2 * np.sqrt(A) * alpha)])
+    shelf_a = np.array([(A + 1) - (A - 1) * cos + 2 * np.sqrt(A) * alpha,
+                        2 * ((A - 1) - (A + 1) * cos),
+                        (A + 1) - (A - 1) * cos - 2 * np.sqrt(A) * alpha])
+
+    q, fc = _K_HIGH_PASS
+    w0 = 2.0 * np.pi * fc / sample_rate
+    cos, alpha = np.cos(w0), np.sin(w0) / (2.0 * q)
+    hp_b = np.array([(1 + cos) / 2, -(1 + cos), (1 + cos) / 2])
+    hp_a = np.array([1 + alpha, -2 * cos, 1 - alpha])
+    return [(shelf_b / shelf_a[0], shelf_a / shelf_a[0]), (hp_b / hp_a[0], hp_a / hp_a[0])]
+
+class LoudnessMeter:
+    """ブロック単位で入力できる積分ラウドネス（ITU-R BS.1770）測定
+
+    pyloudnormと同じKフィルタ（k_weighting_filters）とゲーティングを使い、フィルタ状態と100ms単位の二乗和だけを
+    保持するため、メモリ使用量は入力の長さによらずほぼ一定になる。
+    """
+
+    BLOCK_SEC = 0.4
+    HOP_SEC = 0.1
+
+    def __init__(self, sample_rate: int):
+        from scipy.signal import lfilter
+        self._lfilter = lfilter
+        self.sample_rate = sample_rate
+        self._filters = k_weighting_filters(sample_rate)
+        self._states = [np.zeros(max(len(b), len(a)) - 1) for b, a in self._filters]
+        self._hop = int(self.HOP_SEC * sample_rate)
+        self._hop_energy = []
+        self._pending_sum = 0.0
+        self._pending_len = 0
+
+    def update(self, block: np.ndarray):
+        """モノラルのブロックを追加"""
+        if len(block) == 0:
+            return
+        filtered = block.astype(np.float64)
+        for k, (b, a) in enumerate(self._filters):
+            filtered, self._states[k] = self._lfilter(b, a, filtered, zi=self._states[k])
+        squares = np.square(filtered)
+
+        # 100ms単位の二乗和に集約（端数は次のブロックに繰り越す）
+        need = self._hop - self._pending_len
+        if len(squares) < need:
+            self._pending_sum += squares.sum()
+            self._pending_len += len(squares)
+            return
+        self._hop_energy.append(self._pending_sum + squares[:need].sum())
+        rest = squares[need:]
+        n_full = len(rest) // self._hop
+        if n_full:
+            self._hop_energy.extend(rest[:n_full * self._hop].reshape(n_full, self._hop).sum(axis=1))
+        self._pending_sum = rest[n_full * self._hop:].sum()
+        self._pending_len = len(rest) - n_full * self._hop
+
+    def integrated_loudness(self) -> float:
+        """これまでの入力全体の積分ラウドネス（LUFS）"""
+        hops_per_block = int(round(self.BLOCK_SEC / self.HOP_SEC))
+        n_samples = len(self._hop_energy) * self._hop + self._pending_len
+        if n_samples < self.BLOCK_SEC * self.sample_rate:
+            raise ValueError("Audio must have length greater than the block size.")
+
+        # 400msブロック（75%オーバーラップ）の平均二乗値
+        # ブロック数はpyloudnormと同じく丸めで決め、末尾の端数ブロックも含める
+        n_blocks = int(round((n_samples / self.sample_rate - self.BLOCK_SEC) / self.HOP_SEC)) + 1
+        hop_energy = np.zeros(n_blocks + hops_per_block - 1)
+        n_hops = min(len(self._hop_energy), len(hop_energy))
+        hop_energy[:n_hops] = self._hop_energy[:n_hops]
+        if n_hops < len(hop_energy):
+            hop_energy[n_hops] = self._pending_sum
+        window = np.convolve(hop_energy, np.ones(hops_per_block), mode='valid')
+        z = window / (self.BLOCK_SEC * self.sample_rate)
+        with np.errstate(divide='ignore'):
+            loudness = -0.691 + 10.0 * np.log10(z)
+
+        # 絶対ゲート（-70LUFS）と相対ゲート（-10LU）
+        gated = loudness >= -70.0
+        if not np.any(gated):
+            return float('-inf')
+        relative = -0.691 + 10.0 * np.log10(np.mean(z[gated])) - 10.0
+        gated &= loudness > relative
+        if not np.any(gated):
+            return float('-inf')
+        return float(-0.691 + 10.0 * np.log10(np.mean(z[gated])))
+
+def write_chunks_stream(blocks: Iterator[np.ndarray], sample_rate: int, out_dir: str,
+                        bounds: List[Tuple[int, int]], subtype: str = 'PCM_16') -> List[str]:
+    """ブロック列を受け取りながら、(開始, 終了)位置でチャンクを逐次書き出す"""
+    import soundfile as sf
+    os.makedirs(out_dir, exist_ok=True)
+    chunks = [os.path.join(out_dir, f"chunk_{i:04d}.wav") for i in range(len(bounds))]
+    index = 0
+    position = 0
+    current = None
+    try:
+        for block in blocks:
+            offset = 0
+            while offset < len(block) and index < len(bounds):
+                if current is None:
+                    current = sf.SoundFile(chunks[index], 'w', sample_rate, 1, subtype)
+                take = min(len(block) - offset, bounds[index][1] - position)
+                current.write(block[offset:offset + take])
+                offset += take
+                position += take
+                if position >= bounds[index][1]:
+                    current.close()
+                    current = None
+                    index += 1
+    finally:
+        if current is not None:
+            current.close()
+    if index < len(bounds):
+        raise ValueError(f"入力がチャンク境界より短いです: {position} < {bounds[-1][1]}")
     return chunks
 
-def detect_speech_segments(input_path: str, min_speech_duration: float = 0.5) -> List[tuple]:
-    """音声セグメントを検出して時間範囲を返す"""
-    # 音声ファイルを読み込み
+def detect_speech_segments(input_path: str, min_speech_duration: float = 0.5,
+                           aggressiveness: int = 2, backend: str = 'webrtc',
+                           use_cache: bool = True) -> List[tuple]:
+    """音声セグメントを検出して時間範囲を返す
+
+    use_cacheがTrueの場合、同じ内容・同じサンプリングレートで計算したVADマスク
+    （32kHzの入力ならprepで計算済みのものを含む）を再利用する。
+    """
+    check_vad_params(aggressiveness, backend)
+    content_hash = file_sha256(input_path) if use_cache else None
     with wave.open(input_path, 'rb') as wf:
         sample_rate = wf.getframerate()
+        if content_hash:
+            mask = load_cached_speech_mask(content_hash, sample_rate, aggressiveness, backend)
+            if mask is not None:
+                return mask_to_segments(mask, min_speech_duration)
+
+        # 音声ファイルを読み込み
         frames = wf.readframes(wf.getnframes())
         audio_data = np.frombuffer(frames, dtype=np.int16)
     
-    # VADの初期化
-    vad = webrtcvad.Vad(2)  # 中程度のアグレッシブネス
-    
-    # フレームサイズ（30ms）
-    frame_size = int(sample_rate * 0.03)
-    
-    # 音声フレームを分割してVAD処理
-    speech_frames = []
-    for i in range(0, len(audio_data), frame_size):
-        frame = audio_data[i:i + frame_size]
-        if len(frame) == frame_size:
-            is_speech = vad.is_speech(frame.tobytes(), sample_rate)
-            speech_frames.append(is_speech)
-    
-    # 連続する音声セグメントを検出
-    segments = []
-    start_frame = None
-    
-    for i, is_speech in enumerate(speech_frames):
-        if is_speech and start_frame is None:
-            start_frame = i
-        elif not is_speech and start_frame is not None:
-            end_frame = i
-            duration = (end_frame - start_frame) * 0.03  # 秒単位
-            
-            if duration >= min_speech_duration:
-                start_time = start_frame * 0.03
-                end_time = end_frame * 0.03
-                segments.append((start_time, end_time))
-            
-            start_frame = None
-    
-    # 最後のセグメントを処理
-    if start_frame is not None:
-        end_frame = len(speech_frames)
-        duration = (end_frame - start_frame) * 0.03
-        
-        if duration >= min_speech_duration:
-            start_time = start_frame * 0.03
-            end_time = end_frame * 0.03
-            segments.append((start_time, end_time))
-    
-    return segments
+    # 音声フレームを判定して連続する音声セグメントを検出
+    mask = get_speech_mask(int16_to_float(audio_data), sample_rate, aggressiveness, backend, content_hash)
+    return mask_to_segments(mask, min_speech_duration)
+
+FADE_CURVES = ('linear', 'equal_power')
+
+def fade_curve(n: int, curve: str = 'linear', fade_in: bool = True) -> np.ndarray:
+    """長さnのフェードのゲイン（float32）
+
+    'linear'は振幅線形（pydubのfade_in/fade_outと同じ）、
+    'equal_power'はsin/cosの等パワー曲線（クロスフェードで両側の二乗和が1になる）。
+    """
+    t = (np.arange(n, dtype=np.float64) + 0.5) / max(n, 1)
+    if not fade_in:
+        t = t[::-1]
+    if curve == 'linear':
+        gain = t
+    elif curve == 'equal_power':
+        gain = np.sin(0.5 * np.pi * t)
+    else:
+        raise ValueError(f"未対応のフェード曲線です: {curve}")
+    return gain.astype(np.float32)
+
+def apply_fade_array(audio: np.ndarray, sample_rate: int, fade_in_ms: int = 100, fade_out_ms: int = 100,
+                     curve: str = 'linear') -> np.ndarray:
+    """フェードイン・アウトを適用（float32配列版, モノラル/多チャンネル両対応）"""
+    audio = np.array(audio, dtype=np.float32)
+    n_in = min(len(audio), int(sample_rate * fade_in_ms / 1000))
+    n_out = min(len(audio), int(sample_rate * fade_out_ms / 1000))
+    shape = (-1,) + (1,) * (audio.ndim - 1)
+    if n_in:
+        audio[:n_in] *= fade_curve(n_in, curve).reshape(shape)
+    if n_out:
+        audio[len(audio) - n_out:] *= fade_curve(n_out, curve, fade_in=False).reshape(shape)
+    return audio
+
+def crossfade(tail: np.ndarray, head: np.ndarray, curve: str = 'equal_power') -> np.ndarray:
+    """同じ長さの区間をクロスフェード（tailをフェードアウト, headをフェードイン）"""
+    n = len(tail)
+    shape = (-1,) + (1,) * (tail.ndim - 1)
+    return (tail * fade_curve(n, curve, fade_in=False).reshape(shape)
+            + head * fade_curve(n, curve).reshape(shape))
 
-def apply_fade(input_path: str, output_path: str, fade_in_ms: int = 100, fade_out_ms: int = 100):
+def apply_fade(input_path: str, output_path: str, fade_in_ms: int = 100, fade_out_ms: int = 100,
+               curve: str = 'linear'):
     """フェードイン・アウトを適用"""
-    audio = AudioSegment.from_file(input_path)
+    import soundfile as sf
+    info = sf.info(input_path)
+    subtype = info.subtype if info.subtype in ('PCM_16', 'PCM_24', 'PCM_32', 'FLOAT') else 'PCM_16'
+    audio, sample_rate = sf.read(input_path, dtype='float32')
     
     # フェードイン・アウトを適用
-    audio = audio.fade_in(fade_in_ms).fade_out(fade_out_ms)
+    audio = apply_fade_array(audio, sample_rate, fade_in_ms, fade_out_ms, curve)
     
     # 出力ファイルに保存
-    audio.export(output_path, format="wav")
+    sf.write(output_path, audio, sample_rate, subtype=subtype)
 
 def get_audio_info(input_path: str) -> dict:
     """音声ファイルの情報を取得"""
@@ -182,6 +760,7 @@ def get_audio_info(input_path: str) -> dict:
     except Exception as e:
         # WAV以外の形式の場合はpydubを使用
         try:
+            from pydub import AudioSegment
             audio = AudioSegment.from_file(input_path)
             return {
                 'channels': audio.channels,
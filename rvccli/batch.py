@@ -0,0 +1,213 @@
+import os
+import json
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Iterator, Optional
+
+from .cache import atomic_write
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# 一括推論の対象とする拡張子
+AUDIO_EXTENSIONS = ('.wav', '.mp3', '.flac', '.m4a', '.ogg')
+# 出力ディレクトリに書き出す結果の一覧
+RESULTS_NAME = "infer_results.json"
+
+
+def collect_from_dir(in_dir: str, out_dir: str) -> List[dict]:
+    """ディレクトリ以下の音声ファイルを、同じ相対パスの出力（.wav）と対応付ける
+
+    出力ディレクトリが入力ディレクトリの中にある場合、前回の出力を入力として拾わないよう出力ディレクトリは探さない。
+    """
+    out_real = os.path.realpath(out_dir)
+    jobs = []
+    for root, dirs, files in os.walk(in_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.realpath(os.path.join(root, d)) != out_real)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in AUDIO_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.splitext(os.path.relpath(path, in_dir))[0] + ".wav"
+            jobs.append({'input': path, 'out': os.path.join(out_dir, rel)})
+    return jobs
+
+
+def collect_from_manifest(manifest_path: str, out_dir: str) -> List[dict]:
+    """マニフェストから入力と出力を読み込む
+
+    1行に1件で、入力パスのみ、またはJSON（{"input": ..., "out": ...}）を書く。
+    相対パスはマニフェストのディレクトリから解決し、outを省略した場合は出力ディレクトリに同名の.wavを書く。
+    """
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    jobs = []
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            item = json.loads(line) if line.startswith('{') else {'input': line}
+            input_path = os.path.join(base_dir, item['input'])
+            out_path = item.get('out')
+            if out_path:
+                out_path = os.path.join(out_dir or base_dir, out_path)
+            else:
+                out_path = os.path.join(out_dir, os.path.splitext(os.path.basename(input_path))[0] + ".wav")
+            jobs.append({'input': input_path, 'out': out_path})
+    return jobs
+
+
+def duplicate_outputs(jobs: List[dict]) -> Dict[str, List[str]]:
+    """同じ出力パスに書き出すジョブ（a.mp3とa.wavなど）の {出力: [入力]}"""
+    by_out = {}
+    for job in jobs:
+        by_out.setdefault(os.path.abspath(job['out']), []).append(job['input'])
+    return {out: inputs for out, inputs in by_out.items() if len(inputs) > 1}
+
+
+def audio_duration(path: str) -> float:
+    """音声の長さ（秒）。読めない場合は0"""
+    import soundfile as sf
+    try:
+        return sf.info(path).duration
+    except Exception:
+        return 0.0
+
+
+class _Converter(ABC):
+    """変換方法（推論サーバー / プロセス内バックエンド / 1回1プロセス）の共通インターフェース"""
+
+    mode = None
+    load_sec = 0.0
+
+    @abstractmethod
+    def convert(self, input_wav: str, out_path: str):
+        """input_wavを変換してout_pathに書き出す（失敗した場合は例外を送出する）"""
+
+
+class _ServerConverter(_Converter):
+    mode = "server"
+
+    def __init__(self, socket_path, model_path, index_path, params):
+        from .server import InferenceClient
+        self.client = InferenceClient(socket_path)
+        self.model_path, self.index_path, self.params = model_path, index_path, params
+        # run_batchは同時実行数が2以上のとき複数のスレッドからconvertを呼ぶ
+        self._lock = threading.Lock()
+
+    def convert(self, input_wav, out_path):
+        response = self.client.convert(input_wav, out_path, self.model_path, self.index_path, **self.params)
+        with self._lock:
+            self.load_sec += response['load_sec']
+
+
+class _BackendConverter(_Converter):
+    mode = "backend"
+
+    def __init__(self, backend_path, model_path, index_path, params):
+        from .server import InferenceWorker, load_backend
+        self.worker = InferenceWorker(load_backend(backend_path))
+        self.model_path, self.index_path, self.params = model_path, index_path, params
+        # 変換を始める前に1回だけモデルを読み込む
+        _, self.load_sec, _ = self.worker.get_model(model_path, index_path)
+
+    def convert(self, input_wav, out_path):
+        self.worker.convert({'model': self.model_path, 'index': self.index_path,
+                             'input': input_wav, 'out': out_path, 'params': self.params})
+
+
+class _SubprocessConverter(_Converter):
+    mode = "subprocess"
+
+    def __init__(self, model_path, index_path, params):
+        self.model_path, self.index_path, self.params = model_path, index_path, params
+
+    def convert(self, input_wav, out_path):
+        from . import rvc_wrapper
+        if not rvc_wrapper.infer(input_wav, self.model_path, self.index_path, out_path=out_path,
+                                 use_server=False, **self.params):
+            raise RuntimeError("推論スクリプトの実行に失敗しました")
+
+
+def make_converter(model_path: str, index_path: str, params: dict, socket_path: str = None,
+                   backend_path: str = None, use_server: bool = True) -> _Converter:
+    """利用できる変換方法を選ぶ
+
+    推論サーバーが起動していればサーバーに送り、なければ推論バックエンドをプロセス内に読み込む。
+    バックエンドもなければ、従来どおりファイルごとに推論スクリプトを起動する。
+    """
+    from . import server, rvc_wrapper
+
+    socket_path = socket_path or server.default_socket_path()
+    if use_server and server.is_running(socket_path):
+        return _ServerConverter(socket_path, model_path, index_path, params)
+    backend_path = backend_path or os.path.join(rvc_wrapper.get_rvc_dir(), server.BACKEND_NAME)
+    if os.path.exists(backend_path):
+        return _BackendConverter(backend_path, model_path, index_path, params)
+    return _SubprocessConverter(model_path, index_path, params)
+
+
+def run_batch(jobs: List[dict], converter: _Converter, concurrency: int = 1,
+              skip_existing: bool = True) -> Iterator[dict]:
+    """全ジョブを変換し、入力順に結果を返すジェネレータ"""
+    duplicates = duplicate_outputs(jobs)
+    if duplicates:
+        # 同じファイルに複数のスレッドが同時に書き出さないよう、変換を始める前に止める
+        out, inputs = next(iter(duplicates.items()))
+        raise ValueError(f"出力先が同じ入力があります（{out}）: {', '.join(inputs)}")
+
+    def run(job: dict) -> dict:
+        result = {
+            'input': job['input'],
+            'out': job['out'],
+            'status': 'ok',
+            'duration': audio_duration(job['input']),
+            'elapsed': 0.0,
+            'error': None,
+        }
+        if skip_existing and os.path.exists(job['out']):
+            result['status'] = 'skipped'
+            return result
+        start = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(job['out'])), exist_ok=True)
+            with profiling.span('convert.file', file=os.path.basename(job['input'])):
+                converter.convert(job['input'], job['out'])
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = str(e)
+            logger.error(f"変換に失敗しました: {job['input']}: {e}")
+        result['elapsed'] = time.perf_counter() - start
+        return result
+
+    if concurrency <= 1:
+        for job in jobs:
+            yield run(job)
+        return
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        yield from executor.map(run, jobs)
+
+
+def summarize(results: List[dict], wall_time: float, load_sec: float = 0.0) -> dict:
+    """一括推論の集計（実時間比 = 処理時間 / 変換した音声の長さ）"""
+    converted = [r for r in results if r['status'] == 'ok']
+    audio_sec = sum(r['duration'] for r in converted)
+    return {
+        'files': len(results),
+        'converted': len(converted),
+        'skipped': sum(1 for r in results if r['status'] == 'skipped'),
+        'failed': sum(1 for r in results if r['status'] == 'error'),
+        'audio_sec': audio_sec,
+        'wall_time': wall_time,
+        'load_sec': load_sec,
+        'rtf': wall_time / audio_sec if audio_sec > 0 else None,
+    }
+
+
+def save_results(path: str, results: List[dict], summary: dict, mode: Optional[str] = None):
+    """結果の一覧と集計をJSONで保存"""
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump({'mode': mode, 'summary': summary, 'results': results}, f, ensure_ascii=False, indent=1)
@@ -0,0 +1,38 @@
+import os
+import hashlib
+import contextlib
+import threading
+
+# キャッシュのルートディレクトリ（環境変数で変更可能）
+CACHE_ENV = "RVCCLI_CACHE_DIR"
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "rvccli")
+
+
+def get_cache_dir(*parts: str) -> str:
+    """キャッシュディレクトリのパスを返す（存在しなければ作成）"""
+    path = os.path.join(os.environ.get(CACHE_ENV, DEFAULT_CACHE_DIR), *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """ファイル内容のSHA-256（16進文字列）"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = 'wb', encoding: str = None):
+    """一時ファイルに書き込み、完了後にos.replaceで置き換える"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -4,7 +4,41 @@ import shutil
 import subprocess
 from pathlib import Path
 
-app = typer.Typer(help="Retrieval-based Voice Conversion CLI")
+app = typer.Typer(help="Retrieval-based Voice Conversion CLI", rich_markup_mode=None)
+
+@app.callback()
+def main(
+    ctx: typer.Context,
+    profile: str = typer.Option(None, "--profile",
+                                help="処理段階ごとの時間とメモリをChrome trace形式のJSONに保存（上位の集計は<パス>.txt）"),
+    profile_memory: str = typer.Option("rss", "--profile-memory",
+                                       help="--profileのメモリ計測方法（rss / tracemalloc / none）"),
+):
+    # ライブラリとしてimportした場合はログ設定を変えない（重い依存は各コマンドの中でimportする）
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not profile:
+        return
+
+    import sys
+    from . import profiling
+    if profile_memory not in profiling.MEMORY_MODES:
+        print(f"エラー: --profile-memory は {' / '.join(profiling.MEMORY_MODES)} のいずれかです", file=sys.stderr)
+        raise typer.Exit(1)
+    profiling.enable(profile_memory)
+    root = profiling.span(f"rvccli {ctx.invoked_subcommand or ''}".strip(), cat='command')
+    root.__enter__()
+
+    def finish():
+        # コマンドが途中で終了した場合（typer.Exitなど）もそこまでの計測を書き出す
+        root.__exit__(None, None, None)
+        profiler = profiling.disable()
+        summary = profiling.write(profiler, profile)
+        print(summary, file=sys.stderr)
+        print(f"プロファイルを保存しました: {profile}（chrome://tracing または https://ui.perfetto.dev で開けます）",
+              file=sys.stderr)
+
+    ctx.call_on_close(finish)
 
 @app.command()
 def help():
@@ -17,14 +51,24 @@ def help():
         ("setup", "セットアップ: 依存導入・外部リポジトリclone・環境チェック"),
         ("download-models", "事前学習モデルのダウンロード"),
         ("prep", "音声前処理（32kHz/mono, 無音トリム, LUFS, 分割）"),
+        ("unpack", "パック形式のデータセットをチャンクWAVに展開"),
         ("train", "学習プロセスの起動"),
         ("infer", "推論（音声変換）"),
+        ("serve", "推論サーバー（モデルを読み込んだまま常駐）"),
+        ("serve-stats", "推論サーバーのモデルキャッシュ統計を表示"),
+        ("stream", "標準入力/FIFOの生PCMを逐次変換して標準出力へ書き出す"),
         ("pack", "モデル一式のパッケージング"),
+        ("pack-verify", "パッケージをマニフェストと照合"),
+        ("run", "変更のあったステージだけをprepからパッケージまで実行"),
         ("info", "音声ファイルの情報を表示"),
         ("config-validate", "設定ファイルの検証"),
         ("config-create", "新しい設定ファイルを作成"),
+        ("tune", "このマシンでprep・データローダーのワーカー数を計測して設定に書き込む"),
         ("status", "学習状況の確認"),
         ("extract-features", "特徴量抽出の実行"),
+        ("f0-cache", "F0キャッシュの使用量を表示・整理"),
+        ("index build", "特徴量から検索インデックス（faiss）を構築"),
+        ("index bench", "インデックス設定ごとの速度・recall・サイズを比較"),
         ("help", "このヘルプを表示")
     ]
     
@@ -38,6 +82,9 @@ def help():
     print("例:")
     print("  python -m rvccli prep --help")
     print("  python -m rvccli train --help")
+    print()
+    print("処理段階ごとの時間とメモリを記録する（全コマンド共通, コマンド名の前に指定）:")
+    print("  python -m rvccli --profile profile.json prep --in-dir data/raw")
 
 @app.command()
 def setup():
@@ -106,21 +153,37 @@ def setup():
     print("pip install -r requirements.txt")
 
 @app.command("download-models")
-def download_models():
+def download_models(mirror: str = typer.Option(None, help="ミラーのURL（<URL>/<ファイル名>で取得, 既定: $RVCCLI_MODEL_MIRROR）"),
+                    cache_dir: str = typer.Option(None, help="複数のノードで共有するキャッシュディレクトリ（既定: $RVCCLI_MODEL_CACHE）"),
+                    workers: int = typer.Option(0, help="同時に取得するモデル数（0=すべて）"),
+                    retries: int = typer.Option(3, help="接続が切れた場合に再開する回数"),
+                    verify: bool = typer.Option(False, "--verify", help="既存のファイルもSHA-256を記録と照合")):
     """事前学習モデルのダウンロード"""
     import os
     from . import download_models as dm
     models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
     models_dir = os.path.abspath(models_dir)
-    dm.ensure_models(models_dir)
+    results = dm.ensure_models(models_dir, mirror, cache_dir, workers, verify, retries)
+    if 'failed' in results.values():
+        raise typer.Exit(1)
 
 @app.command()
 def prep(in_dir: str = typer.Option(..., help="入力ディレクトリ"), 
          out_dir: str = typer.Option(..., help="出力ディレクトリ"),
-         chunk_sec: float = typer.Option(12.0, help="分割秒数")):
+         chunk_sec: float = typer.Option(12.0, help="分割秒数"),
+         workers: int = typer.Option(None, help="並列ワーカー数（0=CPUコア数, 既定: configs/config.yamlのaudio.workers）"),
+         vad_backend: str = typer.Option("webrtc", help="VADバックエンド（webrtc/numpy）"),
+         vad_aggressiveness: int = typer.Option(2, help="VADアグレッシブネス（0〜3）"),
+         vad_cache: bool = typer.Option(True, help="VAD結果のキャッシュを使用"),
+         snap_to_silence: bool = typer.Option(False, help="分割位置をVADで検出した無音に合わせる"),
+         stream: bool = typer.Option(False, help="ブロック単位で処理してメモリ使用量を抑える（長時間の録音向け）"),
+         block_sec: float = typer.Option(30.0, help="ストリーミング処理のブロック秒数"),
+         output_format: str = typer.Option("wav", "--format", help="出力形式（wav: チャンクごとのWAV / packed: 連結PCM+インデックス）"),
+         force: bool = typer.Option(False, help="マニフェストを無視して全ファイルを再処理")):
     """音声前処理（32kHz/mono, 無音トリム, LUFS, 分割）"""
-    from . import audio_utils
-    import glob
+    from . import preprocess, audio_utils
+    from .config import AudioConfig
+    import time
     
     print(f"音声前処理を開始します...")
     print(f"入力ディレクトリ: {in_dir}")
@@ -130,57 +193,88 @@ def prep(in_dir: str = typer.Option(..., help="入力ディレクトリ"),
     os.makedirs(out_dir, exist_ok=True)
     
     # 音声ファイルを検索
-    audio_extensions = ['*.wav', '*.mp3', '*.flac', '*.m4a', '*.ogg']
-    audio_files = []
-    for ext in audio_extensions:
-        audio_files.extend(glob.glob(os.path.join(in_dir, ext)))
-        audio_files.extend(glob.glob(os.path.join(in_dir, ext.upper())))
+    audio_files = preprocess.collect_audio_files(in_dir)
     
     if not audio_files:
         print("音声ファイルが見つかりませんでした。")
         return
+    duplicates = preprocess.duplicate_stems(audio_files)
+    if duplicates:
+        print("エラー: 拡張子を除いた名前が同じファイルは同じチャンクディレクトリに出力されるため、名前を変えてください:")
+        for files in duplicates.values():
+            print(f"  {', '.join(os.path.basename(f) for f in files)}")
+        return
+    
+    if vad_backend not in audio_utils.VAD_BACKENDS:
+        print(f"エラー: 未対応のVADバックエンドです: {vad_backend}")
+        return
+    if not 0 <= vad_aggressiveness <= 3:
+        print(f"エラー: VADアグレッシブネスは0から3の範囲である必要があります: {vad_aggressiveness}")
+        return
+    if output_format not in ("wav", "packed"):
+        print(f"エラー: 未対応の出力形式です: {output_format}")
+        return
+    packed_output = output_format == "packed"
     
+    audio_cfg = AudioConfig(chunk_duration=chunk_sec, vad_backend=vad_backend,
+                            vad_aggressiveness=vad_aggressiveness, vad_cache=vad_cache,
+                            snap_to_silence=snap_to_silence,
+                            stream_block_sec=block_sec if stream else 0.0)
+    if workers is None:
+        # rvccli tuneで計測した値（設定ファイルがなければCPUコア数）
+        config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'config.yaml')
+        workers = 0
+        if os.path.exists(config_path):
+            from .config import RVCConfig
+            try:
+                workers = RVCConfig.load(config_path).audio.workers
+            except ValueError:
+                pass
+    workers = preprocess.resolve_workers(workers, len(audio_files))
     print(f"処理対象ファイル数: {len(audio_files)}")
+    print(f"並列ワーカー数: {workers}")
+    if stream:
+        print(f"ストリーミング処理: {block_sec:.0f}秒ブロック")
     
-    for i, audio_file in enumerate(audio_files, 1):
-        print(f"\n処理中 ({i}/{len(audio_files)}): {os.path.basename(audio_file)}")
-        
-        # 一時ファイル名を生成
-        base_name = os.path.splitext(os.path.basename(audio_file))[0]
-        temp_32k = os.path.join(out_dir, f"{base_name}_32k.wav")
-        temp_trimmed = os.path.join(out_dir, f"{base_name}_trimmed.wav")
-        temp_normalized = os.path.join(out_dir, f"{base_name}_normalized.wav")
-        
-        try:
-            # 1. 32kHz/mono変換
-            print("  32kHz/mono変換中...")
-            audio_utils.convert_to_32k_mono(audio_file, temp_32k)
-            
-            # 2. 無音トリム
-            print("  無音トリム中...")
-            audio_utils.trim_silence_vad(temp_32k, temp_trimmed)
-            
-            # 3. LUFS正規化
-            print("  LUFS正規化中...")
-            audio_utils.normalize_lufs(temp_trimmed, temp_normalized)
-            
-            # 4. 音声分割
-            print("  音声分割中...")
-            chunks_dir = os.path.join(out_dir, f"{base_name}_chunks")
-            chunks = audio_utils.split_audio(temp_normalized, chunks_dir, chunk_sec)
-            
-            print(f"  分割完了: {len(chunks)}個のチャンク")
-            
-            # 一時ファイルを削除
-            for temp_file in [temp_32k, temp_trimmed, temp_normalized]:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            
-        except Exception as e:
-            print(f"  エラー: {e}")
-            continue
+    start = time.perf_counter()
+    results = []
+    for i, result in enumerate(preprocess.run_prep(audio_files, out_dir, audio_cfg, workers, force,
+                                                   packed_output), 1):
+        print(f"\n処理中 ({i}/{len(audio_files)}): {os.path.basename(result['file'])}")
+        for line in result['log']:
+            print(line)
+        results.append(result)
     
+    summary = preprocess.summarize(results, time.perf_counter() - start)
     print(f"\n音声前処理が完了しました。出力ディレクトリ: {out_dir}")
+    if packed_output:
+        from . import packed
+        print(f"パック形式: {os.path.join(out_dir, packed.PACKED_DATA)} + {packed.PACKED_INDEX}")
+    print(f"成功: {summary['succeeded']} / スキップ: {summary['skipped']} / 失敗: {summary['failed']} "
+          f"/ チャンク数: {summary['chunks']}")
+    print(f"処理時間: {summary['wall_time']:.1f}秒 "
+          f"({summary['files_per_sec']:.2f} files/s, {summary['audio_sec_per_sec']:.1f} 音声秒/s)")
+    if summary['failed']:
+        print("失敗したファイル:")
+        for r in results:
+            if r['error']:
+                print(f"  ✗ {os.path.basename(r['file'])}: {r['error']}")
+
+@app.command()
+def unpack(dataset_dir: str = typer.Option(..., help="パック形式のデータセット（prep --format packed の出力）"),
+           out_dir: str = typer.Option(..., help="チャンクWAVの出力ディレクトリ")):
+    """パック形式のデータセットをチャンクWAVに展開"""
+    from .packed import PackedDataset
+    
+    try:
+        dataset = PackedDataset(dataset_dir)
+    except (OSError, ValueError) as e:
+        print(f"エラー: データセットを読み込めません: {e}")
+        return
+    
+    print(f"チャンク数: {len(dataset)} / 合計: {dataset.duration:.1f}秒 / {dataset.sample_rate}Hz")
+    paths = dataset.export_wavs(out_dir)
+    print(f"展開完了: {len(paths)}個のWAVを {out_dir} に書き出しました")
 
 @app.command()
 def train():
@@ -234,26 +328,78 @@ def train():
     except Exception as e:
         print(f"設定ファイルの読み込みまたは学習の実行に失敗しました: {e}")
 
+def _infer_batch(jobs, model_path, index_path, params, concurrency, skip_existing, socket, backend,
+                 use_server, results_path):
+    """一括推論の実行と結果の表示"""
+    from . import batch
+    import time
+    
+    start = time.perf_counter()
+    try:
+        converter = batch.make_converter(model_path, index_path, params, socket, backend, use_server)
+    except Exception as e:
+        print(f"エラー: 推論の準備に失敗しました: {e}")
+        return
+    print(f"変換方法: {converter.mode} / 同時実行数: {concurrency}")
+    if converter.mode == "subprocess":
+        print("  注意: 推論バックエンドが見つからないため、ファイルごとに推論スクリプトを起動します")
+    
+    results = []
+    for i, result in enumerate(batch.run_batch(jobs, converter, concurrency, skip_existing), 1):
+        mark = {'ok': '✓', 'skipped': '-', 'error': '✗'}[result['status']]
+        detail = result['error'] if result['error'] else f"{result['elapsed']:.2f}秒"
+        if result['status'] == 'skipped':
+            detail = "出力済み: スキップ"
+        print(f"  {mark} ({i}/{len(jobs)}) {os.path.basename(result['input'])}: {detail}")
+        results.append(result)
+    
+    summary = batch.summarize(results, time.perf_counter() - start, converter.load_sec)
+    batch.save_results(results_path, results, summary, converter.mode)
+    print(f"\n変換: {summary['converted']} / スキップ: {summary['skipped']} / 失敗: {summary['failed']}")
+    print(f"処理時間: {summary['wall_time']:.1f}秒（うちモデル読み込み {summary['load_sec']:.1f}秒）"
+          f" / 音声: {summary['audio_sec']:.1f}秒")
+    if summary['rtf'] is not None:
+        print(f"実時間比（RTF）: {summary['rtf']:.3f}（{1.0 / summary['rtf']:.1f}倍速）")
+    print(f"結果一覧: {results_path}")
+
 @app.command()
-def infer(wav: str = typer.Option(..., help="入力wav"), 
-          out: str = typer.Option(..., help="出力wav"),
+def infer(wav: str = typer.Option(None, help="入力wav"), 
+          out: str = typer.Option(None, help="出力wav"),
           model_path: str = typer.Option(None, help="モデルパス"),
           index_path: str = typer.Option(None, help="インデックスパス"),
           transpose: int = typer.Option(0, help="音程シフト"),
-          f0_method: str = typer.Option("rmvpe", help="F0抽出方法")):
+          f0_method: str = typer.Option("rmvpe", help="F0抽出方法"),
+          in_dir: str = typer.Option(None, help="一括変換する入力ディレクトリ"),
+          manifest: str = typer.Option(None, help="一括変換する入力の一覧（1行1件: パスまたはJSON）"),
+          out_dir: str = typer.Option(None, help="一括変換の出力ディレクトリ"),
+          concurrency: int = typer.Option(1, help="一括変換・長尺変換の同時実行数"),
+          skip_existing: bool = typer.Option(True, help="出力済みのファイルをスキップ"),
+          backend: str = typer.Option(None, help="推論バックエンド（load/convertを持つPythonファイル）"),
+          socket: str = typer.Option(None, help="推論サーバーのソケット（起動中なら利用）"),
+          no_server: bool = typer.Option(False, "--no-server", help="推論サーバーを使わずに毎回スクリプトを起動"),
+          long: bool = typer.Option(False, "--long", help="長い入力を無音位置で窓に分割し、並列に変換してつなぐ"),
+          window_sec: float = typer.Option(30.0, help="長尺変換の窓の長さ（秒）"),
+          crossfade_ms: int = typer.Option(200, help="長尺変換で窓をつなぐクロスフェードの長さ（ミリ秒）")):
     """推論（音声変換）"""
     from . import rvc_wrapper
     import os
     
+    batch_mode = in_dir is not None or manifest is not None
+    if batch_mode:
+        if not out_dir:
+            print("エラー: 一括変換には--out-dirを指定してください。")
+            return
+    elif not wav or not out:
+        print("エラー: --wavと--out、または--in-dir/--manifestを指定してください。")
+        return
+    
     print(f"音声変換を開始します...")
-    print(f"入力ファイル: {wav}")
-    print(f"出力ファイル: {out}")
     
     # モデルパスとインデックスパスの自動検出
+    models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
     if model_path is None:
         # デフォルトのモデルディレクトリから検索
-        models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
-        model_files = [f for f in os.listdir(models_dir) if f.endswith('.pth')]
+        model_files = sorted(f for f in os.listdir(models_dir) if f.endswith('.pth')) if os.path.isdir(models_dir) else []
         if model_files:
             model_path = os.path.join(models_dir, model_files[0])
             print(f"自動検出されたモデル: {model_path}")
@@ -263,8 +409,7 @@ def infer(wav: str = typer.Option(..., help="入力wav"),
     
     if index_path is None:
         # デフォルトのインデックスディレクトリから検索
-        models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
-        index_files = [f for f in os.listdir(models_dir) if f.endswith('.index')]
+        index_files = sorted(f for f in os.listdir(models_dir) if f.endswith('.index')) if os.path.isdir(models_dir) else []
         if index_files:
             index_path = os.path.join(models_dir, index_files[0])
             print(f"自動検出されたインデックス: {index_path}")
@@ -272,20 +417,63 @@ def infer(wav: str = typer.Option(..., help="入力wav"),
             print("エラー: インデックスファイルが見つかりません。--index-pathで指定してください。")
             return
     
-    # 出力ディレクトリを作成
-    os.makedirs(os.path.dirname(out), exist_ok=True)
+    params = {
+        'transpose': transpose,
+        'f0_method': f0_method,
+        'rms_mix_rate': 0.25,
+        'filter_radius': 3,
+        'resample_sr': 0,
+    }
+    
+    if batch_mode:
+        from . import batch
+        jobs = []
+        if in_dir:
+            jobs.extend(batch.collect_from_dir(in_dir, out_dir))
+        if manifest:
+            jobs.extend(batch.collect_from_manifest(manifest, out_dir))
+        if not jobs:
+            print("音声ファイルが見つかりませんでした。")
+            return
+        duplicates = batch.duplicate_outputs(jobs)
+        if duplicates:
+            print("エラー: 出力先が同じ入力があります。名前を変えるか、一覧ファイルでoutを指定してください:")
+            for out_path, inputs in duplicates.items():
+                print(f"  {out_path}: {', '.join(inputs)}")
+            return
+        print(f"変換対象ファイル数: {len(jobs)}")
+        _infer_batch(jobs, model_path, index_path, params, concurrency, skip_existing,
+                     socket, backend, not no_server, os.path.join(out_dir, batch.RESULTS_NAME))
+        return
+    
+    print(f"入力ファイル: {wav}")
+    print(f"出力ファイル: {out}")
+    
+    if long:
+        from . import batch, longform
+        try:
+            converter = batch.make_converter(model_path, index_path, params, socket, backend, not no_server)
+            print(f"変換方法: {converter.mode} / 同時実行数: {concurrency}")
+            stats = longform.convert_long(wav, out, converter, workers=concurrency,
+                                          window_sec=window_sec, crossfade_ms=crossfade_ms)
+        except Exception as e:
+            print(f"音声変換でエラーが発生しました: {e}")
+            return
+        print(f"窓の数: {stats['windows']} ({stats['audio_sec']:.1f}秒)")
+        print(f"分割: {stats['split_sec']:.2f}秒 / 変換: {stats['convert_sec']:.2f}秒 / "
+              f"結合: {stats['stitch_sec']:.2f}秒 / 合計: {stats['wall_time']:.2f}秒")
+        print(f"音声変換が完了しました: {out}")
+        return
     
     try:
         success = rvc_wrapper.infer(
             input_wav=wav,
             model_path=model_path,
             index_path=index_path,
-            transpose=transpose,
-            f0_method=f0_method,
-            rms_mix_rate=0.25,
-            filter_radius=3,
-            resample_sr=0,
-            out_path=out
+            out_path=out,
+            socket_path=socket,
+            use_server=not no_server,
+            **params
         )
         
         if success:
@@ -297,69 +485,247 @@ def infer(wav: str = typer.Option(..., help="入力wav"),
         print(f"音声変換でエラーが発生しました: {e}")
 
 @app.command()
-def pack():
+def serve(model_path: str = typer.Option(None, help="起動時に読み込むモデルパス"),
+          index_path: str = typer.Option(None, help="起動時に読み込むインデックスパス"),
+          backend: str = typer.Option(None, help="推論バックエンド（load/convertを持つPythonファイル）"),
+          socket: str = typer.Option(None, help="待ち受けるUnixソケットのパス"),
+          cache_mb: float = typer.Option(4096, help="モデルキャッシュのメモリ予算（MB, 超えたら古いモデルから破棄）")):
+    """推論サーバー（モデルを読み込んだまま常駐し、inferの要求を処理）"""
+    from . import server, rvc_wrapper
+    
+    backend = backend or os.path.join(rvc_wrapper.get_rvc_dir(), server.BACKEND_NAME)
+    socket = socket or server.default_socket_path()
+    print(f"推論バックエンド: {backend}")
+    print(f"ソケット: {socket}")
+    
+    try:
+        server.serve(backend, socket, model_path, index_path,
+                     ready=lambda: print("要求を待機しています（Ctrl+Cで停止）"), cache_mb=cache_mb)
+    except KeyboardInterrupt:
+        print("\n推論サーバーを停止しました")
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"エラー: {e}")
+
+@app.command("serve-stats")
+def serve_stats(socket: str = typer.Option(None, help="推論サーバーのソケット")):
+    """推論サーバーのモデルキャッシュ統計を表示"""
+    from . import server
+    
+    socket = socket or server.default_socket_path()
+    if not server.is_running(socket):
+        print(f"推論サーバーが起動していません: {socket}")
+        return
+    
+    stats = server.InferenceClient(socket).stats()
+    cache = stats['cache']
+    print(f"推論サーバー (pid {stats['pid']}): 稼働 {stats['uptime']:.0f}秒 / リクエスト {stats['requests']}件")
+    print(f"キャッシュ: ヒット {cache['hits']} / ミス {cache['misses']} (ヒット率 {cache['hit_rate']:.1%}) "
+          f"/ 破棄 {cache['evictions']}")
+    print(f"読み込み: {cache['loads']}回, 合計 {cache['load_sec']:.2f}秒")
+    print(f"メモリ: {cache['used_mb']:.0f} / {cache['budget_mb']:.0f} MB")
+    for path in cache['models']:
+        print(f"  {path}")
+    if 'f0_cache' in stats:
+        f0 = stats['f0_cache']
+        print(f"F0キャッシュ: ヒット {f0['hits']} / ミス {f0['misses']} / "
+              f"{f0['entries']}件, {f0['size_mb']:.1f} / {f0['budget_mb']:.0f} MB")
+
+@app.command()
+def stream(model_path: str = typer.Option(..., help="モデルパス"),
+           index_path: str = typer.Option(None, help="インデックスパス"),
+           input: str = typer.Option("-", "--input", help="入力（生PCM, '-'は標準入力, FIFOのパスも可）"),
+           output: str = typer.Option("-", "--output", help="出力（生PCM, '-'は標準出力）"),
+           sample_rate: int = typer.Option(32000, help="入出力のサンプリングレート"),
+           pcm_format: str = typer.Option("s16le", "--format", help="PCM形式（s16le/f32le, モノラル）"),
+           block_ms: int = typer.Option(200, help="ブロック長（ミリ秒）"),
+           lookahead_ms: int = typer.Option(50, help="先読み（ミリ秒, 遅延に加算される）"),
+           context_ms: int = typer.Option(300, help="変換時に加える直前の文脈（ミリ秒, 遅延には影響しない）"),
+           crossfade_ms: int = typer.Option(20, help="ブロック境界のクロスフェード（ミリ秒, 先読み以下）"),
+           transpose: int = typer.Option(0, help="音程シフト"),
+           f0_method: str = typer.Option("rmvpe", help="F0抽出方法"),
+           backend: str = typer.Option(None, help="推論バックエンド（convert_blockを持つPythonファイル）"),
+           stats_json: str = typer.Option(None, help="遅延の統計をJSONで保存するパス")):
+    """ストリーミング変換（生PCMを受け取りながら変換して書き出す）"""
+    import sys
+    import json
+    from . import streaming, server, rvc_wrapper
+    
+    # 標準出力は音声データに使うため、メッセージは標準エラーに出す
+    def log(message):
+        print(message, file=sys.stderr)
+    
+    backend = backend or os.path.join(rvc_wrapper.get_rvc_dir(), server.BACKEND_NAME)
+    params = {
+        'transpose': transpose,
+        'f0_method': f0_method,
+        'rms_mix_rate': 0.25,
+        'filter_radius': 3,
+        'resample_sr': 0,
+    }
+    to_samples = lambda ms: int(sample_rate * ms / 1000)
+    
+    try:
+        convert_fn = streaming.make_block_converter(backend, model_path, index_path, sample_rate, params)
+    except (OSError, ValueError) as e:
+        log(f"エラー: {e}")
+        raise typer.Exit(1)
+    converter = streaming.StreamConverter(convert_fn, sample_rate, to_samples(block_ms),
+                                          to_samples(lookahead_ms), to_samples(context_ms),
+                                          to_samples(crossfade_ms))
+    log(f"アルゴリズム遅延: {converter.latency_samples / sample_rate * 1000:.1f}ms")
+    
+    in_stream = sys.stdin.buffer if input == "-" else open(input, 'rb')
+    out_stream = sys.stdout.buffer if output == "-" else open(output, 'wb')
+    try:
+        stats = streaming.run_stream(in_stream, out_stream, converter, pcm_format)
+    except (OSError, ValueError, RuntimeError) as e:
+        log(f"エラー: {e}")
+        raise typer.Exit(1)
+    finally:
+        if input != "-":
+            in_stream.close()
+        if output != "-":
+            out_stream.close()
+    
+    for line in streaming.format_stats(stats):
+        log(line)
+    if stats_json:
+        with open(stats_json, 'w', encoding='utf-8') as f:
+            json.dump(stats, f, ensure_ascii=False, indent=2)
+
+@app.command()
+def pack(config_path: str = typer.Option(None, "--config", help="設定ファイル（既定: configs/config.yaml）"),
+         workers: int = typer.Option(0, help="圧縮の並列スレッド数（0=CPUコア数）"),
+         level: int = typer.Option(6, help="圧縮レベル（1〜9）"),
+         base_models: str = typer.Option("copy", help="事前学習モデルの扱い（copy: 同梱 / ref: ハッシュだけを記録）"),
+         incremental: bool = typer.Option(False, "--incremental", help="前回のパッケージから未変更のファイルを再利用"),
+         verify: bool = typer.Option(False, "--verify", help="作成後にマニフェストと内容を照合")):
     """モデル一式のパッケージング"""
     import os
-    import shutil
-    import zipfile
-    from datetime import datetime
+    import time
+    from . import packaging
+    from .config import RVCConfig
     
     print("モデルのパッケージングを開始します...")
     
-    # 出力ディレクトリ
-    outputs_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
-    models_dir = os.path.join(os.path.dirname(__file__), '..', 'models')
-    
-    if not os.path.exists(outputs_dir):
-        print("エラー: 出力ディレクトリが見つかりません。先に学習を実行してください。")
+    # 出力ディレクトリ（runと同じ設定のoutput_dir・models_dir・packages_dirを使う）
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    # 既定の設定ファイルがない場合は既定値（outputs/, models/, packages/）を使う
+    default_path = os.path.join(root, 'configs', 'config.yaml')
+    try:
+        if config_path or os.path.exists(default_path):
+            cfg = RVCConfig.load(config_path or default_path)
+        else:
+            cfg = RVCConfig()
+    except (FileNotFoundError, ValueError) as e:
+        print(f"エラー: {e}")
         return
+    cfg = cfg.get_absolute_paths(root)
     
-    # 最新の学習結果を検索
-    output_subdirs = [d for d in os.listdir(outputs_dir) if os.path.isdir(os.path.join(outputs_dir, d))]
-    if not output_subdirs:
-        print("エラー: 学習結果が見つかりません。先に学習を実行してください。")
+    start = time.perf_counter()
+    try:
+        print(f"パッケージング対象: {packaging.latest_output(cfg.output_dir)}")
+        package_path, entries = packaging.package_model(cfg.output_dir, cfg.models_dir, cfg.packages_dir,
+                                                        workers=workers, level=level, base_models=base_models,
+                                                        incremental=incremental)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"エラー: {e}")
         return
-    
-    # 最新のディレクトリを選択（作成日時でソート）
-    latest_dir = max(output_subdirs, key=lambda x: os.path.getctime(os.path.join(outputs_dir, x)))
-    latest_path = os.path.join(outputs_dir, latest_dir)
-    
-    print(f"パッケージング対象: {latest_dir}")
-    
-    # パッケージ名を生成
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    package_name = f"rvc_model_{latest_dir}_{timestamp}.zip"
-    package_path = os.path.join(outputs_dir, package_name)
-    
-    # ZIPファイルを作成
-    with zipfile.ZipFile(package_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        # 学習結果を追加
-        for root, dirs, files in os.walk(latest_path):
-            for file in files:
-                file_path = os.path.join(root, file)
-                arc_name = os.path.relpath(file_path, outputs_dir)
-                zipf.write(file_path, arc_name)
-                print(f"  追加: {arc_name}")
-        
-        # 必要なモデルファイルを追加
-        required_models = ['contentvec.pth', 'rmvpe.pt', 'crepe_onnx_full.onnx']
-        for model in required_models:
-            model_path = os.path.join(models_dir, model)
-            if os.path.exists(model_path):
-                zipf.write(model_path, f"models/{model}")
-                print(f"  追加: models/{model}")
+    labels = {'stored': "無圧縮", 'deflated': "圧縮", 'ref': "参照"}
+    for entry in entries:
+        label = "再利用" if entry.get('reused') else labels[entry['method']]
+        print(f"  追加: {entry['path']} ({label})")
     
     print(f"\nパッケージングが完了しました: {package_path}")
     print(f"ファイルサイズ: {os.path.getsize(package_path) / (1024*1024):.1f} MB")
+    print(f"処理時間: {time.perf_counter() - start:.1f}秒")
+    
+    if verify:
+        _print_verify(packaging.verify_package(package_path, cfg.models_dir))
+
+def _print_verify(result: dict):
+    print(f"検証: {result['checked']}ファイル / 参照 {result['refs']}件")
+    for error in result['errors']:
+        print(f"  ✗ {error}")
+    if result['errors']:
+        raise typer.Exit(1)
+    print("✓ マニフェストと一致しました")
+
+@app.command("pack-verify")
+def pack_verify(package: str = typer.Option(..., help="パッケージ（ZIP）"),
+                models_dir: str = typer.Option(None, help="参照（--base-models ref）のモデルを確認するディレクトリ")):
+    """パッケージをマニフェストと照合"""
+    from . import packaging
+    
+    if not os.path.exists(package):
+        print(f"エラー: パッケージが見つかりません: {package}")
+        raise typer.Exit(1)
+    _print_verify(packaging.verify_package(package, models_dir))
+
+@app.command()
+def run(config_path: str = typer.Option(None, "--config", help="設定ファイル（既定: configs/config.yaml）"),
+        in_dir: str = typer.Option(None, help="生音声の入力ディレクトリ（指定した場合はprepから実行）"),
+        stages: list[str] = typer.Option(None, "--stage", help="実行するステージ（上流も含む, 複数指定可, 既定: すべて）"),
+        force: list[str] = typer.Option(None, "--force", help="最新でも再実行するステージ（複数指定可）"),
+        jobs: int = typer.Option(2, help="同時に実行するステージ数"),
+        workers: int = typer.Option(0, help="prepの並列ワーカー数（0=設定のaudio.workers）"),
+        dry_run: bool = typer.Option(False, "--dry-run", help="実行せずに各ステージが最新かどうかを表示")):
+    """prep→特徴量抽出→学習→インデックス→パッケージを、変更のあったステージだけ実行"""
+    from . import config, pipeline
+
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    config_path = config_path or os.path.join(root, 'configs', 'config.yaml')
+    try:
+        cfg = config.RVCConfig.load(config_path).get_absolute_paths(root)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"エラー: {e}")
+        return
+    errors = cfg.validate()
+    if errors:
+        print("設定ファイルに問題があります:")
+        for error in errors:
+            print(f"  ✗ {error}")
+        return
+    if in_dir and not os.path.isdir(in_dir):
+        print(f"エラー: 入力ディレクトリが見つかりません: {in_dir}")
+        return
+
+    try:
+        dag = pipeline.Pipeline(pipeline.default_stages(cfg, in_dir, workers), cfg,
+                                os.path.join(cfg.temp_dir, pipeline.STATE_NAME))
+        order = dag.select(stages or None)
+    except ValueError as e:
+        print(f"エラー: {e}")
+        return
+    print(f"ステージ: {' → '.join(order)}")
+    results = dag.run(stages or None, jobs=jobs, force=force or (), dry_run=dry_run)
+
+    labels = {'ran': "実行", 'up-to-date': "最新（スキップ）", 'would-run': "実行対象",
+              'pending': "上流次第", 'failed': "失敗", 'skipped': "中止（上流の失敗）"}
+    print()
+    for r in results:
+        line = f"  {r['stage']:<18} {labels[r['status']]}"
+        if r['status'] == 'ran':
+            line += f" {r['elapsed']:.1f}秒"
+        if r.get('error'):
+            line += f": {r['error']}"
+        print(line)
+    if any(r['status'] in ('failed', 'skipped') for r in results):
+        raise typer.Exit(1)
 
 @app.command()
-def info(wav: str = typer.Option(..., help="音声ファイルパス")):
+def info(wav: str = typer.Option(..., help="音声ファイルパス"),
+         vad_backend: str = typer.Option("webrtc", help="VADバックエンド（webrtc/numpy）"),
+         vad_cache: bool = typer.Option(True, help="VAD結果のキャッシュを使用")):
     """音声ファイルの情報を表示"""
     from . import audio_utils
     
     if not os.path.exists(wav):
         print(f"エラー: ファイルが見つかりません: {wav}")
         return
+    if vad_backend not in audio_utils.VAD_BACKENDS:
+        print(f"エラー: 未対応のVADバックエンドです: {vad_backend}")
+        return
     
     print(f"音声ファイル情報: {wav}")
     print("-" * 50)
@@ -379,7 +745,7 @@ def info(wav: str = typer.Option(..., help="音声ファイルパス")):
         
         # 音声セグメントの検出
         print("\n音声セグメント検出中...")
-        segments = audio_utils.detect_speech_segments(wav)
+        segments = audio_utils.detect_speech_segments(wav, backend=vad_backend, use_cache=vad_cache)
         if segments:
             print(f"検出された音声セグメント数: {len(segments)}")
             for i, (start, end) in enumerate(segments[:5], 1):  # 最初の5個のみ表示
@@ -452,35 +818,148 @@ def config_create(project_name: str = typer.Option("my_voice_clone", help="プ
         print(f"設定ファイルの作成に失敗しました: {e}")
 
 @app.command()
-def status():
+def tune(config_path: str = typer.Option(None, "--config", help="設定ファイル（既定: configs/config.yaml）"),
+         in_dir: str = typer.Option(None, help="計測に使う音声のディレクトリ（既定: 合成音声）"),
+         max_workers: int = typer.Option(0, help="計測するワーカー数の上限（0=CPUコア数）"),
+         files: int = typer.Option(0, help="prepの計測に使うファイル数（0=上限のワーカー数の2倍, 最低8）"),
+         seconds: float = typer.Option(20.0, help="合成音声の1ファイルの秒数"),
+         loader_items: int = typer.Option(0, help="データローダーの計測で読み込む件数（0=自動）"),
+         tolerance: float = typer.Option(0.05, help="最大スループットからこの割合以内で最小のワーカー数を採用"),
+         report: str = typer.Option(None, help="計測結果のJSON（既定: 設定ファイルと同じ場所のtune_report.json）"),
+         dry_run: bool = typer.Option(False, "--dry-run", help="計測結果を表示するだけで設定に書き込まない")):
+    """このマシンでprep・データローダーのワーカー数を計測して設定に書き込む"""
+    import json
+    from . import config
+    from . import tune as tuner
+    from .cache import atomic_write
+
+    config_path = config_path or os.path.join(os.path.dirname(__file__), '..', 'configs', 'config.yaml')
+    try:
+        cfg = (config.RVCConfig.load(config_path) if os.path.exists(config_path)
+               else config.RVCConfig.create_default())
+    except ValueError as e:
+        print(f"エラー: {e}")
+        raise typer.Exit(1)
+
+    print(f"CPUコア数: {os.cpu_count()}")
+    try:
+        result = tuner.tune(cfg, in_dir, max_workers, files, seconds, loader_items, tolerance)
+    except (FileNotFoundError, RuntimeError) as e:
+        print(f"エラー: {e}")
+        raise typer.Exit(1)
+
+    best = result['best']
+    print("\nprep（デコード・VAD・LUFS正規化・分割）:")
+    for line in tuner.format_curve(result['prep'], 'files_per_sec', 'files/s', best['audio.workers']):
+        print(line)
+    print("\nデータローダー（num_workers）:")
+    for line in tuner.format_curve(result['loader'], 'items_per_sec', 'items/s', best['training.num_workers']):
+        print(line)
+    print(f"\naudio.workers: {cfg.audio.workers} -> {best['audio.workers']}")
+    print(f"training.num_workers: {cfg.training.num_workers} -> {best['training.num_workers']}")
+
+    report = report or os.path.join(os.path.dirname(os.path.abspath(config_path)), 'tune_report.json')
+    os.makedirs(os.path.dirname(os.path.abspath(report)), exist_ok=True)
+    with atomic_write(report, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"計測結果: {report}")
+    if dry_run:
+        return
+    tuner.apply(cfg, result).save(config_path)
+    print(f"設定ファイルを更新しました: {config_path}")
+
+@app.command()
+def status(follow: bool = typer.Option(False, "--follow", "-f", help="ログへの追記を読み続けて進捗を表示"),
+           interval: float = typer.Option(5.0, help="--followの更新間隔（秒）"),
+           stall_sec: float = typer.Option(600.0, help="この秒数ステップが進まなければ停止とみなす"),
+           total_steps: int = typer.Option(0, help="総ステップ数（0=configs/config.yamlのtraining.steps）"),
+           log: str = typer.Option(None, help="学習ログ（既定: 最新の学習結果の最新の.log）"),
+           lines: int = typer.Option(10, help="表示するログ末尾の行数"),
+           json_out: bool = typer.Option(False, "--json", help="集計をJSONで出力（--followでは1行に1件）"),
+           series: str = typer.Option(None, help="ステップ・損失・チェックポイントの時系列をJSONで保存するパス")):
     """学習状況の確認"""
     import os
-    from . import rvc_wrapper
-    
-    outputs_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
+    import json
+    from . import train_monitor
     
-    if not os.path.exists(outputs_dir):
-        print("出力ディレクトリが存在しません。先に学習を実行してください。")
+    if log is None:
+        outputs_dir = os.path.join(os.path.dirname(__file__), '..', 'outputs')
+        
+        if not os.path.exists(outputs_dir):
+            print("出力ディレクトリが存在しません。先に学習を実行してください。")
+            return
+        
+        # 最新の学習結果を検索
+        output_subdirs = [d for d in os.listdir(outputs_dir) if os.path.isdir(os.path.join(outputs_dir, d))]
+        if not output_subdirs:
+            print("学習結果が見つかりません。先に学習を実行してください。")
+            return
+        
+        # 最新のディレクトリを選択
+        latest_dir = max(output_subdirs, key=lambda x: os.path.getctime(os.path.join(outputs_dir, x)))
+        latest_path = os.path.join(outputs_dir, latest_dir)
+        
+        if not json_out:
+            print(f"最新の学習結果: {latest_dir}")
+            print(f"パス: {latest_path}")
+        log = train_monitor.latest_log(latest_path)
+        if not log:
+            print("学習ログファイルが見つかりません")
+            return
+    elif not os.path.exists(log):
+        print(f"エラー: ログファイルが見つかりません: {log}")
         return
     
-    # 最新の学習結果を検索
-    output_subdirs = [d for d in os.listdir(outputs_dir) if os.path.isdir(os.path.join(outputs_dir, d))]
-    if not output_subdirs:
-        print("学習結果が見つかりません。先に学習を実行してください。")
-        return
+    if not total_steps:
+        config_path = os.path.join(os.path.dirname(__file__), '..', 'configs', 'config.yaml')
+        if os.path.exists(config_path):
+            from .config import RVCConfig
+            try:
+                total_steps = RVCConfig.load(config_path).steps
+            except ValueError:
+                total_steps = 0
+    
+    monitor = train_monitor.TrainingMonitor(total_steps, stall_sec)
     
-    # 最新のディレクトリを選択
-    latest_dir = max(output_subdirs, key=lambda x: os.path.getctime(os.path.join(outputs_dir, x)))
-    latest_path = os.path.join(outputs_dir, latest_dir)
+    def save_series():
+        from .cache import atomic_write
+        with atomic_write(series, 'w', encoding='utf-8') as f:
+            json.dump(list(monitor.series), f, ensure_ascii=False)
     
-    print(f"最新の学習結果: {latest_dir}")
-    print(f"パス: {latest_path}")
+    def show(summary):
+        if json_out:
+            print(json.dumps(summary, ensure_ascii=False), flush=True)
+        else:
+            print(train_monitor.format_summary(summary), flush=True)
+        # 追跡中は更新ごとに保存（停止シグナルで終了しても直近の時系列が残る）
+        if series:
+            save_series()
     
-    # 学習状況を確認
-    rvc_wrapper.get_training_status(latest_path)
+    if not json_out:
+        print(f"ログ: {log}")
+    try:
+        if follow:
+            for summary in train_monitor.follow(log, monitor, interval):
+                show(summary)
+        else:
+            train_monitor.read_recent(log, monitor)
+            if not json_out and lines:
+                print("最新のログ内容:")
+                for line in train_monitor.tail_lines(log, lines):
+                    print(f"  {line.strip()}")
+            show(monitor.summary())
+    except KeyboardInterrupt:
+        if series:
+            save_series()
 
 @app.command()
-def extract_features(dataset_dir: str = typer.Option(None, help="データセットディレクトリ")):
+def extract_features(dataset_dir: str = typer.Option(None, help="データセットディレクトリ"),
+                     f0_method: str = typer.Option("rmvpe", help="F0抽出方法"),
+                     f0_cache: bool = typer.Option(True, help="同じ音声のF0をキャッシュから再利用"),
+                     shards: int = typer.Option(1, help="データセットを分割するシャード数（2以上で並列実行）"),
+                     workers: int = typer.Option(None, help="同時に実行するシャード数（既定: CPUコア数）"),
+                     retries: int = typer.Option(1, help="失敗したシャードの再実行回数"),
+                     resume: bool = typer.Option(True, help="前回完了したシャードを省く")):
     """特徴量抽出の実行"""
     import os
     from . import rvc_wrapper, config
@@ -497,7 +976,9 @@ def extract_features(dataset_dir: str = typer.Option(None, help="データセッ
     print(f"データセットディレクトリ: {dataset_dir}")
     
     try:
-        success = rvc_wrapper.extract_features(dataset_dir)
+        success = rvc_wrapper.extract_features(dataset_dir, f0_method, use_f0_cache=f0_cache, shards=shards,
+                                               workers=workers or os.cpu_count() or 1, retries=retries,
+                                               resume=resume)
         if success:
             print("特徴量抽出が完了しました")
         else:
@@ -506,5 +987,79 @@ def extract_features(dataset_dir: str = typer.Option(None, help="データセッ
     except Exception as e:
         print(f"特徴量抽出でエラーが発生しました: {e}")
 
+@app.command("f0-cache")
+def f0_cache(clear: bool = typer.Option(False, "--clear", help="キャッシュをすべて削除"),
+             max_mb: float = typer.Option(None, help="この容量（MB）を超える分を古いものから削除")):
+    """F0キャッシュの使用量を表示・整理"""
+    from .f0_cache import F0Cache
+    
+    cache = F0Cache(budget_mb=max_mb)
+    if clear:
+        print(f"F0キャッシュを削除しました: {cache.clear()}件")
+    elif max_mb is not None:
+        print(f"F0キャッシュから削除しました: {cache.evict()}件")
+    stats = cache.stats()
+    print(f"F0キャッシュ: {cache.root}")
+    print(f"  {stats['entries']}件, {stats['size_mb']:.1f} / {stats['budget_mb']:.0f} MB")
+
+index_app = typer.Typer(help="検索インデックス（faiss）の構築とベンチマーク")
+app.add_typer(index_app, name="index")
+
+@index_app.command("build")
+def index_build(features: str = typer.Option(..., help="特徴量（.npyファイル、または.npyを含むディレクトリ）"),
+                out: str = typer.Option(..., help="出力する.indexファイル"),
+                kind: str = typer.Option("ivf", help="インデックスの種類（flat/ivf/ivfpq）"),
+                nlist: int = typer.Option(0, help="IVFのクラスタ数（0=データ数から自動）"),
+                nprobe: int = typer.Option(0, help="検索時に調べるクラスタ数（0=既定値）"),
+                m: int = typer.Option(0, help="PQの分割数（0=次元から自動）"),
+                nbits: int = typer.Option(8, help="PQの符号ビット数")):
+    """特徴量から検索インデックスを構築"""
+    from . import faiss_index
+    
+    try:
+        data = faiss_index.load_features(features)
+        spec = ':'.join([kind] + [f"{k}={v}" for k, v in
+                                  (('nlist', nlist), ('nprobe', nprobe), ('m', m)) if v]
+                        + ([f"nbits={nbits}"] if kind == 'ivfpq' else []))
+        cfg = faiss_index.parse_spec(spec, len(data), data.shape[1])
+        print(f"特徴量: {data.shape[0]}件 x {data.shape[1]}次元")
+        print(f"インデックス: {faiss_index.spec_name(cfg)} ({faiss_index.factory_string(cfg)})")
+        index, build_sec = faiss_index.build_index(data, cfg)
+        faiss_index.save_index(index, out)
+    except (ImportError, OSError, ValueError, RuntimeError) as e:
+        print(f"エラー: {e}")
+        return
+    
+    print(f"構築時間: {build_sec:.2f}秒 / サイズ: {os.path.getsize(out) / (1 << 20):.1f}MB")
+    print(f"保存しました: {out}")
+
+@index_app.command("bench")
+def index_bench(features: str = typer.Option(..., help="特徴量（.npyファイル、または.npyを含むディレクトリ）"),
+                spec: list[str] = typer.Option(["flat", "ivf", "ivf:nprobe=8", "ivfpq", "ivfpq:nprobe=32"],
+                                               help="比較する設定（例: ivfpq:nlist=1024:m=32:nprobe=16）"),
+                k: int = typer.Option(8, help="近傍数（recall@kのk）"),
+                queries: int = typer.Option(1000, help="クエリ数（登録データから除外して使う）"),
+                json_out: str = typer.Option(None, "--json", help="結果をJSONで保存するパス")):
+    """インデックス設定ごとの構築時間・サイズ・レイテンシ・recall@kを比較"""
+    from . import faiss_index
+    import json
+    
+    try:
+        data = faiss_index.load_features(features)
+        print(f"特徴量: {data.shape[0]}件 x {data.shape[1]}次元 / k={k}")
+        results = faiss_index.run_bench(data, spec, k, queries)
+    except (ImportError, OSError, ValueError, RuntimeError) as e:
+        print(f"エラー: {e}")
+        return
+    
+    print(f"{'spec':<36} {'build(s)':>8} {'size(MB)':>9} {'p50(ms)':>8} {'p99(ms)':>8} {'QPS':>9} {'recall':>7}")
+    for r in results:
+        print(f"{r['spec']:<36} {r['build_sec']:>8.2f} {r['size_mb']:>9.1f} {r['latency_ms_p50']:>8.3f} "
+              f"{r['latency_ms_p99']:>8.3f} {r['batch_qps']:>9.0f} {r['recall']:>7.3f}")
+    
+    if json_out:
+        with open(json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
 if __name__ == "__main__":
     app()
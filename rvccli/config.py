@@ -12,9 +12,15 @@ class AudioConfig:
     normalize_lufs: float = -23.0
     trim_silence: bool = True
     vad_aggressiveness: int = 2
+    vad_backend: str = "webrtc"
+    vad_cache: bool = True
     chunk_duration: float = 12.0
+    snap_to_silence: bool = False
+    snap_window_sec: float = 1.0
+    stream_block_sec: float = 0.0  # 0より大きい場合はこの秒数のブロック単位で処理（メモリ使用量を一定に保つ）
     fade_in_ms: int = 100
     fade_out_ms: int = 100
+    workers: int = 0  # prepの並列ワーカー数（0=CPUコア数, rvccli tuneで計測した値を書き込む）
 
 @dataclass
 class TrainingConfig:
@@ -62,6 +68,7 @@ class RVCConfig:
     output_dir: str = "outputs"
     models_dir: str = "models"
     temp_dir: str = "temp"
+    packages_dir: str = "packages"
     
     # 互換性のための古いパラメータ
     @property
@@ -149,6 +156,10 @@ class RVCConfig:
                     config.output_dir = data['output_dir']
                 if 'models_dir' in data:
                     config.models_dir = data['models_dir']
+                if 'temp_dir' in data:
+                    config.temp_dir = data['temp_dir']
+                if 'packages_dir' in data:
+                    config.packages_dir = data['packages_dir']
                 
                 return config
             else:
@@ -161,7 +172,7 @@ class RVCConfig:
 
     def save(self, path: str):
         """設定ファイルを保存"""
-        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
         
         # 設定データを辞書に変換
         config_dict = asdict(self)
@@ -211,6 +222,12 @@ class RVCConfig:
         if not 0 <= self.audio.vad_aggressiveness <= 3:
             errors.append(f"VADアグレッシブネスは0から3の範囲である必要があります: {self.audio.vad_aggressiveness}")
         
+        if self.audio.vad_backend not in ["webrtc", "numpy"]:
+            errors.append(f"VADバックエンドはwebrtc, numpyのいずれかである必要があります: {self.audio.vad_backend}")
+        
+        if self.audio.workers < 0:
+            errors.append(f"前処理のワーカー数は0以上である必要があります: {self.audio.workers}")
+        
         # 学習設定の検証
         if self.training.batch_size <= 0:
             errors.append(f"バッチサイズは正の値である必要があります: {self.training.batch_size}")
@@ -221,6 +238,9 @@ class RVCConfig:
         if self.training.steps <= 0:
             errors.append(f"学習ステップ数は正の値である必要があります: {self.training.steps}")
         
+        if self.training.num_workers < 0:
+            errors.append(f"データローダーのワーカー数は0以上である必要があります: {self.training.num_workers}")
+        
         if self.training.f0_method not in ["rmvpe", "crepe", "harvest", "pm"]:
             errors.append(f"F0抽出方法はrmvpe, crepe, harvest, pmのいずれかである必要があります: {self.training.f0_method}")
         
@@ -246,6 +266,7 @@ class RVCConfig:
         config.output_dir = os.path.abspath(os.path.join(base_dir, self.output_dir))
         config.models_dir = os.path.abspath(os.path.join(base_dir, self.models_dir))
         config.temp_dir = os.path.abspath(os.path.join(base_dir, self.temp_dir))
+        config.packages_dir = os.path.abspath(os.path.join(base_dir, self.packages_dir))
         
         return config
 
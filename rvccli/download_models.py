@@ -1,68 +1,296 @@
 import os
+import re
+import json
+import time
+import shutil
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
 import requests
 
-def download_contentvec(models_dir: str):
-    """ContentVecモデルのダウンロード"""
-    url = "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/contentvec/pretrained/contentvec.pth"
-    filename = "contentvec.pth"
-    filepath = os.path.join(models_dir, filename)
-    if not os.path.exists(filepath):
-        print(f"Downloading ContentVec model to {filepath}...")
+from .cache import atomic_write, file_sha256
+from . import profiling
+
+# 必要なモデル（ファイル名 -> 取得元）
+MODELS = {
+    "contentvec.pth": "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/contentvec/pretrained/contentvec.pth",
+    "rmvpe.pt": "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/rmvpe.pt",
+    "crepe_onnx_full.onnx": "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/crepe_onnx_full.onnx",
+}
+# ダウンロードしたファイルのサイズとSHA-256の記録
+# 初回のダウンロードは取得元が公開するSHA-256（Hugging FaceのLFSファイルはX-Linked-Etag）と照合し、
+# 以降はこの記録と照合する
+MANIFEST_NAME = "model_manifest.json"
+# Hugging FaceはLFSファイルのresolve URLへのHEADに、実体のSHA-256とサイズをこのヘッダーで返す
+LINKED_ETAG_HEADER = "X-Linked-Etag"
+LINKED_SIZE_HEADER = "X-Linked-Size"
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+# ミラー（<URL>/<ファイル名>で取得）と、複数のノードで共有するキャッシュディレクトリ
+MIRROR_ENV = "RVCCLI_MODEL_MIRROR"
+SHARED_CACHE_ENV = "RVCCLI_MODEL_CACHE"
+CHUNK_SIZE = 1 << 20
+WRITE_BUFFER = 8 << 20
+TIMEOUT = 30
+RETRIES = 3
+
+_manifest_lock = threading.Lock()
+
+
+def load_manifest(store_dir: str) -> dict:
+    try:
+        with open(os.path.join(store_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def record(store_dir: str, name: str, path: str, url: str = None, sha256: str = None) -> dict:
+    """ファイルのサイズとSHA-256をマニフェストに記録（他のプロセスの記録を消さないよう読み直して更新）"""
+    entry = {'size': os.path.getsize(path), 'sha256': sha256 or file_sha256(path)}
+    if url:
+        entry['url'] = url
+    with _manifest_lock:
+        manifest = load_manifest(store_dir)
+        manifest[name] = entry
+        with atomic_write(os.path.join(store_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return entry
+
+
+def model_url(name: str, mirror: str = None) -> str:
+    mirror = mirror or os.environ.get(MIRROR_ENV)
+    return f"{mirror.rstrip('/')}/{name}" if mirror else MODELS[name]
+
+
+@contextlib.contextmanager
+def _store_lock(store_dir: str, name: str):
+    """同じファイルを複数のプロセス（共有キャッシュでは複数のノード）が同時に取得しないようにする"""
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    with open(os.path.join(store_dir, f".{name}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _total_size(response: requests.Response, offset: int) -> Optional[int]:
+    content_range = response.headers.get('Content-Range', '')
+    if '/' in content_range and not content_range.endswith('/*'):
+        return int(content_range.rsplit('/', 1)[1])
+    length = response.headers.get('Content-Length')
+    return int(length) + offset if length is not None else None
+
+
+def download_file(url: str, dest: str, retries: int = RETRIES, session: requests.Session = None) -> int:
+    """urlを<dest>.partに取得して、完了したらdestに置き換え、今回受信したバイト数を返す
+
+    .partが残っていればRangeで続きから取得する（サーバーが対応していなければ最初から）。
+    接続が切れた場合はretries回まで再開する。
+    """
+    session = session or requests
+    part = dest + ".part"
+    received = 0
+    for attempt in range(retries + 1):
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        headers = {'Range': f'bytes={offset}-'} if offset else {}
         try:
-            r = requests.get(url, stream=True)
+            with session.get(url, stream=True, headers=headers, timeout=TIMEOUT) as r:
+                if r.status_code == 416:
+                    # .partがサーバーのファイルより長い（別のファイルの残り）
+                    os.remove(part)
+                    continue
+                r.raise_for_status()
+                if offset and r.status_code != 206:
+                    offset = 0
+                total = _total_size(r, offset)
+                with open(part, 'ab' if offset else 'wb', buffering=WRITE_BUFFER) as f:
+                    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                        f.write(chunk)
+                        received += len(chunk)
+            size = os.path.getsize(part)
+            if total is not None and size != total:
+                raise IOError(f"受信したサイズが一致しません: {size} / {total}")
+            os.replace(part, dest)
+            return received
+        except (requests.RequestException, IOError) as e:
+            if attempt == retries:
+                raise
+            wait = min(2 ** attempt, 10)
+            print(f"  {os.path.basename(dest)}: {e} — {wait}秒後に再開します ({attempt + 1}/{retries})")
+            time.sleep(wait)
+    raise IOError(f"ダウンロードに失敗しました: {url}")
+
+
+def _remote_info(url: str) -> dict:
+    """取得元が公開するサイズとSHA-256（わからない項目はNone）
+
+    Hugging FaceはCDNへリダイレクトする前の応答にX-Linked-Etag（SHA-256）とX-Linked-Sizeを付けるため、
+    リダイレクトをたどらずにHEADを送り、サイズがわからなければリダイレクト先のContent-Lengthを使う。
+    """
+    info = {'size': None, 'sha256': None}
+    try:
+        r = requests.head(url, allow_redirects=False, timeout=TIMEOUT)
+        etag = r.headers.get(LINKED_ETAG_HEADER, '').strip()
+        etag = etag[2:] if etag.startswith('W/') else etag
+        etag = etag.strip('"').lower()
+        if _SHA256_RE.match(etag):
+            info['sha256'] = etag
+        if r.headers.get(LINKED_SIZE_HEADER):
+            info['size'] = int(r.headers[LINKED_SIZE_HEADER])
+        if info['size'] is None:
+            if r.is_redirect:
+                r = requests.head(url, allow_redirects=True, timeout=TIMEOUT)
             r.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print("ContentVec model downloaded.")
-        except Exception as e:
-            print(f"Failed to download ContentVec: {e}")
+            length = r.headers.get('Content-Length')
+            info['size'] = int(length) if length is not None else None
+    except (requests.RequestException, ValueError):
+        pass
+    return info
+
+
+def _is_valid(path: str, entry: Optional[dict], verify: bool) -> bool:
+    """記録と比べてファイルが完全か（verifyの場合はSHA-256まで確認）"""
+    if not os.path.exists(path) or not entry or os.path.getsize(path) != entry['size']:
+        return False
+    return not verify or file_sha256(path) == entry['sha256']
+
+
+def _fetch(name: str, store_dir: str, mirror: str, retries: int) -> str:
+    """store_dirにモデルを取得して記録（なければ取得元が公開するSHA-256）と照合し、'downloaded'を返す"""
+    url = model_url(name, mirror)
+    dest = os.path.join(store_dir, name)
+    expected = load_manifest(store_dir).get(name)
+    remote = _remote_info(url) if not expected else None
+    print(f"Downloading {name} from {url}...")
+    start = time.perf_counter()
+    received = download_file(url, dest, retries)
+    elapsed = time.perf_counter() - start
+    sha256 = file_sha256(dest)
+    if expected and (sha256 != expected['sha256'] or os.path.getsize(dest) != expected['size']):
+        os.remove(dest)
+        raise IOError(f"SHA-256が記録と一致しません（取得元のファイルが変わった可能性があります）: {name}")
+    if remote and remote['sha256'] and sha256 != remote['sha256']:
+        os.remove(dest)
+        raise IOError(f"SHA-256が取得元の公開する値と一致しません: {name}")
+    if remote and remote['size'] is not None and os.path.getsize(dest) != remote['size']:
+        os.remove(dest)
+        raise IOError(f"サイズが取得元の公開する値と一致しません: {name}")
+    if remote and not remote['sha256']:
+        print(f"  {name}: 取得元がSHA-256を公開していないため、取得したファイルのハッシュを記録して以降の照合に使います")
+    record(store_dir, name, dest, url, sha256)
+    print(f"{name} downloaded ({received / (1 << 20):.1f}MB, {received / (1 << 20) / max(elapsed, 1e-6):.1f}MB/s).")
+    return 'downloaded'
+
+
+def _install(src: str, dest: str):
+    """共有キャッシュからモデルディレクトリへ（同じファイルシステムならハードリンク、そうでなければコピー）"""
+    if os.path.exists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        with atomic_write(dest, 'wb') as f, open(src, 'rb') as s:
+            shutil.copyfileobj(s, f, WRITE_BUFFER)
+
+
+def ensure_model(name: str, models_dir: str, mirror: str = None, cache_dir: str = None,
+                 verify: bool = False, retries: int = RETRIES) -> str:
+    """1つのモデルを用意し、状態（present / downloaded / cached）を返す
+
+    既存のファイルは記録したサイズ（verifyの場合はSHA-256も）と照合し、一致しなければ取得し直す。
+    記録のない既存のファイルは取得元が公開するSHA-256（なければサイズ）と比べ、一致すればそのハッシュを記録する。
+    cache_dirを指定した場合は共有キャッシュに取得し、モデルディレクトリにはリンクまたはコピーを置く。
+    """
+    dest = os.path.join(models_dir, name)
+    entry = load_manifest(models_dir).get(name)
+    if os.path.exists(dest):
+        if _is_valid(dest, entry, verify):
+            print(f"{name} already exists.")
+            return 'present'
+        if entry is None:
+            remote = _remote_info(model_url(name, mirror))
+            if remote['sha256']:
+                sha256 = file_sha256(dest)
+                if sha256 == remote['sha256']:
+                    record(models_dir, name, dest, sha256=sha256)
+                    print(f"{name} already exists.")
+                    return 'present'
+            elif remote['size'] is None:
+                # 確認できるまでは記録しない（途中で切れたファイルを正しいものとして記録しない）
+                print(f"{name} already exists (取得元のサイズを確認できないため未検証).")
+                return 'present'
+            elif remote['size'] == os.path.getsize(dest):
+                record(models_dir, name, dest)
+                print(f"{name} already exists.")
+                return 'present'
+        print(f"{name} is incomplete or corrupted; downloading again.")
+
+    store_dir = cache_dir or models_dir
+    os.makedirs(store_dir, exist_ok=True)
+    with _store_lock(store_dir, name):
+        cached = os.path.join(store_dir, name)
+        # ロックを待つ間に他のプロセスが取得を終えていればそれを使う（共有キャッシュでなくても同じ）
+        if _is_valid(cached, load_manifest(store_dir).get(name), verify):
+            status = 'cached' if store_dir != models_dir else 'present'
+        else:
+            status = _fetch(name, store_dir, mirror, retries)
+    if store_dir != models_dir:
+        _install(cached, dest)
+        cache_entry = load_manifest(store_dir)[name]
+        record(models_dir, name, dest, cache_entry.get('url'), cache_entry['sha256'])
+        if status == 'cached':
+            print(f"{name} installed from cache {store_dir}.")
+    return status
+
+
+def _ensure_or_report(name: str, models_dir: str, *args) -> str:
+    try:
+        with profiling.span('download.model', model=name):
+            return ensure_model(name, models_dir, *args)
+    except Exception as e:
+        print(f"Failed to download {name}: {e}")
+        return 'failed'
+
+
+def ensure_models(models_dir: str, mirror: str = None, cache_dir: str = None, workers: int = 0,
+                  verify: bool = False, retries: int = RETRIES) -> Dict[str, str]:
+    """必要モデルの存在確認とDL/手動配置案内（各モデルは並列に取得する）"""
+    os.makedirs(models_dir, exist_ok=True)
+    cache_dir = cache_dir or os.environ.get(SHARED_CACHE_ENV)
+    print("Checking and downloading required models...")
+    results = {}
+
+    def run(name):
+        results[name] = _ensure_or_report(name, models_dir, mirror, cache_dir, verify, retries)
+
+    with ThreadPoolExecutor(max_workers=workers or len(MODELS)) as executor:
+        list(executor.map(run, MODELS))
+    failed = [name for name, status in results.items() if status == 'failed']
+    if failed:
+        print(f"Failed models: {', '.join(failed)}")
+        print(f"手動で {models_dir} に配置してください: " + ', '.join(MODELS[name] for name in failed))
     else:
-        print("ContentVec model already exists.")
+        print("All required models are ready.")
+    return results
+
+
+def download_contentvec(models_dir: str):
+    """ContentVecモデルのダウンロード"""
+    return _ensure_or_report("contentvec.pth", models_dir)
+
 
 def download_rmvpe(models_dir: str):
     """RMVPEモデルのダウンロード"""
-    url = "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/rmvpe.pt"
-    filename = "rmvpe.pt"
-    filepath = os.path.join(models_dir, filename)
-    if not os.path.exists(filepath):
-        print(f"Downloading RMVPE model to {filepath}...")
-        try:
-            r = requests.get(url, stream=True)
-            r.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print("RMVPE model downloaded.")
-        except Exception as e:
-            print(f"Failed to download RMVPE: {e}")
-    else:
-        print("RMVPE model already exists.")
+    return _ensure_or_report("rmvpe.pt", models_dir)
+
 
 def download_crepe(models_dir: str):
     """CREPEモデルのダウンロード"""
-    url = "https://huggingface.co/lj1995/VoiceConversionWebUI/resolve/main/crepe_onnx_full.onnx"
-    filename = "crepe_onnx_full.onnx"
-    filepath = os.path.join(models_dir, filename)
-    if not os.path.exists(filepath):
-        print(f"Downloading CREPE model to {filepath}...")
-        try:
-            r = requests.get(url, stream=True)
-            r.raise_for_status()
-            with open(filepath, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
-                    f.write(chunk)
-            print("CREPE model downloaded.")
-        except Exception as e:
-            print(f"Failed to download CREPE: {e}")
-    else:
-        print("CREPE model already exists.")
-
-def ensure_models(models_dir: str):
-    """必要モデルの存在確認とDL/手動配置案内"""
-    os.makedirs(models_dir, exist_ok=True)
-    print("Checking and downloading required models...")
-    download_contentvec(models_dir)
-    download_rmvpe(models_dir)
-    download_crepe(models_dir)
-    print("All required models are ready.")
+    return _ensure_or_report("crepe_onnx_full.onnx", models_dir)
@@ -0,0 +1,199 @@
+import os
+import glob
+import hashlib
+import logging
+import numpy as np
+from typing import List, Optional, Tuple
+
+from .cache import get_cache_dir, file_sha256, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# キャッシュのメモリ（ディスク）予算（MB, 環境変数で変更可能）
+F0_CACHE_MB_ENV = "RVCCLI_F0_CACHE_MB"
+DEFAULT_F0_CACHE_MB = 1024
+F0_CACHE_VERSION = 1
+# RVCのF0抽出の既定値（16kHzで160サンプルごと = 10ms）
+F0_SAMPLE_RATE = 16000
+F0_HOP_SIZE = 160
+# フォークの特徴量抽出が書き出すF0（連続値Hz / 1〜255に量子化した値）のディレクトリ
+F0_DIR = "2b-f0nsf"
+F0_COARSE_DIR = "2a_f0"
+# RVCの量子化の範囲（Hz）
+F0_MIN = 50.0
+F0_MAX = 1100.0
+
+
+def f0_key(content_hash: str, method: str, hop_size: int = F0_HOP_SIZE,
+           sample_rate: int = F0_SAMPLE_RATE) -> str:
+    """キャッシュのキー（音声の内容ハッシュ・抽出方法・ホップ長・サンプリングレート）"""
+    raw = f"v{F0_CACHE_VERSION}:{content_hash}:{method}:{hop_size}:{sample_rate}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def coarse_f0(f0: np.ndarray) -> np.ndarray:
+    """F0（Hz）をRVCと同じメル尺度で1〜255に量子化"""
+    mel_min = 1127 * np.log(1 + F0_MIN / 700)
+    mel_max = 1127 * np.log(1 + F0_MAX / 700)
+    mel = 1127 * np.log(1 + np.asarray(f0, dtype=np.float64) / 700)
+    voiced = mel > 0
+    mel[voiced] = (mel[voiced] - mel_min) * 254 / (mel_max - mel_min) + 1
+    mel = np.clip(mel, 1, 255)
+    return np.rint(mel).astype(np.int64)
+
+
+class F0Cache:
+    """F0系列のディスクキャッシュ
+
+    float16の.npyで保存し（1〜1100Hzでの誤差は0.5Hz未満）、合計サイズが予算を超えたら
+    最も長く使われていないもの（更新時刻が古いもの）から削除する。ヒット時は更新時刻を更新する。
+    """
+
+    def __init__(self, root: str = None, budget_mb: float = None):
+        self.root = root or get_cache_dir("f0")
+        if budget_mb is None:
+            budget_mb = float(os.environ.get(F0_CACHE_MB_ENV, DEFAULT_F0_CACHE_MB))
+        self.budget_bytes = int(budget_mb * (1 << 20))
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + ".npy")
+
+    def get(self, content_hash: str, method: str, hop_size: int = F0_HOP_SIZE,
+            sample_rate: int = F0_SAMPLE_RATE) -> Optional[np.ndarray]:
+        """キャッシュ済みのF0（float32）。なければNone"""
+        path = self._path(f0_key(content_hash, method, hop_size, sample_rate))
+        try:
+            f0 = np.load(path).astype(np.float32)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return f0
+
+    def contains(self, content_hash: str, method: str, hop_size: int = F0_HOP_SIZE,
+                 sample_rate: int = F0_SAMPLE_RATE) -> bool:
+        return os.path.exists(self._path(f0_key(content_hash, method, hop_size, sample_rate)))
+
+    def put(self, content_hash: str, method: str, f0: np.ndarray, hop_size: int = F0_HOP_SIZE,
+            sample_rate: int = F0_SAMPLE_RATE, evict: bool = True):
+        """F0を保存（evict=Falseの場合は予算の確認を呼び出し側でまとめて行う）"""
+        path = self._path(f0_key(content_hash, method, hop_size, sample_rate))
+        with atomic_write(path, 'wb') as f:
+            np.save(f, np.asarray(f0, dtype=np.float16))
+        if evict:
+            self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for path in glob.glob(os.path.join(self.root, '*', '*.npy')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self) -> int:
+        """予算を超えている間、古いものから削除して削除数を返す"""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> int:
+        entries = self._entries()
+        for _, _, path in entries:
+            os.remove(path)
+        return len(entries)
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'size_mb': sum(size for _, size, _ in entries) / (1 << 20),
+            'budget_mb': self.budget_bytes / (1 << 20),
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+def dataset_wavs(dataset_dir: str) -> List[str]:
+    """データセット内のWAV（F0の出力ディレクトリと、'.'で始まる作業ディレクトリは除く）"""
+    wavs = []
+    for root, dirs, files in os.walk(dataset_dir):
+        dirs[:] = sorted(d for d in dirs if d not in (F0_DIR, F0_COARSE_DIR) and not d.startswith('.'))
+        wavs.extend(os.path.join(root, f) for f in sorted(files) if f.lower().endswith('.wav'))
+    return wavs
+
+
+def f0_output_paths(dataset_dir: str, wav_path: str) -> Tuple[str, str]:
+    """フォークが書き出すF0ファイル（連続値, 量子化）のパス
+
+    名前はデータセットからの相対パスの区切りを'_'に置き換えたもの（例: a_chunks_chunk_0000.wav.npy）。
+    """
+    name = os.path.relpath(wav_path, dataset_dir).replace(os.sep, '_') + ".npy"
+    return os.path.join(dataset_dir, F0_DIR, name), os.path.join(dataset_dir, F0_COARSE_DIR, name)
+
+
+def materialize(dataset_dir: str, method: str, cache: F0Cache = None) -> dict:
+    """キャッシュ済みのF0をフォークの出力ディレクトリに書き出す
+
+    フォークはF0ファイルが既にある音声の抽出を省くため、同じ音声のF0は再計算されない。
+    戻り値のhashesは次のingestで使う（WAVのパス -> 内容ハッシュ）。
+    """
+    cache = cache or F0Cache()
+    hashes = {}
+    restored = 0
+    missing = 0
+    for wav in dataset_wavs(dataset_dir):
+        f0_path, coarse_path = f0_output_paths(dataset_dir, wav)
+        if os.path.exists(f0_path) and os.path.exists(coarse_path):
+            continue
+        hashes[wav] = file_sha256(wav)
+        f0 = cache.get(hashes[wav], method)
+        if f0 is None:
+            missing += 1
+            continue
+        for path, values in ((f0_path, f0), (coarse_path, coarse_f0(f0))):
+            with atomic_write(path, 'wb') as f:
+                np.save(f, values)
+        restored += 1
+    if restored:
+        logger.info(f"F0キャッシュから{restored}件を復元しました（未抽出: {missing}件）")
+    return {'restored': restored, 'missing': missing, 'hashes': hashes}
+
+
+def ingest(dataset_dir: str, method: str, cache: F0Cache = None, hashes: dict = None) -> int:
+    """フォークが抽出したF0をキャッシュに取り込み、取り込んだ件数を返す
+
+    hashes（materializeの戻り値）を渡した場合は、実行前にF0がなかった音声だけを対象にする。
+    """
+    cache = cache or F0Cache()
+    wavs = list(hashes) if hashes is not None else dataset_wavs(dataset_dir)
+    hashes = hashes or {}
+    added = 0
+    for wav in wavs:
+        f0_path, _ = f0_output_paths(dataset_dir, wav)
+        if not os.path.exists(f0_path):
+            continue
+        content_hash = hashes.get(wav) or file_sha256(wav)
+        if cache.contains(content_hash, method):
+            continue
+        cache.put(content_hash, method, np.load(f0_path), evict=False)
+        added += 1
+    if added:
+        cache.evict()
+        logger.info(f"F0キャッシュに{added}件を追加しました")
+    return added
@@ -0,0 +1,187 @@
+import os
+import glob
+import time
+import logging
+import numpy as np
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# インデックスの種類
+INDEX_KINDS = ('flat', 'ivf', 'ivfpq')
+# 学習に使う1クラスタあたりの最大サンプル数（faissの推奨値）
+_TRAIN_PER_LIST = 256
+
+
+def _import_faiss():
+    try:
+        import faiss
+    except ImportError:
+        raise ImportError("faiss-cpuがインストールされていません: pip install faiss-cpu")
+    return faiss
+
+
+def load_features(path: str) -> np.ndarray:
+    """特徴量（.npyファイル、または.npyを含むディレクトリ）を(N, D)のfloat32配列として読み込む"""
+    if os.path.isdir(path):
+        files = sorted(glob.glob(os.path.join(path, '**', '*.npy'), recursive=True))
+    else:
+        files = [path]
+    if not files:
+        raise FileNotFoundError(f"特徴量ファイルが見つかりません: {path}")
+    arrays = []
+    for f in files:
+        array = np.load(f)
+        arrays.append(array.reshape(-1, array.shape[-1]).astype(np.float32, copy=False))
+    return np.ascontiguousarray(np.concatenate(arrays))
+
+
+def auto_nlist(n: int) -> int:
+    """IVFのクラスタ数（Mangio-RVC-Forkの学習スクリプトと同じ目安）"""
+    return max(1, min(int(16 * np.sqrt(n)), n // 39))
+
+
+def parse_spec(spec: str, n: int = 0, dim: int = 0) -> dict:
+    """'ivfpq:nlist=1024:m=32:nprobe=16' 形式の指定を設定の辞書に変換
+
+    nlist省略時はデータ数から決め、mは次元の約数から既定値（1ベクトル約32バイト）を選ぶ。
+    データ数nを指定した場合、faissの学習に必要な件数（nlist件以上, PQは2^nbits件以上）に収まるよう
+    nlistとnbitsを小さくし、それでも足りない場合はValueErrorを送出する。
+    """
+    
+    kind, *options = spec.split(':')
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"未対応のインデックスの種類です: {kind}（{'/'.join(INDEX_KINDS)}）")
+    cfg = {'kind': kind}
+    for option in options:
+        key, _, value = option.partition('=')
+        if key not in ('nlist', 'nprobe', 'm', 'nbits'):
+            raise ValueError(f"未対応のオプションです: {key}")
+        cfg[key] = int(value)
+    if kind != 'flat':
+        cfg.setdefault('nlist', auto_nlist(n))
+        cfg.setdefault('nprobe', 1 if kind == 'ivf' else 8)
+        if n and cfg['nlist'] > n:
+            logger.warning(f"nlistをデータ数に合わせて{cfg['nlist']}から{n}にします")
+            cfg['nlist'] = n
+    if kind == 'ivfpq':
+        cfg.setdefault('nbits', 8)
+        # PQの各部分空間は2^nbits個の代表ベクトルを学習するため、データ数がそれ以上必要
+        max_nbits = int(np.floor(np.log2(n))) if n else 0
+        if n and cfg['nbits'] > max_nbits:
+            if max_nbits < 1:
+                raise ValueError(f"ivfpqの学習にはデータが2件以上必要です: {n}件")
+            logger.warning(f"nbitsをデータ数({n}件)に合わせて{cfg['nbits']}から{max_nbits}にします")
+            cfg['nbits'] = max_nbits
+        if 'm' not in cfg:
+            cfg['m'] = max(m for m in range(1, min(dim, 32) + 1) if dim % m == 0) if dim else 32
+        if dim and dim % cfg['m']:
+            raise ValueError(f"mは次元({dim})の約数にしてください: {cfg['m']}")
+    return cfg
+
+
+def spec_name(cfg: dict) -> str:
+    """設定を表示用の文字列にする"""
+    return ':'.join([cfg['kind']] + [f"{k}={cfg[k]}" for k in ('nlist', 'm', 'nbits', 'nprobe') if k in cfg])
+
+
+def factory_string(cfg: dict) -> str:
+    """faiss.index_factoryの記述"""
+    if cfg['kind'] == 'flat':
+        return "Flat"
+    if cfg['kind'] == 'ivf':
+        return f"IVF{cfg['nlist']},Flat"
+    return f"IVF{cfg['nlist']},PQ{cfg['m']}x{cfg['nbits']}"
+
+
+def build_index(features: np.ndarray, cfg: dict, seed: int = 0):
+    """インデックスを構築して(インデックス, 構築秒数)を返す"""
+    faiss = _import_faiss()
+    start = time.perf_counter()
+    index = faiss.index_factory(features.shape[1], factory_string(cfg))
+    if not index.is_trained:
+        # 学習はクラスタ数に応じたサブサンプルで行う（PQは2^nbits件以上）
+        n_train = min(len(features), max(_TRAIN_PER_LIST * cfg['nlist'], 1 << cfg.get('nbits', 0)))
+        rng = np.random.default_rng(seed)
+        train = features[np.sort(rng.choice(len(features), n_train, replace=False))]
+        index.train(train)
+    # 大きなデータでもメモリを増やしすぎないよう分割して追加する
+    for i in range(0, len(features), 65536):
+        index.add(features[i:i + 65536])
+    if 'nprobe' in cfg:
+        faiss.extract_index_ivf(index).nprobe = cfg['nprobe']
+    return index, time.perf_counter() - start
+
+
+def save_index(index, path: str):
+    faiss = _import_faiss()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    faiss.write_index(index, path)
+
+
+def index_nbytes(index) -> int:
+    """シリアライズしたインデックスのサイズ（メモリ使用量の目安）"""
+    faiss = _import_faiss()
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def split_queries(features: np.ndarray, n_queries: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """ベンチマーク用に(登録データ, クエリ)へ分割（クエリは登録データに含めない）"""
+    rng = np.random.default_rng(seed)
+    n_queries = min(n_queries, len(features) // 10)
+    query_idx = rng.choice(len(features), n_queries, replace=False)
+    mask = np.ones(len(features), dtype=bool)
+    mask[query_idx] = False
+    return np.ascontiguousarray(features[mask]), np.ascontiguousarray(features[query_idx])
+
+
+def exact_neighbors(base: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """総当たり検索による正解の近傍"""
+    faiss = _import_faiss()
+    index = faiss.IndexFlatL2(base.shape[1])
+    index.add(base)
+    return index.search(queries, k)[1]
+
+
+def bench_index(index, queries: np.ndarray, ground_truth: np.ndarray, k: int) -> dict:
+    """1クエリずつのレイテンシ（推論時と同じ使い方）とバッチ検索の速度、recall@kを測定"""
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        index.search(q[None, :], k)
+        latencies.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    _, found = index.search(queries, k)
+    batch_sec = time.perf_counter() - start
+
+    hits = [len(np.intersect1d(f[f >= 0], g)) for f, g in zip(found, ground_truth)]
+    latencies = np.array(latencies) * 1000
+    return {
+        'recall': float(np.mean(hits) / k),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p99': float(np.percentile(latencies, 99)),
+        'batch_qps': len(queries) / batch_sec if batch_sec > 0 else float('inf'),
+    }
+
+
+def run_bench(features: np.ndarray, specs: List[str], k: int = 8, n_queries: int = 1000,
+              seed: int = 0) -> List[dict]:
+    """各設定でインデックスを構築し、構築時間・サイズ・レイテンシ・recall@kを返す"""
+    base, queries = split_queries(features, n_queries, seed)
+    ground_truth = exact_neighbors(base, queries, k)
+    results = []
+    for spec in specs:
+        # データ数が足りない設定は比較から除き、残りの設定を続ける
+        try:
+            cfg = parse_spec(spec, len(base), base.shape[1])
+            index, build_sec = build_index(base, cfg, seed)
+        except (ValueError, RuntimeError) as e:
+            logger.warning(f"{spec} を構築できないため省略します: {e}")
+            continue
+        results.append({
+            'spec': spec_name(cfg),
+            'build_sec': build_sec,
+            'size_mb': index_nbytes(index) / (1 << 20),
+            **bench_index(index, queries, ground_truth, k),
+        })
+    return results
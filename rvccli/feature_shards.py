@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import subprocess
+from typing import List, Optional
+
+from .cache import atomic_write
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# シャードの作業ディレクトリ（データセット内, '.'で始まるため入力としては扱わない）
+SHARDS_DIR = ".extract_shards"
+PLAN_NAME = "plan.json"
+REPORT_NAME = "extract_report.json"
+PLAN_VERSION = 1
+# 実行中のシャードの進捗を更新する間隔（秒）
+POLL_SEC = 1.0
+
+
+def _fingerprint(dataset_dir: str, rel_paths: List[str], f0_method: str, n_shards: int) -> str:
+    """入力ファイル（パス・サイズ・更新時刻）と抽出条件のハッシュ（再開できるかの判定に使う）"""
+    digest = hashlib.sha256(f"v{PLAN_VERSION}:{f0_method}:{n_shards}".encode('utf-8'))
+    for rel in rel_paths:
+        stat = os.stat(os.path.join(dataset_dir, rel))
+        digest.update(f"\n{rel}:{stat.st_size}:{stat.st_mtime_ns}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def plan_shards(dataset_dir: str, rel_paths: List[str], n_shards: int) -> List[List[str]]:
+    """ファイルサイズの合計が均等になるようにN個のファイル一覧へ分ける（大きいファイルから順に最も軽いシャードへ）"""
+    n_shards = max(1, min(n_shards, len(rel_paths)))
+    sizes = {rel: os.path.getsize(os.path.join(dataset_dir, rel)) for rel in rel_paths}
+    shards = [[] for _ in range(n_shards)]
+    loads = [0] * n_shards
+    for rel in sorted(rel_paths, key=lambda r: (-sizes[r], r)):
+        i = loads.index(min(loads))
+        shards[i].append(rel)
+        loads[i] += sizes[rel]
+    return [sorted(shard) for shard in shards]
+
+
+def _link(src: str, dst: str):
+    """シャードのディレクトリに入力をリンク（シンボリックリンクが使えなければコピー）"""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.lexists(dst):
+        return
+    try:
+        os.symlink(os.path.abspath(src), dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _save_json(path: str, data: dict):
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+
+
+def _load_json(path: str) -> Optional[dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _output_files(shard_dir: str, inputs: set) -> List[str]:
+    """シャードのディレクトリのうち、入力のリンク以外（フォークが書き出したファイル）の相対パス"""
+    outputs = []
+    for root, dirs, files in os.walk(shard_dir):
+        dirs.sort()
+        for name in sorted(files):
+            rel = os.path.relpath(os.path.join(root, name), shard_dir)
+            if rel not in inputs:
+                outputs.append(rel)
+    return outputs
+
+
+def _count_features(shard_dir: str, inputs: set) -> int:
+    """特徴量（.npy）の出力数が最も多いディレクトリのファイル数（進捗の目安）"""
+    counts = {}
+    for rel in _output_files(shard_dir, inputs):
+        if rel.endswith('.npy'):
+            top = rel.split(os.sep)[0]
+            counts[top] = counts.get(top, 0) + 1
+    return max(counts.values(), default=0)
+
+
+class _Shard:
+    def __init__(self, work_dir: str, index: int, files: List[str], state: dict = None):
+        self.index = index
+        self.files = files
+        self.dir = os.path.join(work_dir, f"shard_{index:04d}")
+        self.progress_path = os.path.join(work_dir, f"shard_{index:04d}.json")
+        self.log_path = os.path.join(work_dir, f"shard_{index:04d}.log")
+        self.state = state or {
+            'index': index,
+            'files': len(files),
+            'audio_sec': 0.0,
+            'status': 'pending',
+            'attempts': 0,
+            'done_files': 0,
+            'elapsed': 0.0,
+            'files_per_sec': None,
+            'audio_sec_per_sec': None,
+            'returncode': None,
+            'merged': False,
+        }
+        self.proc = None
+        self.started = None
+        self.f0_hashes = None
+
+    def save(self):
+        _save_json(self.progress_path, self.state)
+
+
+def run_sharded(dataset_dir: str, extract_script: str, f0_method: str = "rmvpe", n_shards: int = 4,
+                workers: int = 4, retries: int = 1, use_f0_cache: bool = True, resume: bool = True,
+                python: str = "python") -> dict:
+    """データセットをシャードに分けて特徴量抽出を並列に実行し、出力をデータセットに統合する
+
+    各シャードは入力へのリンクを並べたディレクトリで、フォークのスクリプトを--datasetに指定して実行する。
+    進捗は<データセット>/.extract_shards/shard_XXXX.json に保存し、失敗したシャードだけをretries回まで再実行する。
+    resume=Trueで入力と条件が前回と同じなら、完了済みのシャードは実行しない。
+    """
+    from .f0_cache import dataset_wavs
+    from .batch import audio_duration
+
+    work_dir = os.path.join(dataset_dir, SHARDS_DIR)
+    rel_paths = [os.path.relpath(p, dataset_dir) for p in dataset_wavs(dataset_dir)]
+    if not rel_paths:
+        raise FileNotFoundError(f"音声ファイルが見つかりません: {dataset_dir}")
+    fingerprint = _fingerprint(dataset_dir, rel_paths, f0_method, n_shards)
+
+    plan = _load_json(os.path.join(work_dir, PLAN_NAME)) if resume else None
+    if plan is None or plan.get('fingerprint') != fingerprint:
+        # 入力か条件が変わった場合は作り直す
+        shutil.rmtree(work_dir, ignore_errors=True)
+        os.makedirs(work_dir)
+        plan = {'version': PLAN_VERSION, 'fingerprint': fingerprint, 'f0_method': f0_method,
+                'shards': plan_shards(dataset_dir, rel_paths, n_shards)}
+        _save_json(os.path.join(work_dir, PLAN_NAME), plan)
+
+    shards = []
+    for i, files in enumerate(plan['shards']):
+        shard = _Shard(work_dir, i, files, _load_json(os.path.join(work_dir, f"shard_{i:04d}.json")))
+        if shard.state['status'] != 'done':
+            for rel in files:
+                _link(os.path.join(dataset_dir, rel), os.path.join(shard.dir, rel))
+            if not shard.state['audio_sec']:
+                shard.state['audio_sec'] = sum(audio_duration(os.path.join(dataset_dir, rel)) for rel in files)
+            # 中断されたシャードは未実行として扱う
+            shard.state['status'] = 'pending'
+            shard.save()
+        shards.append(shard)
+
+    skipped = sum(1 for s in shards if s.state['status'] == 'done')
+    if skipped:
+        logger.info(f"完了済みのシャードをスキップします: {skipped}/{len(shards)}")
+
+    start = time.perf_counter()
+    for attempt in range(retries + 1):
+        todo = [s for s in shards if s.state['status'] != 'done']
+        if not todo:
+            break
+        if attempt:
+            logger.info(f"失敗したシャードを再実行します（{attempt}回目）: {[s.index for s in todo]}")
+        _run_pool(todo, extract_script, f0_method, workers, use_f0_cache, python)
+
+    failed = [s for s in shards if s.state['status'] != 'done']
+    if not failed:
+        # 出力をデータセットに統合（同じ相対パスへ移動）
+        for shard in shards:
+            if shard.state['merged']:
+                continue
+            inputs = set(shard.files)
+            for rel in _output_files(shard.dir, inputs):
+                dst = os.path.join(dataset_dir, rel)
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.replace(os.path.join(shard.dir, rel), dst)
+            shutil.rmtree(shard.dir, ignore_errors=True)
+            shard.state['merged'] = True
+            shard.save()
+
+    report = {
+        'dataset': dataset_dir,
+        'f0_method': f0_method,
+        'shards': [s.state for s in shards],
+        'skipped_shards': skipped,
+        'failed_shards': [s.index for s in failed],
+        'files': len(rel_paths),
+        'wall_time': time.perf_counter() - start,
+        'ok': not failed,
+    }
+    _save_json(os.path.join(work_dir, REPORT_NAME), report)
+    return report
+
+
+def _run_pool(shards: List[_Shard], extract_script: str, f0_method: str, workers: int,
+              use_f0_cache: bool, python: str):
+    """最大workers個のシャードを同時に実行し、全シャードの終了を待つ"""
+    from .rvc_wrapper import _restore_f0, _store_f0
+
+    queue = list(shards)
+    running = []
+    while queue or running:
+        while queue and len(running) < max(1, workers):
+            shard = queue.pop(0)
+            if use_f0_cache:
+                shard.f0_hashes = _restore_f0(shard.dir, f0_method)
+            cmd = [python, extract_script, '--dataset', shard.dir, '--f0_method', f0_method]
+            log = open(shard.log_path, 'a', encoding='utf-8')
+            shard.proc = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT)
+            log.close()
+            shard.started = time.perf_counter()
+            shard.state.update(status='running', attempts=shard.state['attempts'] + 1, returncode=None)
+            shard.save()
+            running.append(shard)
+
+        time.sleep(POLL_SEC)
+        for shard in list(running):
+            inputs = set(shard.files)
+            elapsed = time.perf_counter() - shard.started
+            shard.state['done_files'] = min(_count_features(shard.dir, inputs), len(shard.files))
+            shard.state['elapsed'] = elapsed
+            code = shard.proc.poll()
+            if code is not None:
+                running.remove(shard)
+                shard.state['returncode'] = code
+                profiling.record('extract.shard', shard.started, shard.started + elapsed, cat='subprocess',
+                                 tid=shard.proc.pid, shard=shard.index, files=len(shard.files), returncode=code)
+                if code == 0:
+                    shard.state.update(status='done', done_files=len(shard.files),
+                                       files_per_sec=len(shard.files) / elapsed if elapsed > 0 else None,
+                                       audio_sec_per_sec=shard.state['audio_sec'] / elapsed if elapsed > 0 else None)
+                    if use_f0_cache:
+                        _store_f0(shard.dir, f0_method, shard.f0_hashes)
+                    logger.info(f"シャード{shard.index}が完了しました: {len(shard.files)}ファイル, {elapsed:.1f}秒")
+                else:
+                    shard.state['status'] = 'failed'
+                    logger.error(f"シャード{shard.index}が失敗しました（終了コード {code}）: {shard.log_path}")
+            shard.save()
@@ -0,0 +1,193 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import numpy as np
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# 長い入力を分割する既定の窓の長さ（秒）と、隣接する窓の重なり（クロスフェード）の長さ（ミリ秒）
+DEFAULT_WINDOW_SEC = 30.0
+DEFAULT_CROSSFADE_MS = 200
+# 分割位置を無音に合わせるときの探索範囲（秒）
+SNAP_WINDOW_SEC = 5.0
+# 窓の切り出しに使うサンプリングレート（VADが対応するレート）
+WINDOW_SAMPLE_RATE = 32000
+
+
+def scan_input(input_path: str, sample_rate: int = WINDOW_SAMPLE_RATE, aggressiveness: int = 2,
+               vad_backend: str = 'webrtc', block_sec: float = 30.0):
+    """入力をブロック単位でデコードしてVADにかけ、(サンプル数, マスク, フレーム長)を返す（全体は保持しない）"""
+    from .audio_utils import iter_decode_blocks, iter_frames, StreamingVAD, VAD_FRAME_SEC
+
+    frame_size = int(sample_rate * VAD_FRAME_SEC)
+    vad = StreamingVAD(sample_rate, aggressiveness, vad_backend)
+    n_samples = 0
+    masks = []
+
+    def counted(blocks):
+        nonlocal n_samples
+        for block in blocks:
+            n_samples += len(block)
+            yield block
+
+    block_size = int(block_sec * sample_rate) // frame_size * frame_size
+    blocks = counted(iter_decode_blocks(input_path, block_size, sample_rate))
+    for frames in iter_frames(blocks, frame_size):
+        masks.append(vad.process(frames))
+    mask = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+    return n_samples, mask, frame_size
+
+
+def plan_windows(n_samples: int, sample_rate: int, mask: np.ndarray, frame_size: int,
+                 window_sec: float = DEFAULT_WINDOW_SEC, crossfade_ms: int = DEFAULT_CROSSFADE_MS) -> List[dict]:
+    """変換する窓の一覧
+
+    分割位置はwindow_sec秒ごとの目標位置に近い無音（VADの非音声フレーム）に合わせ、
+    各窓は分割位置の前後にcrossfade_ms/2ずつ延ばして隣の窓と重ねる。
+    start/endは窓の範囲、core_start/core_endは分割位置（サンプル）。
+    """
+    from .audio_utils import chunk_boundaries, silence_snap_points
+
+    snap_points = silence_snap_points(mask, frame_size) if len(mask) else None
+    bounds = chunk_boundaries(n_samples, sample_rate, window_sec, snap_points, SNAP_WINDOW_SEC)
+    half = int(sample_rate * crossfade_ms / 2000)
+    return [{
+        'start': max(0, start - half),
+        'end': min(n_samples, end + half),
+        'core_start': start,
+        'core_end': end,
+    } for start, end in bounds]
+
+
+def write_windows(input_path: str, windows: List[dict], out_dir: str,
+                  sample_rate: int = WINDOW_SAMPLE_RATE, block_sec: float = 30.0) -> List[str]:
+    """入力を再デコードして各窓をWAVに書き出す（同時に開くファイルは重なりの分だけ）"""
+    import soundfile as sf
+    from .audio_utils import iter_decode_blocks
+
+    paths = [os.path.join(out_dir, f"window_{i:04d}.wav") for i in range(len(windows))]
+    files = {}
+    pos = 0
+    next_open = 0
+    try:
+        for block in iter_decode_blocks(input_path, int(block_sec * sample_rate), sample_rate):
+            block_end = pos + len(block)
+            while next_open < len(windows) and windows[next_open]['start'] < block_end:
+                files[next_open] = sf.SoundFile(paths[next_open], 'w', sample_rate, 1, subtype='PCM_16')
+                next_open += 1
+            for i in list(files):
+                w = windows[i]
+                lo, hi = max(w['start'], pos), min(w['end'], block_end)
+                if hi > lo:
+                    files[i].write(block[lo - pos:hi - pos])
+                if w['end'] <= block_end:
+                    files.pop(i).close()
+            pos = block_end
+    finally:
+        for f in files.values():
+            f.close()
+    return paths
+
+
+def _fit_length(audio: np.ndarray, n: int) -> np.ndarray:
+    """変換結果の長さを期待値に合わせる（変換器による数サンプルの差を吸収）"""
+    if len(audio) >= n:
+        return audio[:n]
+    pad = np.zeros((n - len(audio),) + audio.shape[1:], dtype=audio.dtype)
+    return np.concatenate([audio, pad])
+
+
+def stitch_windows(paths: List[str], windows: List[dict], in_sample_rate: int, out_path: str,
+                   curve: str = 'equal_power') -> int:
+    """変換済みの窓を等パワークロスフェードでつなぎ、出力のサンプル数を返す
+
+    窓の位置は出力のサンプリングレートに換算し、各窓を期待される長さに合わせてから
+    重なり部分をクロスフェードする。メモリには1つの窓と直前の窓の重なり部分だけを保持する。
+    """
+    import soundfile as sf
+    from .audio_utils import crossfade
+
+    info = sf.info(paths[0])
+    out_sr, channels = info.samplerate, info.channels
+    scale = out_sr / in_sample_rate
+
+    def to_out(pos: int) -> int:
+        return int(round(pos * scale))
+
+    written = 0
+    tail = None
+    with sf.SoundFile(out_path, 'w', out_sr, channels, subtype='PCM_16', format='WAV') as out:
+        for i, (path, w) in enumerate(zip(paths, windows)):
+            audio, sr = sf.read(path, dtype='float32', always_2d=True)
+            if sr != out_sr or audio.shape[1] != channels:
+                raise ValueError(f"変換結果の形式が窓ごとに異なります: {path}")
+            audio = _fit_length(audio, to_out(w['end']) - to_out(w['start']))
+
+            if tail is not None:
+                n = len(tail)
+                audio[:n] = crossfade(tail, audio[:n], curve)
+            if i + 1 < len(windows):
+                # 次の窓と重なる部分は次の窓とクロスフェードしてから書き出す
+                n = max(0, to_out(w['end']) - to_out(windows[i + 1]['start']))
+                tail = audio[len(audio) - n:].copy()
+                audio = audio[:len(audio) - n]
+            out.write(audio)
+            written += len(audio)
+    return written
+
+
+def convert_long(input_path: str, out_path: str, converter, workers: int = 1,
+                 window_sec: float = DEFAULT_WINDOW_SEC, crossfade_ms: int = DEFAULT_CROSSFADE_MS,
+                 aggressiveness: int = 2, vad_backend: str = 'webrtc', work_dir: str = None) -> dict:
+    """長い入力を無音位置で重なりのある窓に分割し、並列に変換してからクロスフェードでつなぐ
+
+    converterはbatch.make_converterの戻り値。workersは同時に変換する窓の数。
+    窓のWAVは作業ディレクトリ（省略時は一時ディレクトリ）に書き出し、完了後に削除する。
+    """
+    from . import profiling
+    from .batch import run_batch
+    from .cache import atomic_write
+
+    start_time = time.perf_counter()
+    with profiling.span('longform.scan'):
+        n_samples, mask, frame_size = scan_input(input_path, WINDOW_SAMPLE_RATE, aggressiveness, vad_backend)
+    if n_samples == 0:
+        raise ValueError(f"入力が空です: {input_path}")
+    windows = plan_windows(n_samples, WINDOW_SAMPLE_RATE, mask, frame_size, window_sec, crossfade_ms)
+    logger.info(f"{n_samples / WINDOW_SAMPLE_RATE:.1f}秒の入力を{len(windows)}個の窓に分割しました")
+
+    tmp_dir = tempfile.mkdtemp(prefix="rvccli_windows_", dir=work_dir)
+    try:
+        with profiling.span('longform.split', windows=len(windows)):
+            paths = write_windows(input_path, windows, tmp_dir)
+        split_sec = time.perf_counter() - start_time
+
+        jobs = [{'input': p, 'out': os.path.splitext(p)[0] + "_out.wav"} for p in paths]
+        convert_start = time.perf_counter()
+        results = list(run_batch(jobs, converter, concurrency=workers, skip_existing=False))
+        convert_sec = time.perf_counter() - convert_start
+        failed = [r for r in results if r['status'] != 'ok']
+        if failed:
+            raise RuntimeError(f"{len(failed)}個の窓の変換に失敗しました: {failed[0]['error']}")
+
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        stitch_start = time.perf_counter()
+        # 途中で失敗しても不完全な出力が残らないよう一時ファイルに書いてから置き換える
+        with profiling.span('longform.stitch'), atomic_write(out_path, 'wb') as f:
+            out_samples = stitch_windows([j['out'] for j in jobs], windows, WINDOW_SAMPLE_RATE, f)
+        stitch_sec = time.perf_counter() - stitch_start
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return {
+        'windows': len(windows),
+        'audio_sec': n_samples / WINDOW_SAMPLE_RATE,
+        'out_samples': out_samples,
+        'split_sec': split_sec,
+        'convert_sec': convert_sec,
+        'stitch_sec': stitch_sec,
+        'wall_time': time.perf_counter() - start_time,
+    }
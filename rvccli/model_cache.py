@@ -0,0 +1,114 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .cache import file_sha256
+
+# 既定のメモリ予算（MB）
+DEFAULT_BUDGET_MB = 4096
+
+
+class ModelCache:
+    """モデルとインデックスのLRUキャッシュ
+
+    キーはモデル・インデックスファイルの内容ハッシュで、パスが変わっても同じ内容なら再利用する。
+    各エントリのメモリ使用量はsize_of(モデル)（省略時はファイルサイズの合計）で見積もり、
+    合計が予算を超えたら最も長く使われていないエントリから破棄する。
+    """
+
+    def __init__(self, loader: Callable, budget_bytes: int = DEFAULT_BUDGET_MB << 20,
+                 size_of: Optional[Callable] = None):
+        self.loader = loader
+        self.budget_bytes = budget_bytes
+        self.size_of = size_of
+        self._entries = OrderedDict()  # キー -> (モデル, 見積もりサイズ, パス)
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        # (パス, サイズ, 更新時刻) -> 内容ハッシュ（毎回のハッシュ計算を避ける）
+        self._hashes = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.loads = 0
+        self.load_sec = 0.0
+
+    def _file_hash(self, path: Optional[str]) -> Optional[str]:
+        if not path:
+            return None
+        stat = os.stat(path)
+        stamp = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._hashes.get(stamp)
+        if digest is None:
+            digest = file_sha256(path)
+            self._hashes[stamp] = digest
+        return digest
+
+    def key(self, model_path: str, index_path: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """キャッシュのキー（モデルとインデックスの内容ハッシュ）"""
+        return self._file_hash(model_path), self._file_hash(index_path)
+
+    def get(self, model_path: str, index_path: Optional[str] = None):
+        """(モデル, 読み込み秒数, ヒットしたか)を返す（ヒット時の読み込み秒数は0）"""
+        key = self.key(model_path, index_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0], 0.0, True
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # 同じモデルの同時読み込みは1回にまとめる（他のモデルの読み込みは妨げない）
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key][0], 0.0, True
+            start = time.perf_counter()
+            model = self.loader(model_path, index_path)
+            elapsed = time.perf_counter() - start
+            size = self.size_of(model) if self.size_of else sum(
+                os.path.getsize(p) for p in (model_path, index_path) if p)
+
+            with self._lock:
+                self.misses += 1
+                self.loads += 1
+                self.load_sec += elapsed
+                self._entries[key] = (model, size, model_path)
+                self._evict()
+                self._key_locks.pop(key, None)
+        return model, elapsed, False
+
+    def _evict(self):
+        """予算を超えている間、最も古いエントリを破棄（直前に追加したエントリは残す）"""
+        total = sum(size for _, size, _ in self._entries.values())
+        while total > self.budget_bytes and len(self._entries) > 1:
+            _, (_, size, _) = self._entries.popitem(last=False)
+            total -= size
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """ヒット/ミス数・読み込み時間・保持中のモデル"""
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'evictions': self.evictions,
+                'loads': self.loads,
+                'load_sec': self.load_sec,
+                'budget_mb': self.budget_bytes / (1 << 20),
+                'used_mb': sum(size for _, size, _ in self._entries.values()) / (1 << 20),
+                # 最近使った順
+                'models': [path for _, _, path in reversed(self._entries.values())],
+            }
@@ -0,0 +1,351 @@
+import os
+import io
+import glob
+import json
+import time
+import zlib
+import struct
+import hashlib
+import logging
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from .cache import atomic_write
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# パッケージに同梱する事前学習モデル（models_dir内）
+REQUIRED_MODELS = ('contentvec.pth', 'rmvpe.pt', 'crepe_onnx_full.onnx')
+# パッケージ内のマニフェスト（各ファイルのサイズ・SHA-256・格納方法）
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# 事前学習モデルの扱い（copy: パッケージに含める / ref: ハッシュだけを記録して含めない）
+BASE_MODEL_MODES = ('copy', 'ref')
+# 圧縮してもほとんど小さくならない形式（無圧縮で格納する）
+INCOMPRESSIBLE_EXTS = ('.pth', '.pt', '.onnx', '.index', '.zip', '.gz', '.mp3', '.m4a', '.ogg', '.flac')
+# 上記以外は先頭を試しに圧縮し、この比率を下回る場合だけ圧縮する
+PROBE_BYTES = 256 * 1024
+COMPRESS_RATIO = 0.9
+# 圧縮データを一時ファイルに移すまでメモリに置く大きさ
+SPOOL_BYTES = 8 << 20
+BLOCK_SIZE = 1 << 20
+# この大きさ・位置以上の値はZIP64の拡張フィールドに書く（ヘッダの値はZIP64_MARKERにする）
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_MARKER = 0xFFFFFFFF
+
+
+def latest_output(outputs_dir: str) -> str:
+    """最新の学習結果のディレクトリ名（作成日時で判定）"""
+    if not os.path.exists(outputs_dir):
+        raise FileNotFoundError("出力ディレクトリが見つかりません。先に学習を実行してください。")
+    output_subdirs = [d for d in os.listdir(outputs_dir) if os.path.isdir(os.path.join(outputs_dir, d))]
+    if not output_subdirs:
+        raise FileNotFoundError("学習結果が見つかりません。先に学習を実行してください。")
+    return max(output_subdirs, key=lambda x: os.path.getctime(os.path.join(outputs_dir, x)))
+
+
+def is_compressible(path: str) -> bool:
+    """拡張子と先頭の試し圧縮から、圧縮する価値があるかを判定"""
+    if path.lower().endswith(INCOMPRESSIBLE_EXTS):
+        return False
+    with open(path, 'rb') as f:
+        head = f.read(PROBE_BYTES)
+    return bool(head) and len(zlib.compress(head, 1)) < len(head) * COMPRESS_RATIO
+
+
+def _dos_datetime(mtime: float) -> Tuple[int, int]:
+    t = time.localtime(max(mtime, 315532800))  # ZIPの日時は1980年以降
+    return (t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2,
+            (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday)
+
+
+def _field32(value: int) -> int:
+    return ZIP64_MARKER if value >= ZIP64_LIMIT else value
+
+
+class _ZipWriter:
+    """圧縮済みのデータをそのまま書き込めるZIPの書き出し（必要に応じてZIP64）
+
+    zipfileはメンバーを1つずつしか圧縮できないため、並列に圧縮した結果や
+    前回のパッケージの圧縮データを再圧縮せずに格納するのに使う。読み込みは標準のzipfileで行える。
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.entries = []
+
+    def add(self, name: str, method: int, crc: int, size: int, compress_size: int, mtime: float,
+            data: io.RawIOBase):
+        """dataの先頭からcompress_sizeバイトを格納データとして書き込む"""
+        offset = self.f.tell()
+        encoded = name.encode('utf-8')
+        flags = 0 if encoded.isascii() else 0x800
+        zip64 = size >= ZIP64_LIMIT or compress_size >= ZIP64_LIMIT
+        extra = struct.pack('<HHQQ', 1, 16, size, compress_size) if zip64 else b''
+        dos_time, dos_date = _dos_datetime(mtime)
+        self.f.write(struct.pack('<4sHHHHHIIIHH', b'PK\x03\x04', 45 if zip64 else 20, flags, method,
+                                 dos_time, dos_date, crc,
+                                 ZIP64_MARKER if zip64 else compress_size, ZIP64_MARKER if zip64 else size,
+                                 len(encoded), len(extra)))
+        self.f.write(encoded + extra)
+        remaining = compress_size
+        while remaining:
+            block = data.read(min(BLOCK_SIZE, remaining))
+            if not block:
+                raise IOError(f"格納データが不足しています: {name}")
+            self.f.write(block)
+            remaining -= len(block)
+        self.entries.append((encoded, flags, method, dos_time, dos_date, crc, size, compress_size, offset))
+
+    def close(self):
+        cd_offset = self.f.tell()
+        for encoded, flags, method, dos_time, dos_date, crc, size, compress_size, offset in self.entries:
+            fields = [v for v in (size, compress_size, offset) if v >= ZIP64_LIMIT]
+            extra = struct.pack(f'<HH{len(fields)}Q', 1, 8 * len(fields), *fields) if fields else b''
+            version = 45 if fields else 20
+            self.f.write(struct.pack('<4sHHHHHHIIIHHHHHII', b'PK\x01\x02', 3 << 8 | version, version, flags,
+                                     method, dos_time, dos_date, crc, _field32(compress_size), _field32(size),
+                                     len(encoded), len(extra), 0, 0, 0, 0o100644 << 16, _field32(offset)))
+            self.f.write(encoded + extra)
+        cd_end = self.f.tell()
+        count, cd_size = len(self.entries), cd_end - cd_offset
+        if count >= 0xFFFF or cd_offset >= ZIP64_LIMIT or cd_size >= ZIP64_LIMIT:
+            self.f.write(struct.pack('<4sQHHIIQQQQ', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count,
+                                     cd_size, cd_offset))
+            self.f.write(struct.pack('<4sIQI', b'PK\x06\x07', 0, cd_end, 1))
+        self.f.write(struct.pack('<4sHHHHIIH', b'PK\x05\x06', 0, 0, min(count, 0xFFFF), min(count, 0xFFFF),
+                                 _field32(cd_size), _field32(cd_offset), 0))
+
+
+def _prepare(src: str, compress: bool, level: int) -> dict:
+    """1ファイルを読み、SHA-256・CRC・（圧縮する場合は）圧縮データを求める（ワーカースレッドで実行）"""
+    digest = hashlib.sha256()
+    crc = 0
+    size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) if compress else None
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress else None
+    with open(src, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            digest.update(block)
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            if compressor:
+                spool.write(compressor.compress(block))
+    result = {'sha256': digest.hexdigest(), 'crc': crc, 'size': size}
+    if compressor:
+        spool.write(compressor.flush())
+        if spool.tell() < size:
+            result.update(method='deflated', compress_size=spool.tell(), data=spool)
+            return result
+        # 圧縮しても小さくならなかった場合は無圧縮で格納する
+        spool.close()
+    result.update(method='stored', compress_size=size)
+    return result
+
+
+def _raw_member(package_path: str, info: zipfile.ZipInfo) -> io.BufferedReader:
+    """ZIPメンバーの格納データ（圧縮されたまま）の先頭にシークしたファイル"""
+    f = open(package_path, 'rb')
+    f.seek(info.header_offset)
+    header = f.read(30)
+    if header[:4] != b'PK\x03\x04':
+        f.close()
+        raise zipfile.BadZipFile(f"ローカルヘッダが不正です: {info.filename}")
+    name_len, extra_len = struct.unpack('<HH', header[26:30])
+    f.seek(info.header_offset + 30 + name_len + extra_len)
+    return f
+
+
+def read_manifest(package_path: str) -> dict:
+    with zipfile.ZipFile(package_path) as zf:
+        return json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+
+
+def previous_package(package_dir: str, exclude: str = None) -> Optional[str]:
+    """パッケージディレクトリ内で最も新しい、マニフェスト付きのパッケージ"""
+    candidates = sorted(glob.glob(os.path.join(package_dir, 'rvc_model_*.zip')), key=os.path.getmtime,
+                        reverse=True)
+    for path in candidates:
+        if exclude and os.path.abspath(path) == os.path.abspath(exclude):
+            continue
+        try:
+            read_manifest(path)
+            return path
+        except (KeyError, ValueError, OSError, zipfile.BadZipFile):
+            continue
+    return None
+
+
+def package_model(outputs_dir: str, models_dir: str, package_dir: str = None, workers: int = 0,
+                  level: int = 6, base_models: str = 'copy', incremental: bool = False) -> Tuple[str, List[dict]]:
+    """最新の学習結果と事前学習モデルをZIPにまとめ、(パッケージのパス, マニフェストの各エントリ)を返す
+
+    圧縮できる形式のファイルだけをworkers個のスレッドで並列に圧縮し、モデルなどは無圧縮で格納する。
+    base_models='ref'の場合、事前学習モデルはパッケージに含めず、SHA-256だけをマニフェストに記録する。
+    incrementalの場合、前回のパッケージでサイズと更新時刻が同じファイルは圧縮データをそのまま再利用する。
+    package_dirを省略した場合はoutputs_dirに書き出す。
+    """
+    if base_models not in BASE_MODEL_MODES:
+        raise ValueError(f"未対応の事前学習モデルの扱いです: {base_models}")
+    latest_dir = latest_output(outputs_dir)
+    latest_path = os.path.join(outputs_dir, latest_dir)
+
+    # パッケージ名を生成
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    package_name = f"rvc_model_{latest_dir}_{timestamp}.zip"
+    package_dir = package_dir or outputs_dir
+    os.makedirs(package_dir, exist_ok=True)
+    package_path = os.path.join(package_dir, package_name)
+
+    # 学習結果と必要なモデルファイル（アーカイブ内のパス, 元のパス, 事前学習モデルか）
+    sources = []
+    for root, dirs, files in os.walk(latest_path):
+        dirs.sort()
+        for file in sorted(files):
+            file_path = os.path.join(root, file)
+            sources.append((os.path.relpath(file_path, outputs_dir).replace(os.sep, '/'), file_path, False))
+    for model in REQUIRED_MODELS:
+        model_path = os.path.join(models_dir, model)
+        if os.path.exists(model_path):
+            sources.append((f"models/{model}", model_path, True))
+
+    previous, previous_entries = None, {}
+    if incremental:
+        previous = previous_package(package_dir, exclude=package_path)
+        if previous:
+            previous_entries = {e['path']: e for e in read_manifest(previous)['files']}
+            logger.info(f"前回のパッケージから未変更のファイルを再利用します: {previous}")
+
+    def plan(arc_name, src, is_base):
+        stat = os.stat(src)
+        entry = {'path': arc_name, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        old = previous_entries.get(arc_name)
+        unchanged = old and old['size'] == stat.st_size and old['mtime_ns'] == stat.st_mtime_ns
+        if is_base and base_models == 'ref':
+            entry['method'] = 'ref'
+            # 参照はハッシュだけを記録する（未変更なら前回の値を使う）
+            entry['sha256'] = old['sha256'] if unchanged else _prepare(src, False, level)['sha256']
+            return entry, None
+        if unchanged and old['method'] != 'ref':
+            entry.update(method=old['method'], sha256=old['sha256'], reused=True)
+            return entry, None
+        with profiling.span('package.prepare', file=arc_name):
+            prepared = _prepare(src, is_compressible(src), level)
+        entry.update(method=prepared['method'], sha256=prepared['sha256'])
+        return entry, prepared
+
+    workers = workers or os.cpu_count() or 1
+    entries = []
+    start = time.perf_counter()
+    with atomic_write(package_path, 'wb') as f, ThreadPoolExecutor(max_workers=workers) as executor:
+        writer = _ZipWriter(f)
+        prev_zip = zipfile.ZipFile(previous) if previous else None
+        try:
+            futures = [(arc_name, src, executor.submit(plan, arc_name, src, is_base))
+                       for arc_name, src, is_base in sources]
+            # 先頭から順に、準備のできたメンバーを書き出す（後続の圧縮と並行する）
+            for arc_name, src, future in futures:
+                with profiling.span('package.wait', file=arc_name):
+                    entry, prepared = future.result()
+                entries.append(entry)
+                mtime = entry['mtime_ns'] / 1e9
+                if entry['method'] == 'ref':
+                    continue
+                with profiling.span('package.write', file=arc_name):
+                    if entry.get('reused'):
+                        info = prev_zip.getinfo(arc_name)
+                        with _raw_member(previous, info) as data:
+                            writer.add(arc_name, info.compress_type, info.CRC, info.file_size, info.compress_size,
+                                       mtime, data)
+                    elif prepared['method'] == 'deflated':
+                        data = prepared['data']
+                        data.seek(0)
+                        with data:
+                            writer.add(arc_name, zipfile.ZIP_DEFLATED, prepared['crc'], prepared['size'],
+                                       prepared['compress_size'], mtime, data)
+                    else:
+                        with open(src, 'rb') as data:
+                            writer.add(arc_name, zipfile.ZIP_STORED, prepared['crc'], prepared['size'],
+                                       prepared['size'], mtime, data)
+                entry['compress_size'] = writer.entries[-1][7]
+        finally:
+            if prev_zip:
+                prev_zip.close()
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'output': latest_dir,
+            'base_models': base_models,
+            'files': entries,
+        }
+        data = json.dumps(manifest, ensure_ascii=False, indent=1).encode('utf-8')
+        compressed = zlib.compressobj(level, zlib.DEFLATED, -15)
+        compressed = compressed.compress(data) + compressed.flush()
+        writer.add(MANIFEST_NAME, zipfile.ZIP_DEFLATED, zlib.crc32(data), len(data), len(compressed),
+                   time.time(), io.BytesIO(compressed))
+        writer.close()
+
+    counts = {}
+    for entry in entries:
+        key = 'reused' if entry.get('reused') else entry['method']
+        counts[key] = counts.get(key, 0) + 1
+    logger.info(f"パッケージを作成しました: {package_path} ({time.perf_counter() - start:.1f}秒, {counts})")
+    return package_path, entries
+
+
+def verify_package(package_path: str, models_dir: str = None) -> dict:
+    """マニフェストと格納データを照合し、{'checked', 'refs', 'errors'}を返す
+
+    各メンバーは展開してサイズとSHA-256を確認する（CRCの不一致はzipfileが検出する）。
+    参照（ref）のエントリは、models_dirを指定した場合だけ同名のファイルのハッシュを確認する。
+    """
+    errors = []
+    checked = 0
+    refs = 0
+    try:
+        zf = zipfile.ZipFile(package_path)
+    except (OSError, zipfile.BadZipFile) as e:
+        return {'checked': 0, 'refs': 0, 'errors': [f"パッケージを開けません: {e}"]}
+    with zf:
+        try:
+            manifest = json.loads(zf.read(MANIFEST_NAME).decode('utf-8'))
+        except (KeyError, ValueError) as e:
+            return {'checked': 0, 'refs': 0, 'errors': [f"マニフェストを読み込めません: {e}"]}
+        names = set(zf.namelist()) - {MANIFEST_NAME}
+        for entry in manifest['files']:
+            path = entry['path']
+            if entry['method'] == 'ref':
+                refs += 1
+                if models_dir:
+                    local = os.path.join(models_dir, os.path.basename(path))
+                    from .cache import file_sha256
+                    if not os.path.exists(local):
+                        errors.append(f"参照先のモデルがありません: {local}")
+                    elif file_sha256(local) != entry['sha256']:
+                        errors.append(f"参照先のモデルのハッシュが一致しません: {local}")
+                continue
+            if path not in names:
+                errors.append(f"パッケージにありません: {path}")
+                continue
+            names.discard(path)
+            digest = hashlib.sha256()
+            size = 0
+            try:
+                with zf.open(path) as member:
+                    for block in iter(lambda: member.read(BLOCK_SIZE), b''):
+                        digest.update(block)
+                        size += len(block)
+            except (zipfile.BadZipFile, zlib.error) as e:
+                errors.append(f"展開に失敗しました: {path}: {e}")
+                continue
+            if size != entry['size'] or digest.hexdigest() != entry['sha256']:
+                errors.append(f"内容がマニフェストと一致しません: {path}")
+            checked += 1
+        for name in sorted(names):
+            errors.append(f"マニフェストにないファイルがあります: {name}")
+    return {'checked': checked, 'refs': refs, 'errors': errors}
@@ -0,0 +1,133 @@
+import os
+import json
+import shutil
+import numpy as np
+from typing import List, Iterator, Union
+
+from .cache import atomic_write
+
+# パック形式: 全チャンクを連結したint16/モノラルの生PCMと、チャンク位置のインデックス
+PACKED_DATA = "dataset.pcm"
+PACKED_INDEX = "dataset_index.json"
+PACKED_VERSION = 1
+PACKED_DTYPE = np.dtype('<i2')
+# 1ファイル分の一時PCM（ワーカーが書き出し、親プロセスがデータファイルに追記する）
+PART_SUFFIX = ".pcm.part"
+
+
+def write_part(path: str, blocks: Iterator[np.ndarray]) -> int:
+    """float32ブロック列をint16の生PCMとして書き出し、サンプル数を返す"""
+    from .audio_utils import float_to_int16
+
+    n_samples = 0
+    with open(path, 'wb') as f:
+        for block in blocks:
+            float_to_int16(block).astype(PACKED_DTYPE, copy=False).tofile(f)
+            n_samples += len(block)
+    return n_samples
+
+
+def append_part(out_dir: str, part_path: str) -> int:
+    """一時PCMをデータファイルの末尾に追記し、追記位置（サンプル）を返す"""
+    data_path = os.path.join(out_dir, PACKED_DATA)
+    with open(data_path, 'ab') as dst, open(part_path, 'rb') as src:
+        offset = dst.tell()
+        shutil.copyfileobj(src, dst, 1 << 20)
+    return offset // PACKED_DTYPE.itemsize
+
+
+def data_size(out_dir: str) -> int:
+    """データファイルのサンプル数（なければ0）"""
+    data_path = os.path.join(out_dir, PACKED_DATA)
+    if not os.path.exists(data_path):
+        return 0
+    return os.path.getsize(data_path) // PACKED_DTYPE.itemsize
+
+
+def reset(out_dir: str):
+    """データファイルとインデックスを削除"""
+    for name in (PACKED_DATA, PACKED_INDEX):
+        path = os.path.join(out_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_index(out_dir: str, sample_rate: int, chunks: List[dict]):
+    """インデックスをアトミックに保存
+
+    chunksの各要素は name, source, offset, length（サンプル）, source_start, source_end（秒）を持つ。
+    """
+    index = {
+        'version': PACKED_VERSION,
+        'data': PACKED_DATA,
+        'dtype': PACKED_DTYPE.str,
+        'channels': 1,
+        'sample_rate': sample_rate,
+        'chunks': sorted(chunks, key=lambda c: c['offset']),
+    }
+    with atomic_write(os.path.join(out_dir, PACKED_INDEX), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, indent=1)
+
+
+class PackedDataset:
+    """パック形式のデータセットの読み込み
+
+    データファイルはメモリマップで開き、各チャンクはコピーせずにint16配列のビューとして返す。
+    """
+
+    def __init__(self, path: str):
+        # データセットのディレクトリ、またはインデックスファイルのパスを受け付ける
+        index_path = os.path.join(path, PACKED_INDEX) if os.path.isdir(path) else path
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') != PACKED_VERSION:
+            raise ValueError(f"未対応のパック形式です: {index.get('version')}")
+
+        self.root = os.path.dirname(os.path.abspath(index_path))
+        self.sample_rate = index['sample_rate']
+        self.chunks = index['chunks']
+        self._names = {c['name']: i for i, c in enumerate(self.chunks)}
+
+        data_path = os.path.join(self.root, index['data'])
+        if os.path.getsize(data_path) == 0:
+            self.data = np.zeros(0, dtype=index['dtype'])
+        else:
+            self.data = np.memmap(data_path, dtype=index['dtype'], mode='r')
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def __getitem__(self, key: Union[int, str]) -> np.ndarray:
+        """チャンクをint16配列のビューとして返す（番号またはチャンク名で指定）"""
+        chunk = self.chunks[self._names[key] if isinstance(key, str) else key]
+        return self.data[chunk['offset']:chunk['offset'] + chunk['length']]
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self.chunks)):
+            yield self[i]
+
+    @property
+    def names(self) -> List[str]:
+        return [c['name'] for c in self.chunks]
+
+    @property
+    def duration(self) -> float:
+        """全チャンクの合計秒数"""
+        return sum(c['length'] for c in self.chunks) / self.sample_rate
+
+    def audio(self, key: Union[int, str]) -> np.ndarray:
+        """チャンクをfloat32（-1.0〜1.0）で返す（コピー）"""
+        from .audio_utils import int16_to_float
+        return int16_to_float(self[key])
+
+    def export_wavs(self, out_dir: str, subtype: str = 'PCM_16') -> List[str]:
+        """チャンクをprepのWAV出力と同じ構成（<名前>_chunks/chunk_XXXX.wav）で書き出す"""
+        import soundfile as sf
+
+        paths = []
+        for chunk in self.chunks:
+            path = os.path.join(out_dir, chunk['name'])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            sf.write(path, self[chunk['name']], self.sample_rate, subtype=subtype)
+            paths.append(path)
+        return paths
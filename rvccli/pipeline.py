@@ -0,0 +1,297 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Callable, Dict, List, Optional
+
+from .cache import file_sha256, atomic_write
+from . import profiling
+
+logger = logging.getLogger(__name__)
+
+# パイプラインの状態（各ステージの入力・出力のフィンガープリント）を保存するファイル
+STATE_NAME = ".rvccli_pipeline.json"
+STATE_VERSION = 1
+# 出力に影響しない実行時の設定（フィンガープリントに含めず、変更してもステージを再実行しない）
+RUNTIME_KEYS = ('audio.workers', 'training.num_workers', 'training.pin_memory')
+
+
+@dataclass
+class Stage:
+    """パイプラインの1ステージ
+
+    inputs: 入力ファイル・ディレクトリのパスを返す関数
+    config: 入力とする設定（'audio'のようなセクション名、または'training.f0_method'のような項目）
+    deps: 上流のステージ名（上流の出力の内容が入力になる）
+    outputs: 出力ファイルの一覧を返す関数（実行後に内容のフィンガープリントを求める）
+    """
+    name: str
+    run: Callable[[], None]
+    inputs: Callable[[], List[str]] = lambda: []
+    config: List[str] = field(default_factory=list)
+    deps: List[str] = field(default_factory=list)
+    outputs: Callable[[], List[str]] = lambda: []
+
+
+def list_files(path: str, suffixes: tuple = None, exclude_dirs: tuple = ()) -> List[str]:
+    """ファイル、またはディレクトリ以下のファイル（'.'で始まるものとexclude_dirsは除く）"""
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for root, dirs, names in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in exclude_dirs)
+        for name in sorted(names):
+            if name.startswith('.') or (suffixes and not name.lower().endswith(suffixes)):
+                continue
+            files.append(os.path.join(root, name))
+    return files
+
+
+class _HashCache:
+    """(パス, サイズ, 更新時刻)が変わらないファイルの内容ハッシュを再計算しない"""
+
+    def __init__(self, entries: dict = None):
+        self.entries = entries or {}
+        self._lock = threading.Lock()
+
+    def hash(self, path: str) -> str:
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self.entries.get(key)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        digest = file_sha256(path)
+        with self._lock:
+            self.entries[key] = [stat.st_size, stat.st_mtime_ns, digest]
+        return digest
+
+
+def _config_value(cfg, key: str):
+    value = cfg
+    for part in key.split('.'):
+        value = getattr(value, part)
+    if not hasattr(value, '__dataclass_fields__'):
+        return value
+    return {k: v for k, v in asdict(value).items() if f"{key}.{k}" not in RUNTIME_KEYS}
+
+
+class Pipeline:
+    """内容ベースのフィンガープリントで最新でないステージだけを実行するDAG
+
+    ステージの入力フィンガープリントは、入力ファイルの内容・設定値・上流ステージの出力の内容から求める。
+    前回と同じで出力も揃っていればスキップする。依存関係のないステージは並行して実行する。
+    """
+
+    def __init__(self, stages: List[Stage], cfg, state_path: str):
+        self.stages = {s.name: s for s in stages}
+        for stage in stages:
+            for dep in stage.deps:
+                if dep not in self.stages:
+                    raise ValueError(f"ステージ{stage.name}の依存先が見つかりません: {dep}")
+        self.cfg = cfg
+        self.state_path = state_path
+        self.state = self._load_state()
+        self.hashes = _HashCache(self.state.get('hashes'))
+        self._lock = threading.Lock()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('version') == STATE_VERSION:
+                return state
+        except (OSError, ValueError):
+            pass
+        return {'version': STATE_VERSION, 'stages': {}, 'hashes': {}}
+
+    def _save_state(self):
+        with self._lock:
+            self.state['hashes'] = self.hashes.entries
+            with atomic_write(self.state_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False, indent=1)
+
+    def _files_fingerprint(self, paths: List[str]) -> str:
+        digest = hashlib.sha256()
+        for path in sorted(paths):
+            digest.update(f"{os.path.abspath(path)}\0{self.hashes.hash(path)}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def fingerprint(self, stage: Stage) -> str:
+        """ステージの入力フィンガープリント"""
+        digest = hashlib.sha256(f"v{STATE_VERSION}:{stage.name}".encode('utf-8'))
+        files = []
+        for path in stage.inputs():
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"ステージ{stage.name}の入力が見つかりません: {path}")
+            files.extend(list_files(path))
+        digest.update(self._files_fingerprint(files).encode('utf-8'))
+        for key in sorted(stage.config):
+            digest.update(f"\n{key}={json.dumps(_config_value(self.cfg, key), sort_keys=True)}".encode('utf-8'))
+        for dep in sorted(stage.deps):
+            digest.update(f"\n{dep}:{self.state['stages'][dep]['output_fingerprint']}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_up_to_date(self, stage: Stage, fingerprint: str) -> bool:
+        entry = self.state['stages'].get(stage.name)
+        if not entry or entry.get('fingerprint') != fingerprint:
+            return False
+        return all(os.path.exists(p) for p in entry.get('outputs', []))
+
+    def select(self, targets: List[str] = None) -> List[str]:
+        """対象ステージとその上流（依存順）"""
+        order = []
+
+        def visit(name, path=()):
+            if name in path:
+                raise ValueError(f"依存関係が循環しています: {' -> '.join(path + (name,))}")
+            if name in order:
+                return
+            if name not in self.stages:
+                raise ValueError(f"未知のステージです: {name}")
+            for dep in self.stages[name].deps:
+                visit(dep, path + (name,))
+            order.append(name)
+
+        for name in targets or list(self.stages):
+            visit(name)
+        return order
+
+    def _run_stage(self, name: str, force: bool, dry_run: bool) -> dict:
+        stage = self.stages[name]
+        fingerprint = self.fingerprint(stage)
+        if not force and self.is_up_to_date(stage, fingerprint):
+            return {'stage': name, 'status': 'up-to-date', 'elapsed': 0.0}
+        if dry_run:
+            return {'stage': name, 'status': 'would-run', 'elapsed': 0.0}
+
+        logger.info(f"[{name}] 実行します")
+        start = time.perf_counter()
+        with profiling.span(f"stage.{name}", cat='stage'):
+            stage.run()
+        elapsed = time.perf_counter() - start
+        outputs = stage.outputs()
+        with self._lock:
+            self.state['stages'][name] = {
+                'fingerprint': fingerprint,
+                'output_fingerprint': self._files_fingerprint(outputs),
+                'outputs': [os.path.abspath(p) for p in outputs],
+                'finished': time.time(),
+                'elapsed': elapsed,
+            }
+        self._save_state()
+        logger.info(f"[{name}] 完了しました（{elapsed:.1f}秒）")
+        return {'stage': name, 'status': 'ran', 'elapsed': elapsed}
+
+    def run(self, targets: List[str] = None, jobs: int = 2, force: List[str] = (),
+            dry_run: bool = False) -> List[dict]:
+        """対象ステージを依存順に実行し、ステージごとの結果を返す
+
+        上流がすべて完了したステージから順に、最大jobs個を並行して実行する。
+        失敗したステージの下流は実行しない（依存しないステージは続行する）。
+        dry_runでは実行せず、最新でないステージを'would-run'として返す（下流は上流の実行後に決まるため'pending'）。
+        """
+        order = self.select(targets)
+        results: Dict[str, dict] = {}
+        remaining = list(order)
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            while remaining or running:
+                for name in list(remaining):
+                    deps = self.stages[name].deps
+                    if any(results.get(d, {}).get('status') in ('failed', 'skipped') for d in deps):
+                        results[name] = {'stage': name, 'status': 'skipped', 'elapsed': 0.0,
+                                         'error': "上流のステージが失敗しました"}
+                        remaining.remove(name)
+                    elif dry_run and any(results.get(d, {}).get('status') in ('would-run', 'pending')
+                                         for d in deps):
+                        results[name] = {'stage': name, 'status': 'pending', 'elapsed': 0.0}
+                        remaining.remove(name)
+                    elif all(d in results for d in deps) and len(running) < max(1, jobs):
+                        remaining.remove(name)
+                        running[executor.submit(self._run_stage, name, name in force, dry_run)] = name
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        logger.error(f"[{name}] 失敗しました: {e}")
+                        results[name] = {'stage': name, 'status': 'failed', 'elapsed': 0.0, 'error': str(e)}
+        return [results[name] for name in order]
+
+
+def default_stages(cfg, in_dir: Optional[str] = None, workers: int = 0) -> List[Stage]:
+    """prep → extract-features → train → pack と、extract-features → index のステージ
+
+    in_dirを省略した場合はprepを含めず、データセットディレクトリを入力として扱う。
+    workersが0の場合、prepは設定のaudio.workersを使う。
+    """
+    from . import rvc_wrapper
+
+    dataset_dir = cfg.dataset_dir
+    feature_dirs = ('2a_f0', '2b-f0nsf', '3_feature768')
+    index_path = os.path.join(cfg.models_dir, f"{cfg.model_name}.index")
+
+    def chunk_files():
+        return list_files(dataset_dir, ('.wav',), exclude_dirs=feature_dirs)
+
+    def run_prep():
+        from . import preprocess
+        audio_files = preprocess.collect_audio_files(in_dir)
+        if not audio_files:
+            raise FileNotFoundError(f"音声ファイルが見つかりません: {in_dir}")
+        results = list(preprocess.run_prep(audio_files, dataset_dir, cfg.audio, workers or cfg.audio.workers))
+        failed = [r for r in results if r['error']]
+        if failed:
+            raise RuntimeError(f"{len(failed)}ファイルの前処理に失敗しました")
+
+    def run_extract():
+        if not rvc_wrapper.extract_features(dataset_dir, cfg.training.f0_method):
+            raise RuntimeError("特徴量抽出に失敗しました")
+
+    def run_train():
+        ok = rvc_wrapper.train(dataset_dir=dataset_dir, sr=cfg.sr, f0_method=cfg.f0_method, batch=cfg.batch,
+                               steps=cfg.steps, fp16=cfg.fp16, out_dir=cfg.output_dir,
+                               index_rate=cfg.training.index_rate, save_every_n=cfg.training.save_every_n)
+        if not ok:
+            raise RuntimeError("学習に失敗しました")
+
+    def run_index():
+        from . import faiss_index
+        features = faiss_index.load_features(os.path.join(dataset_dir, '3_feature768'))
+        index, _ = faiss_index.build_index(features, faiss_index.parse_spec('ivf', len(features), features.shape[1]))
+        faiss_index.save_index(index, index_path)
+
+    def run_pack():
+        from . import packaging
+        packaging.package_model(cfg.output_dir, cfg.models_dir, cfg.packages_dir, incremental=True)
+
+    def base_models():
+        from .packaging import REQUIRED_MODELS
+        return [p for p in (os.path.join(cfg.models_dir, m) for m in REQUIRED_MODELS) if os.path.exists(p)]
+
+    stages = []
+    if in_dir:
+        stages.append(Stage('prep', run_prep, inputs=lambda: [in_dir], config=['audio'], outputs=chunk_files))
+        source = dict(deps=['prep'])
+    else:
+        source = dict(inputs=chunk_files)
+    stages += [
+        Stage('extract-features', run_extract, config=['training.f0_method'], **source,
+              outputs=lambda: [f for d in feature_dirs for f in list_files(os.path.join(dataset_dir, d))
+                               if os.path.exists(os.path.join(dataset_dir, d))]),
+        Stage('train', run_train, config=['training', 'audio.sample_rate'],
+              deps=['extract-features'] + (['prep'] if in_dir else []),
+              outputs=lambda: list_files(cfg.output_dir) if os.path.exists(cfg.output_dir) else []),
+        Stage('index', run_index, deps=['extract-features'], outputs=lambda: [index_path]),
+        Stage('pack', run_pack, deps=['train'], inputs=base_models,
+              outputs=lambda: list_files(cfg.packages_dir, ('.zip',)) if os.path.exists(cfg.packages_dir) else []),
+    ]
+    return stages
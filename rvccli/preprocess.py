@@ -0,0 +1,479 @@
+import os
+import json
+import time
+import glob
+import shutil
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Iterator
+
+from .config import AudioConfig
+from .cache import file_sha256, atomic_write
+from . import profiling
+
+# 出力ディレクトリに置くマニフェスト（入力ハッシュ・処理パラメータ・生成チャンク）
+MANIFEST_NAME = "prep_manifest.json"
+MANIFEST_VERSION = 1
+# マニフェストを書き出す最短間隔（秒）
+MANIFEST_SAVE_INTERVAL = 2.0
+# チャンクに影響する処理パラメータ
+_PARAM_KEYS = ('sample_rate', 'normalize_lufs', 'trim_silence', 'vad_aggressiveness',
+               'vad_backend', 'chunk_duration', 'snap_to_silence', 'snap_window_sec')
+# 前処理の対象とする音声ファイルの拡張子
+AUDIO_EXTENSIONS = ('*.wav', '*.mp3', '*.flac', '*.m4a', '*.ogg')
+
+
+def collect_audio_files(in_dir: str) -> List[str]:
+    """入力ディレクトリ直下の音声ファイル（拡張子の大文字・小文字を問わない, パス順）"""
+    audio_files = []
+    for ext in AUDIO_EXTENSIONS:
+        audio_files.extend(glob.glob(os.path.join(in_dir, ext)))
+        audio_files.extend(glob.glob(os.path.join(in_dir, ext.upper())))
+    return sorted(set(audio_files))
+
+
+def duplicate_stems(audio_files: List[str]) -> Dict[str, List[str]]:
+    """拡張子を除いた名前が同じファイル（出力の <名前>_chunks とマニフェストの項目が衝突する）"""
+    by_stem = {}
+    for audio_file in audio_files:
+        by_stem.setdefault(os.path.splitext(os.path.basename(audio_file))[0], []).append(audio_file)
+    return {stem: files for stem, files in by_stem.items() if len(files) > 1}
+
+
+def resolve_workers(workers: int, num_files: int) -> int:
+    """ワーカー数を決定（0以下はCPUコア数）"""
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, num_files))
+
+
+def prep_params(audio_cfg: AudioConfig) -> dict:
+    """マニフェストに記録する処理パラメータ"""
+    cfg = asdict(audio_cfg)
+    params = {key: cfg[key] for key in _PARAM_KEYS}
+    if audio_cfg.vad_backend == 'numpy':
+        # numpyバックエンドのストリーミング処理はブロックごとにノイズフロアを推定するため、ブロック長で結果が変わる
+        params['stream_block_sec'] = cfg['stream_block_sec']
+    return params
+
+
+def load_manifest(out_dir: str) -> dict:
+    """マニフェストを読み込む（なければ空のマニフェスト）"""
+    path = os.path.join(out_dir, MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except (OSError, ValueError):
+            pass
+    return {'version': MANIFEST_VERSION, 'files': {}}
+
+
+def save_manifest(out_dir: str, manifest: dict):
+    """マニフェストをアトミックに保存"""
+    with atomic_write(os.path.join(out_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+def is_up_to_date(entry: dict, audio_file: str, out_dir: str, params: dict,
+                  packed_output: bool = False) -> bool:
+    """マニフェストの記録から、再処理が不要かを判定"""
+    from . import packed
+
+    if not entry or entry.get('params') != params:
+        return False
+    if packed_output:
+        # パック形式ではデータファイル内の区間が残っていればよい
+        if 'pack_offset' not in entry:
+            return False
+        if packed.data_size(out_dir) < entry['pack_offset'] + entry['pack_length']:
+            return False
+    elif 'pack_offset' in entry or not all(
+            os.path.exists(os.path.join(out_dir, c['path'])) for c in entry['chunks']):
+        return False
+
+    # サイズと更新時刻が同じならハッシュ計算を省略する
+    stat = os.stat(audio_file)
+    if entry.get('size') == stat.st_size and entry.get('mtime_ns') == stat.st_mtime_ns:
+        return True
+    if file_sha256(audio_file) == entry.get('sha256'):
+        entry['size'] = stat.st_size
+        entry['mtime_ns'] = stat.st_mtime_ns
+        return True
+    return False
+
+
+def _prep_in_memory(audio_file: str, out_path: str, audio_cfg: AudioConfig,
+                    content_hash: str, result: dict, packed_output: bool = False):
+    """ファイル全体を1つのバッファにデコードして前処理し、(チャンク境界, VADマスク)を返す
+
+    out_pathはチャンクの出力ディレクトリ（packed_output時は一時PCMファイル）。
+    """
+    from . import audio_utils, packed
+
+    # 1. 32kHz/mono変換
+    result['log'].append("  32kHz/mono変換中...")
+    with profiling.span('prep.decode'):
+        audio, sample_rate = audio_utils.decode_to_array(audio_file, audio_cfg.sample_rate)
+    result['duration'] = len(audio) / sample_rate
+
+    # 2. 無音トリム（無音位置での分割にも同じVADマスクを使う）
+    mask = None
+    frame_size = int(sample_rate * audio_utils.VAD_FRAME_SEC)
+    if audio_cfg.trim_silence or audio_cfg.snap_to_silence:
+        with profiling.span('prep.vad'):
+            mask = audio_utils.get_speech_mask(audio, sample_rate, audio_cfg.vad_aggressiveness,
+                                               audio_cfg.vad_backend,
+                                               content_hash if audio_cfg.vad_cache else None)
+    snap_points = None
+    if audio_cfg.snap_to_silence:
+        snap_points = audio_utils.silence_snap_points(mask, frame_size, trimmed=audio_cfg.trim_silence)
+    if audio_cfg.trim_silence:
+        result['log'].append("  無音トリム中...")
+        with profiling.span('prep.trim'):
+            audio = audio_utils.trim_silence_array(audio, sample_rate, mask=mask)
+        if audio.size == 0:
+            raise ValueError("音声が検出されませんでした")
+
+    # 3. LUFS正規化
+    result['log'].append("  LUFS正規化中...")
+    with profiling.span('prep.loudness'):
+        audio = audio_utils.normalize_lufs_array(audio, sample_rate, audio_cfg.normalize_lufs)
+
+    # 4. 音声分割
+    result['log'].append("  音声分割中...")
+    bounds = audio_utils.chunk_boundaries(len(audio), sample_rate, audio_cfg.chunk_duration,
+                                          snap_points, audio_cfg.snap_window_sec)
+    with profiling.span('prep.export', chunks=len(bounds)):
+        if packed_output:
+            packed.write_part(out_path, [audio])
+        else:
+            audio_utils.write_chunks(audio, sample_rate, out_path, bounds)
+    return bounds, mask
+
+
+def _prep_streaming(audio_file: str, out_path: str, audio_cfg: AudioConfig,
+                    content_hash: str, result: dict, packed_output: bool = False):
+    """ブロック単位の2パスで前処理し、(チャンク境界, VADマスク)を返す
+
+    1パス目でVADマスク・ラウドネス・長さを求め、2パス目で再デコードしながらトリムとゲインを適用して
+    チャンクを逐次書き出す。保持するのはブロックとフレーム単位のマスク（1時間で約12万要素）のみ。
+    """
+    from . import audio_utils, packed
+
+    sample_rate = audio_cfg.sample_rate
+    frame_size = int(sample_rate * audio_utils.VAD_FRAME_SEC)
+    block_size = max(1, int(audio_cfg.stream_block_sec * sample_rate) // frame_size) * frame_size
+    use_mask = audio_cfg.trim_silence or audio_cfg.snap_to_silence
+
+    def decode_blocks():
+        return audio_utils.iter_decode_blocks(audio_file, block_size, sample_rate)
+
+    # 1. 32kHz/mono変換・VAD・ラウドネス測定（1パス目）
+    result['log'].append("  32kHz/mono変換・VAD・ラウドネス測定中（ストリーミング）...")
+    cached = None
+    # webrtcバックエンドは一括処理と同じマスクになるが、numpyバックエンドはブロック長ごとに別のキャッシュにする
+    mask_block = block_size if audio_cfg.vad_backend == 'numpy' else 0
+    if use_mask and audio_cfg.vad_cache:
+        cached = audio_utils.load_cached_speech_mask(content_hash, sample_rate, audio_cfg.vad_aggressiveness,
+                                                     audio_cfg.vad_backend, mask_block)
+    vad = None
+    if use_mask and cached is None:
+        vad = audio_utils.StreamingVAD(sample_rate, audio_cfg.vad_aggressiveness, audio_cfg.vad_backend)
+    meter = audio_utils.LoudnessMeter(sample_rate)
+    n_samples = 0
+
+    def counted(blocks):
+        nonlocal n_samples
+        for block in blocks:
+            n_samples += len(block)
+            if not audio_cfg.trim_silence:
+                meter.update(block)
+            yield block
+
+    mask = None
+    # ブロックごとにデコード・VAD・ラウドネス測定が交互に進むため、1パス目全体を1つのスパンとする
+    with profiling.span('prep.analyze'):
+        if use_mask:
+            masks = []
+            n_frames = 0
+            for frames in audio_utils.iter_frames(counted(decode_blocks()), frame_size):
+                if vad is not None:
+                    block_mask = vad.process(frames)
+                else:
+                    block_mask = np.zeros(len(frames), dtype=bool)
+                    cached_part = cached[n_frames:n_frames + len(frames)]
+                    block_mask[:len(cached_part)] = cached_part
+                if audio_cfg.trim_silence:
+                    meter.update(frames[block_mask].reshape(-1))
+                masks.append(block_mask)
+                n_frames += len(frames)
+            mask = np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
+            if vad is not None and audio_cfg.vad_cache:
+                audio_utils.save_cached_speech_mask(content_hash, mask, sample_rate, audio_cfg.vad_aggressiveness,
+                                                    audio_cfg.vad_backend, mask_block)
+        else:
+            for _ in counted(decode_blocks()):
+                pass
+    result['duration'] = n_samples / sample_rate
+
+    # 2. 無音トリム後の長さと分割位置
+    snap_points = None
+    if audio_cfg.snap_to_silence:
+        snap_points = audio_utils.silence_snap_points(mask, frame_size, trimmed=audio_cfg.trim_silence)
+    if audio_cfg.trim_silence:
+        result['log'].append("  無音トリム中...")
+        n_out = int(np.count_nonzero(mask)) * frame_size
+        if n_out == 0:
+            raise ValueError("音声が検出されませんでした")
+    else:
+        n_out = n_samples
+
+    # 3. LUFS正規化のゲイン
+    result['log'].append("  LUFS正規化中...")
+    gain = 10.0 ** ((audio_cfg.normalize_lufs - meter.integrated_loudness()) / 20.0)
+
+    # 4. 音声分割（2パス目: 再デコードしながらトリムとゲインを適用）
+    result['log'].append("  音声分割中...")
+    bounds = audio_utils.chunk_boundaries(n_out, sample_rate, audio_cfg.chunk_duration,
+                                          snap_points, audio_cfg.snap_window_sec)
+
+    def output_blocks():
+        if not audio_cfg.trim_silence:
+            for block in decode_blocks():
+                yield block * np.float32(gain)
+            return
+        position = 0
+        for frames in audio_utils.iter_frames(decode_blocks(), frame_size):
+            kept = frames[mask[position:position + len(frames)]].reshape(-1)
+            position += len(frames)
+            yield kept * np.float32(gain)
+
+    with profiling.span('prep.export', chunks=len(bounds)):
+        if packed_output:
+            packed.write_part(out_path, output_blocks())
+        else:
+            audio_utils.write_chunks_stream(output_blocks(), sample_rate, out_path, bounds)
+    return bounds, mask
+
+
+def process_file(audio_file: str, out_dir: str, audio_cfg: AudioConfig,
+                 packed_output: bool = False) -> dict:
+    """1ファイル分の前処理（32kHz/mono変換, 無音トリム, LUFS正規化, 分割）
+
+    デコードした1つのバッファ上で全工程を実行し、ディスクには最終チャンクのみ書き出す。
+    stream_block_sec>0の場合はブロック単位で処理し、長時間の入力でもメモリ使用量を一定に保つ。
+    packed_outputがTrueの場合はチャンクWAVの代わりに一時PCM（result['part']）を書き出し、
+    親プロセスがパック形式のデータファイルに追記する。
+    プロセスプールから呼ばれるため、例外は送出せず結果辞書に格納する。
+    """
+    from . import audio_utils, packed
+
+    result = {
+        'file': audio_file,
+        'skipped': False,
+        'entry': None,
+        'chunks': [],
+        'part': None,
+        'duration': 0.0,
+        'elapsed': 0.0,
+        'log': [],
+        'error': None,
+    }
+    start = time.perf_counter()
+    base_name = os.path.splitext(os.path.basename(audio_file))[0]
+    chunks_name = f"{base_name}_chunks"
+    chunks_dir = os.path.join(out_dir, chunks_name)
+    # チャンクは一時ディレクトリ（パック形式では一時PCM）に書き、完了後にまとめて置き換える
+    partial_path = f"{chunks_dir}{packed.PART_SUFFIX}" if packed_output else f"{chunks_dir}.partial"
+
+    try:
+        stat = os.stat(audio_file)
+        content_hash = file_sha256(audio_file)
+
+        if os.path.isdir(partial_path):
+            shutil.rmtree(partial_path)
+        prep_func = _prep_streaming if audio_cfg.stream_block_sec > 0 else _prep_in_memory
+        with profiling.span('prep.file', file=os.path.basename(audio_file)):
+            bounds, mask = prep_func(audio_file, partial_path, audio_cfg, content_hash, result, packed_output)
+        chunk_names = [os.path.join(chunks_name, f"chunk_{i:04d}.wav") for i in range(len(bounds))]
+
+        if packed_output:
+            result['part'] = partial_path
+            result['chunks'] = chunk_names
+        else:
+            if os.path.exists(chunks_dir):
+                shutil.rmtree(chunks_dir)
+            os.rename(partial_path, chunks_dir)
+            result['chunks'] = [os.path.join(out_dir, name) for name in chunk_names]
+        result['log'].append(f"  分割完了: {len(result['chunks'])}個のチャンク")
+
+        # チャンクの元音声上の位置（トリムで除いた区間を考慮）
+        sample_rate = audio_cfg.sample_rate
+        frame_size = int(sample_rate * audio_utils.VAD_FRAME_SEC)
+        starts = np.array([b[0] for b in bounds])
+        ends = np.array([b[1] - 1 for b in bounds])
+        if audio_cfg.trim_silence:
+            starts = audio_utils.trimmed_to_source(starts, mask, frame_size)
+            ends = audio_utils.trimmed_to_source(ends, mask, frame_size)
+        result['entry'] = {
+            'sha256': content_hash,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'params': prep_params(audio_cfg),
+            'duration': result['duration'],
+            'chunks': [
+                {
+                    'path': name,
+                    'offset': int(start),
+                    'length': int(end - start),
+                    'source_start': float(src_start) / sample_rate,
+                    'source_end': float(src_end + 1) / sample_rate,
+                }
+                for name, (start, end), src_start, src_end in zip(chunk_names, bounds, starts, ends)
+            ],
+        }
+
+    except Exception as e:
+        result['error'] = str(e)
+        result['log'].append(f"  エラー: {e}")
+        if os.path.isdir(partial_path):
+            shutil.rmtree(partial_path, ignore_errors=True)
+        elif os.path.exists(partial_path):
+            os.remove(partial_path)
+
+    result['elapsed'] = time.perf_counter() - start
+    return result
+
+
+def _skipped_result(audio_file: str, out_dir: str, entry: dict) -> dict:
+    """マニフェストにより処理を省略したファイルの結果"""
+    packed_output = 'pack_offset' in entry
+    return {
+        'file': audio_file,
+        'skipped': True,
+        'entry': entry,
+        'chunks': [c['path'] if packed_output else os.path.join(out_dir, c['path']) for c in entry['chunks']],
+        'part': None,
+        'duration': 0.0,
+        'elapsed': 0.0,
+        'log': ["  変更なし: スキップ"],
+        'error': None,
+    }
+
+
+def packed_index_chunks(manifest: dict, params: dict) -> List[dict]:
+    """マニフェストからパック形式のインデックスに載せるチャンクを求める"""
+    chunks = []
+    for name, entry in manifest['files'].items():
+        if 'pack_offset' not in entry or entry.get('params') != params:
+            continue
+        for c in entry['chunks']:
+            chunks.append({
+                'name': c['path'],
+                'source': name,
+                'offset': entry['pack_offset'] + c['offset'],
+                'length': c['length'],
+                'source_start': c['source_start'],
+                'source_end': c['source_end'],
+            })
+    return chunks
+
+
+def run_prep(audio_files: List[str], out_dir: str, audio_cfg: AudioConfig,
+             workers: int = 0, force: bool = False, packed_output: bool = False) -> Iterator[dict]:
+    """全ファイルを前処理し、入力順に結果を返すジェネレータ
+
+    出力ディレクトリのマニフェストを参照し、内容とパラメータが変わっていないファイルは省略する。
+    マニフェストは処理の進行に合わせて保存されるため、中断後の再実行はファイル単位で再開される。
+    packed_outputがTrueの場合は各ファイルの一時PCMを入力順にデータファイルへ追記し、インデックスを更新する。
+    再処理したファイルの古い区間はデータファイルに残るため、詰め直す場合はforceで作り直す。
+    """
+    from . import packed
+
+    duplicates = duplicate_stems(audio_files)
+    if duplicates:
+        # 並列に処理すると同じ作業ディレクトリを互いに消してしまうため、処理を始める前に止める
+        stem, files = next(iter(duplicates.items()))
+        raise ValueError(f"拡張子を除いた名前が同じファイルがあります（{stem}）: "
+                         f"{', '.join(os.path.basename(f) for f in files)}")
+
+    manifest = load_manifest(out_dir)
+    params = prep_params(audio_cfg)
+    if force and packed_output:
+        packed.reset(out_dir)
+        manifest['files'] = {k: v for k, v in manifest['files'].items() if 'pack_offset' not in v}
+
+    def save():
+        save_manifest(out_dir, manifest)
+        if packed_output:
+            packed.write_index(out_dir, audio_cfg.sample_rate, packed_index_chunks(manifest, params))
+
+    pending = []
+    skipped = {}
+    for audio_file in audio_files:
+        entry = manifest['files'].get(os.path.basename(audio_file))
+        if not force and is_up_to_date(entry, audio_file, out_dir, params, packed_output):
+            skipped[audio_file] = entry
+        else:
+            pending.append(audio_file)
+
+    workers = resolve_workers(workers, len(pending))
+    last_save = time.monotonic()
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and pending else None
+    try:
+        if executor:
+            futures = {f: profiling.submit(executor, process_file, f, out_dir, audio_cfg, packed_output)
+                       for f in pending}
+
+        # 入力順に結果を返す（完了順ではなく順序を保った進捗表示のため）
+        for audio_file in audio_files:
+            if audio_file in skipped:
+                yield _skipped_result(audio_file, out_dir, skipped[audio_file])
+                continue
+
+            if executor:
+                result = profiling.unwrap(futures[audio_file].result())
+            else:
+                # 単一ワーカーはプールを作らずにその場で処理
+                result = process_file(audio_file, out_dir, audio_cfg, packed_output)
+
+            if result['part']:
+                # データファイルへの追記は親プロセスのみが行う
+                entry = result['entry']
+                entry['pack_offset'] = packed.append_part(out_dir, result['part'])
+                entry['pack_length'] = sum(c['length'] for c in entry['chunks'])
+                os.remove(result['part'])
+                result['part'] = None
+
+            if result['entry']:
+                manifest['files'][os.path.basename(audio_file)] = result['entry']
+                if time.monotonic() - last_save >= MANIFEST_SAVE_INTERVAL:
+                    save()
+                    last_save = time.monotonic()
+            yield result
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+        save()
+
+
+def summarize(results: List[dict], wall_time: float) -> dict:
+    """処理結果の集計"""
+    failed = [r for r in results if r['error']]
+    skipped = [r for r in results if r['skipped']]
+    audio_sec = sum(r['duration'] for r in results)
+    return {
+        'files': len(results),
+        'succeeded': len(results) - len(failed) - len(skipped),
+        'skipped': len(skipped),
+        'failed': len(failed),
+        'chunks': sum(len(r['chunks']) for r in results),
+        'audio_sec': audio_sec,
+        'wall_time': wall_time,
+        'files_per_sec': len(results) / wall_time if wall_time > 0 else 0.0,
+        'audio_sec_per_sec': audio_sec / wall_time if wall_time > 0 else 0.0,
+    }
@@ -0,0 +1,331 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from collections import defaultdict
+from typing import List, Optional
+
+# 計測中のプロファイラ（Noneの間はspanが何もしないコンテキストマネージャを返す）
+_active = None
+_NULL_SPAN = contextlib.nullcontext()
+
+MEMORY_MODES = ('rss', 'tracemalloc', 'none')
+# RSSを読む間隔（秒）
+RSS_INTERVAL = 0.02
+
+
+def _read_rss() -> Optional[int]:
+    """現在のRSS（バイト, /procがない環境ではピークRSS）"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+        except ImportError:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _now_us() -> float:
+    # perf_counterはシステム全体で単調なため、プロセスプールのワーカーのスパンと同じ時間軸に並べられる
+    return time.perf_counter() * 1e6
+
+
+class _Span:
+    __slots__ = ('profiler', 'name', 'cat', 'args', 'start', 'mem_start', 'mem_peak')
+
+    def __init__(self, profiler, name, cat, args):
+        self.profiler = profiler
+        self.name = name
+        self.cat = cat
+        self.args = args
+
+    def __enter__(self):
+        self.profiler._enter(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit(self)
+        return False
+
+
+class Profiler:
+    """スパン（名前付きの区間）の時間とメモリのピークを記録し、Chrome trace event形式で書き出す
+
+    memory='rss'では別スレッドでRSSを読み、各スパンの区間中の最大値を記録する（オーバーヘッドは小さい）。
+    memory='tracemalloc'ではPythonとnumpyの割り当てを追跡し、スパンごとのピーク割り当て量を記録する
+    （処理は遅くなるが、スパンが入れ子になっていても区間ごとのピークを求められる）。
+    スレッドを並行して使う処理では、スパンのメモリはプロセス全体の値になる。
+    """
+
+    def __init__(self, memory: str = 'rss'):
+        if memory not in MEMORY_MODES:
+            raise ValueError(f"未対応のメモリ計測方法です: {memory}")
+        self.memory = memory
+        self.events: List[dict] = []
+        self.pid = os.getpid()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = set()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        elif self.memory == 'rss':
+            self._sampler = threading.Thread(target=self._sample, name='rvccli-profile-rss', daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._sampler:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            tracemalloc.stop()
+
+    def _sample(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            rss = _read_rss()
+            if rss is None:
+                return
+            with self._lock:
+                for span in self._open:
+                    if rss > span.mem_peak:
+                        span.mem_peak = rss
+            self.events.append({'name': 'rss', 'ph': 'C', 'ts': _now_us(), 'pid': self.pid,
+                                'args': {'MB': round(rss / (1 << 20), 1)}})
+
+    def span(self, name: str, cat: str, args: dict) -> _Span:
+        return _Span(self, name, cat, args)
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, span: _Span):
+        stack = self._stack()
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            # 親のピークを確定してから、このスパンのためにピークをリセットする
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, peak)
+            tracemalloc.reset_peak()
+            span.mem_start = span.mem_peak = current
+        elif self.memory == 'rss':
+            span.mem_start = span.mem_peak = _read_rss() or 0
+            with self._lock:
+                self._open.add(span)
+        else:
+            span.mem_start = span.mem_peak = 0
+        stack.append(span)
+        span.start = _now_us()
+
+    def _exit(self, span: _Span):
+        end = _now_us()
+        stack = self._stack()
+        if stack and stack[-1] is span:
+            stack.pop()
+        args = dict(span.args)
+        if self.memory == 'tracemalloc':
+            import tracemalloc
+            span.mem_peak = max(span.mem_peak, tracemalloc.get_traced_memory()[1])
+            if stack:
+                stack[-1].mem_peak = max(stack[-1].mem_peak, span.mem_peak)
+            tracemalloc.reset_peak()
+            args['peak_traced_mb'] = round(span.mem_peak / (1 << 20), 2)
+            args['alloc_mb'] = round((span.mem_peak - span.mem_start) / (1 << 20), 2)
+        elif self.memory == 'rss':
+            with self._lock:
+                self._open.discard(span)
+            span.mem_peak = max(span.mem_peak, _read_rss() or 0)
+            args['peak_rss_mb'] = round(span.mem_peak / (1 << 20), 1)
+        event = {'name': span.name, 'cat': span.cat, 'ph': 'X', 'ts': span.start, 'dur': end - span.start,
+                 'pid': self.pid, 'tid': threading.get_ident()}
+        if args:
+            event['args'] = args
+        self.events.append(event)
+
+    def add_events(self, events: List[dict]):
+        """プロセスプールのワーカーが返したスパンを加える"""
+        self.events.extend(events)
+
+    def trace(self) -> dict:
+        """Chrome trace event形式（chrome://tracing や Perfetto で開ける）"""
+        meta = []
+        for pid in sorted({e['pid'] for e in self.events}):
+            name = 'rvccli' if pid == self.pid else f"worker {pid}"
+            meta.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}})
+        return {'traceEvents': meta + self.events, 'displayTimeUnit': 'ms',
+                'otherData': {'memory': self.memory, 'argv': sys.argv}}
+
+
+def enabled() -> bool:
+    return _active is not None
+
+
+def span(name: str, cat: str = 'rvccli', **args):
+    """計測区間（無効の場合は何もしない）
+
+        with profiling.span('vad', file=path):
+            ...
+    """
+    if _active is None:
+        return _NULL_SPAN
+    return _active.span(name, cat, args)
+
+
+def record(name: str, start: float, end: float, cat: str = 'rvccli', tid: int = None, **args):
+    """withで囲めない区間（ポーリングで終了を待つサブプロセスなど）を記録する
+
+    start, endはperf_counterの秒。同時に進む区間はtid（サブプロセスのPIDなど）を分けて別の行に表示する。
+    """
+    if _active is None:
+        return
+    event = {'name': name, 'cat': cat, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+             'pid': _active.pid, 'tid': tid if tid is not None else threading.get_ident()}
+    if args:
+        event['args'] = args
+    _active.events.append(event)
+
+
+def enable(memory: str = 'rss') -> Profiler:
+    global _active
+    _active = Profiler(memory).start()
+    return _active
+
+
+def disable() -> Optional[Profiler]:
+    """計測を終了してプロファイラを返す"""
+    global _active
+    profiler, _active = _active, None
+    if profiler:
+        profiler.stop()
+    return profiler
+
+
+def add_events(events: List[dict]):
+    if _active is not None and events:
+        _active.add_events(events)
+
+
+class _WorkerResult:
+    """ワーカーの戻り値と、ワーカーで記録したスパン"""
+    __slots__ = ('value', 'events')
+
+    def __init__(self, value, events):
+        self.value = value
+        self.events = events
+
+    def __getstate__(self):
+        return self.value, self.events
+
+    def __setstate__(self, state):
+        self.value, self.events = state
+
+
+class traced:
+    """プロセスプールで実行する関数を包み、戻り値とワーカーで記録したスパンを返す
+
+    forkで起動したワーカーは親のプロファイラを引き継ぐため、呼び出しごとに新しいプロファイラに差し替える。
+    """
+
+    def __init__(self, fn, memory: str = 'rss'):
+        self.fn = fn
+        self.memory = memory
+
+    def __call__(self, *args, **kwargs):
+        global _active
+        previous = _active
+        profiler = _active = Profiler(self.memory).start()
+        try:
+            value = self.fn(*args, **kwargs)
+        finally:
+            profiler.stop()
+            _active = previous
+        return _WorkerResult(value, profiler.events)
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submitと同じだが、計測中はワーカーのスパンを持ち帰る（結果はunwrapで取り出す）"""
+    if _active is None:
+        return executor.submit(fn, *args, **kwargs)
+    return executor.submit(traced(fn, _active.memory), *args, **kwargs)
+
+
+def unwrap(value):
+    """submitで実行した結果を取り出し、ワーカーのスパンを加える"""
+    if not isinstance(value, _WorkerResult):
+        return value
+    add_events(value.events)
+    return value.value
+
+
+def summarize(events: List[dict]) -> List[dict]:
+    """スパン名ごとの回数・合計時間・自身の時間（子スパンを除く）・メモリのピーク（自身の時間の大きい順）"""
+    spans = [e for e in events if e.get('ph') == 'X']
+    self_time = {}
+    by_thread = defaultdict(list)
+    for e in spans:
+        by_thread[(e['pid'], e['tid'])].append(e)
+    for thread_spans in by_thread.values():
+        thread_spans.sort(key=lambda e: (e['ts'], -e['dur']))
+        stack = []
+        for e in thread_spans:
+            while stack and stack[-1]['ts'] + stack[-1]['dur'] <= e['ts']:
+                stack.pop()
+            self_time[id(e)] = e['dur']
+            if stack:
+                self_time[id(stack[-1])] -= e['dur']
+            stack.append(e)
+
+    rows = {}
+    for e in spans:
+        row = rows.setdefault(e['name'], {'name': e['name'], 'count': 0, 'total_ms': 0.0, 'self_ms': 0.0,
+                                          'max_ms': 0.0, 'peak_mb': None})
+        row['count'] += 1
+        row['total_ms'] += e['dur'] / 1000
+        row['self_ms'] += max(self_time[id(e)], 0) / 1000
+        row['max_ms'] = max(row['max_ms'], e['dur'] / 1000)
+        args = e.get('args', {})
+        peak = args.get('peak_rss_mb', args.get('peak_traced_mb'))
+        if peak is not None:
+            row['peak_mb'] = max(row['peak_mb'] or 0.0, peak)
+    return sorted(rows.values(), key=lambda r: r['self_ms'], reverse=True)
+
+
+def format_summary(rows: List[dict], memory: str, top: int = 15) -> str:
+    """上位top件の表（自身%は全スパンの自身の時間の合計に対する割合。ワーカーの時間も合計に含む）"""
+    measured = sum(r['self_ms'] for r in rows) or 1.0
+    mem_label = {'rss': 'ピークRSS', 'tracemalloc': 'ピーク割当'}.get(memory, '')
+    lines = [f"{'スパン':<32} {'回数':>6} {'自身(ms)':>10} {'合計(ms)':>10} {'最大(ms)':>10} {'自身%':>6} {mem_label:>10}"]
+    for r in rows[:top]:
+        peak = f"{r['peak_mb']:8.1f}MB" if r['peak_mb'] is not None else ''
+        lines.append(f"{r['name'][:32]:<32} {r['count']:>6} {r['self_ms']:>10.1f} {r['total_ms']:>10.1f} "
+                     f"{r['max_ms']:>10.1f} {100 * r['self_ms'] / measured:>5.1f}% {peak:>10}")
+    return '\n'.join(lines)
+
+
+def write(profiler: Profiler, path: str, top: int = 15) -> str:
+    """Chrome traceのJSONと上位スパンの集計（<path>.txt）を書き出し、集計を返す"""
+    from .cache import atomic_write
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with atomic_write(path, 'w', encoding='utf-8') as f:
+        json.dump(profiler.trace(), f)
+    summary = format_summary(summarize(profiler.events), profiler.memory, top)
+    with atomic_write(path + '.txt', 'w', encoding='utf-8') as f:
+        f.write(summary + '\n')
+    return summary
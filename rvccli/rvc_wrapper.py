@@ -3,13 +3,22 @@ import subprocess
 import logging
 from pathlib import Path
 
-# ログ設定
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from . import profiling
+
+# ログの出力先と形式はCLI（cli.main）で設定する
 logger = logging.getLogger(__name__)
 
+# Mangio-RVC-Forkの場所（環境変数で変更可能）
+FORK_DIR_ENV = "RVCCLI_FORK_DIR"
+
+def get_rvc_dir():
+    """Mangio-RVC-Forkリポジトリのディレクトリ"""
+    return os.path.abspath(os.environ.get(FORK_DIR_ENV) or
+                           os.path.join(os.path.dirname(__file__), '..', 'Mangio-RVC-Fork'))
+
 def _check_rvc_repository():
     """Mangio-RVC-Forkリポジトリの存在確認"""
-    rvc_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Mangio-RVC-Fork'))
+    rvc_dir = get_rvc_dir()
     if not os.path.exists(rvc_dir):
         logger.warning(f"Mangio-RVC-Forkリポジトリが見つかりません: {rvc_dir}")
         logger.info("以下のコマンドでクローンしてください:")
@@ -23,7 +32,25 @@ def _validate_paths(*paths):
         if path and not os.path.exists(path):
             raise FileNotFoundError(f"パスが見つかりません: {path}")
 
-def train(dataset_dir, sr, f0_method, batch, steps, fp16, out_dir, index_rate, save_every_n):
+def _restore_f0(dataset_dir, f0_method):
+    """キャッシュ済みのF0をデータセットに書き出し、実行前にF0がなかった音声の内容ハッシュを返す"""
+    from . import f0_cache
+    try:
+        return f0_cache.materialize(dataset_dir, f0_method)['hashes']
+    except Exception as e:
+        # キャッシュの失敗で抽出自体は止めない
+        logger.warning(f"F0キャッシュの復元に失敗しました: {e}")
+        return None
+
+def _store_f0(dataset_dir, f0_method, hashes):
+    """フォークが抽出したF0をキャッシュに取り込む"""
+    from . import f0_cache
+    try:
+        f0_cache.ingest(dataset_dir, f0_method, hashes=hashes)
+    except Exception as e:
+        logger.warning(f"F0キャッシュへの保存に失敗しました: {e}")
+
+def train(dataset_dir, sr, f0_method, batch, steps, fp16, out_dir, index_rate, save_every_n, use_f0_cache=True):
     """Mangio-RVC-Forkの学習スクリプトを呼び出し"""
     logger.info("学習プロセスを開始します...")
     
@@ -39,7 +66,7 @@ def train(dataset_dir, sr, f0_method, batch, steps, fp16, out_dir, index_rate, s
         return False
     
     # 学習スクリプトのパス
-    train_script = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Mangio-RVC-Fork', 'train.py'))
+    train_script = os.path.join(get_rvc_dir(), 'train.py')
     if not os.path.exists(train_script):
         logger.error(f"学習スクリプトが見つかりません: {train_script}")
         return False
@@ -69,15 +96,21 @@ def train(dataset_dir, sr, f0_method, batch, steps, fp16, out_dir, index_rate, s
     logger.info(f"バッチサイズ: {batch}")
     logger.info(f"学習ステップ数: {steps}")
     
+    # 同じ音声のF0はキャッシュから復元し、フォークでの再抽出を省く
+    f0_hashes = _restore_f0(dataset_dir, f0_method) if use_f0_cache else None
+    
     try:
         # 学習プロセスの実行
         logger.info("学習スクリプトを実行中...")
-        result = subprocess.run(
-            cmd, 
-            check=True, 
-            capture_output=False,  # リアルタイムでログを表示
-            text=True
-        )
+        with profiling.span('rvc.train', cat='subprocess'):
+            result = subprocess.run(
+                cmd, 
+                check=True, 
+                capture_output=False,  # リアルタイムでログを表示
+                text=True
+            )
+        if use_f0_cache:
+            _store_f0(dataset_dir, f0_method, f0_hashes)
         logger.info("学習が正常に完了しました")
         return True
         
@@ -94,8 +127,41 @@ def train(dataset_dir, sr, f0_method, batch, steps, fp16, out_dir, index_rate, s
         logger.error(f"予期しないエラーが発生しました: {e}")
         return False
 
-def infer(input_wav, model_path, index_path, transpose, f0_method, rms_mix_rate, filter_radius, resample_sr, out_path):
-    """Mangio-RVC-Forkの推論スクリプトを呼び出し"""
+def _infer_via_server(input_wav, model_path, index_path, out_path, socket_path, params):
+    """起動中の推論サーバー（rvccli serve）に変換を要求"""
+    from .server import InferenceClient
+    
+    logger.info(f"推論サーバーに送信します: {socket_path}")
+    try:
+        response = InferenceClient(socket_path).convert(input_wav, out_path, model_path, index_path, **params)
+    except Exception as e:
+        logger.error(f"推論サーバーでの変換に失敗しました: {e}")
+        return False
+    
+    # 初回のみ発生するモデル読み込みと、リクエストごとの変換時間を分けて表示
+    if response['load_sec'] > 0:
+        logger.info(f"モデル読み込み: {response['load_sec']:.2f}秒")
+    else:
+        logger.info("モデル読み込み: なし（キャッシュ済み）")
+    if response.get('f0_cache_hit') is not None:
+        if response['f0_cache_hit']:
+            logger.info("F0抽出: なし（F0キャッシュ済み）")
+        else:
+            logger.info(f"F0抽出: {response['f0_sec']:.2f}秒")
+    if response.get('wait_sec', 0.0) >= 0.01:
+        logger.info(f"変換待ち: {response['wait_sec']:.2f}秒（他の要求の変換中）")
+    logger.info(f"変換: {response['convert_sec']:.2f}秒 / 往復: {response['round_trip_sec']:.2f}秒")
+    logger.info("推論が正常に完了しました")
+    return True
+
+def infer(input_wav, model_path, index_path, transpose, f0_method, rms_mix_rate, filter_radius, resample_sr, out_path,
+          socket_path=None, use_server=True):
+    """Mangio-RVC-Forkの推論スクリプトを呼び出し
+
+    推論サーバー（rvccli serve）が起動していればそちらに要求を送り、モデルの再読み込みを省く。
+    """
+    from . import server
+    
     logger.info("推論プロセスを開始します...")
     
     # パスの検証
@@ -105,19 +171,30 @@ def infer(input_wav, model_path, index_path, transpose, f0_method, rms_mix_rate,
         logger.error(f"入力ファイルの検証に失敗: {e}")
         return False
     
+    # 出力ディレクトリの作成
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    
+    socket_path = socket_path or server.default_socket_path()
+    if use_server and server.is_running(socket_path):
+        params = {
+            'transpose': transpose,
+            'f0_method': f0_method,
+            'rms_mix_rate': rms_mix_rate,
+            'filter_radius': filter_radius,
+            'resample_sr': resample_sr,
+        }
+        return _infer_via_server(input_wav, model_path, index_path, out_path, socket_path, params)
+    
     # RVCリポジトリの確認
     if not _check_rvc_repository():
         return False
     
     # 推論スクリプトのパス
-    infer_script = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Mangio-RVC-Fork', 'infer.py'))
+    infer_script = os.path.join(get_rvc_dir(), 'infer.py')
     if not os.path.exists(infer_script):
         logger.error(f"推論スクリプトが見つかりません: {infer_script}")
         return False
     
-    # 出力ディレクトリの作成
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    
     # 推論コマンドの構築
     cmd = [
         'python', infer_script,
@@ -143,12 +220,13 @@ def infer(input_wav, model_path, index_path, transpose, f0_method, rms_mix_rate,
     try:
         # 推論プロセスの実行
         logger.info("推論スクリプトを実行中...")
-        result = subprocess.run(
-            cmd, 
-            check=True, 
-            capture_output=False,  # リアルタイムでログを表示
-            text=True
-        )
+        with profiling.span('rvc.infer', cat='subprocess'):
+            result = subprocess.run(
+                cmd, 
+                check=True, 
+                capture_output=False,  # リアルタイムでログを表示
+                text=True
+            )
         logger.info("推論が正常に完了しました")
         return True
         
@@ -165,8 +243,12 @@ def infer(input_wav, model_path, index_path, transpose, f0_method, rms_mix_rate,
         logger.error(f"予期しないエラーが発生しました: {e}")
         return False
 
-def extract_features(dataset_dir, f0_method="rmvpe"):
-    """特徴量抽出プロセス"""
+def extract_features(dataset_dir, f0_method="rmvpe", use_f0_cache=True, shards=1, workers=1, retries=1,
+                     resume=True):
+    """特徴量抽出プロセス
+
+    shardsが2以上の場合はデータセットを分割し、workers個のプロセスで並列に抽出する（feature_shards）。
+    """
     logger.info("特徴量抽出を開始します...")
     
     # パスの検証
@@ -181,11 +263,15 @@ def extract_features(dataset_dir, f0_method="rmvpe"):
         return False
     
     # 特徴量抽出スクリプトのパス
-    extract_script = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'Mangio-RVC-Fork', 'extract_feature.py'))
+    extract_script = os.path.join(get_rvc_dir(), 'extract_feature.py')
     if not os.path.exists(extract_script):
         logger.error(f"特徴量抽出スクリプトが見つかりません: {extract_script}")
         return False
     
+    if shards > 1:
+        return _extract_features_sharded(dataset_dir, extract_script, f0_method, use_f0_cache,
+                                         shards, workers, retries, resume)
+    
     # 特徴量抽出コマンドの構築
     cmd = [
         'python', extract_script,
@@ -195,15 +281,21 @@ def extract_features(dataset_dir, f0_method="rmvpe"):
     
     logger.info(f"実行コマンド: {' '.join(cmd)}")
     
+    # 同じ音声のF0はキャッシュから復元し、フォークでの再抽出を省く
+    f0_hashes = _restore_f0(dataset_dir, f0_method) if use_f0_cache else None
+    
     try:
         # 特徴量抽出プロセスの実行
         logger.info("特徴量抽出スクリプトを実行中...")
-        result = subprocess.run(
-            cmd, 
-            check=True, 
-            capture_output=False,
-            text=True
-        )
+        with profiling.span('rvc.extract_features', cat='subprocess'):
+            result = subprocess.run(
+                cmd, 
+                check=True, 
+                capture_output=False,
+                text=True
+            )
+        if use_f0_cache:
+            _store_f0(dataset_dir, f0_method, f0_hashes)
         logger.info("特徴量抽出が正常に完了しました")
         return True
         
@@ -215,6 +307,31 @@ def extract_features(dataset_dir, f0_method="rmvpe"):
         logger.error(f"予期しないエラーが発生しました: {e}")
         return False
 
+def _extract_features_sharded(dataset_dir, extract_script, f0_method, use_f0_cache, shards, workers, retries,
+                              resume):
+    """シャードごとの並列抽出を実行し、シャードごとの処理速度を表示"""
+    from .feature_shards import run_sharded
+    
+    logger.info(f"{shards}個のシャードに分割し、{workers}プロセスで並列に抽出します")
+    try:
+        report = run_sharded(dataset_dir, extract_script, f0_method, shards, workers, retries,
+                             use_f0_cache, resume)
+    except Exception as e:
+        logger.error(f"特徴量抽出でエラーが発生しました: {e}")
+        return False
+    
+    for shard in report['shards']:
+        speed = ""
+        if shard['files_per_sec']:
+            speed = f", {shard['files_per_sec']:.2f}ファイル/秒, 実時間の{shard['audio_sec_per_sec']:.1f}倍速"
+        logger.info(f"シャード{shard['index']}: {shard['status']} ({shard['done_files']}/{shard['files']}ファイル, "
+                    f"{shard['attempts']}回実行, {shard['elapsed']:.1f}秒{speed})")
+    if not report['ok']:
+        logger.error(f"失敗したシャードがあります: {report['failed_shards']}（再実行すると完了済みのシャードは省きます）")
+        return False
+    logger.info(f"特徴量抽出が正常に完了しました（{report['files']}ファイル, {report['wall_time']:.1f}秒）")
+    return True
+
 def get_training_status(out_dir):
     """学習の進行状況を確認"""
     logger.info(f"学習状況を確認中: {out_dir}")
@@ -224,23 +341,22 @@ def get_training_status(out_dir):
         return None
     
     # 学習ログファイルの確認
-    log_files = list(Path(out_dir).glob("*.log"))
-    if not log_files:
+    from .train_monitor import latest_log, tail_lines
+    log_path = latest_log(out_dir)
+    if not log_path:
         logger.info("学習ログファイルが見つかりません")
         return None
     
     # 最新のログファイルを確認
-    latest_log = max(log_files, key=lambda x: x.stat().st_mtime)
+    latest_log = Path(log_path)
     logger.info(f"最新のログファイル: {latest_log}")
     
     try:
-        with open(latest_log, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            # 最後の数行を表示
-            last_lines = lines[-10:] if len(lines) > 10 else lines
-            logger.info("最新のログ内容:")
-            for line in last_lines:
-                logger.info(f"  {line.strip()}")
+        # 末尾だけを読む（長時間の学習で巨大になったログも全体は読まない）
+        last_lines = tail_lines(log_path, 10)
+        logger.info("最新のログ内容:")
+        for line in last_lines:
+            logger.info(f"  {line.strip()}")
     except Exception as e:
         logger.error(f"ログファイルの読み込みに失敗: {e}")
     
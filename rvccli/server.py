@@ -0,0 +1,250 @@
+import os
+import json
+import time
+import socket
+import getpass
+import logging
+import tempfile
+import contextlib
+import threading
+import socketserver
+import importlib.util
+
+from .model_cache import ModelCache, DEFAULT_BUDGET_MB
+
+logger = logging.getLogger(__name__)
+
+# 推論サーバーのソケットパス（環境変数で変更可能）
+SOCKET_ENV = "RVCCLI_SOCKET"
+# 推論バックエンド（load/convertを持つPythonファイル）の既定のファイル名（フォークのディレクトリ内）
+BACKEND_NAME = "rvccli_backend.py"
+# 推論の引数のうち、バックエンドに渡す変換パラメータ
+CONVERT_PARAMS = ('transpose', 'f0_method', 'rms_mix_rate', 'filter_radius', 'resample_sr')
+
+
+def default_socket_path() -> str:
+    """推論サーバーの既定のソケットパス"""
+    return os.environ.get(SOCKET_ENV) or os.path.join(tempfile.gettempdir(), f"rvccli-{getpass.getuser()}.sock")
+
+
+def load_backend(path: str):
+    """推論バックエンドのPythonファイルを読み込む
+
+    バックエンドは以下の2関数を持つ:
+        load(model_path, index_path) -> モデル（任意のオブジェクト）
+        convert(model, input_wav, out_path, params: dict) -> None
+    THREAD_SAFE = True を定義したバックエンドは、複数の変換を並行して実行する。
+    model_size(model) -> int を定義した場合は、モデルキャッシュのメモリ見積もりに使う。
+    compute_f0(input_wav, f0_method, hop_size, sample_rate) -> np.ndarray を定義した場合は、
+    F0をF0キャッシュ経由で求めてparams['f0']としてconvertに渡す（同じ音声のF0は再計算しない）。
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"推論バックエンドが見つかりません: {path}")
+    spec = importlib.util.spec_from_file_location("rvccli_backend", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    for name in ('load', 'convert'):
+        if not callable(getattr(module, name, None)):
+            raise ValueError(f"推論バックエンドに{name}()がありません: {path}")
+    return module
+
+
+class InferenceWorker:
+    """モデルをキャッシュに保持し、変換要求を処理する"""
+
+    def __init__(self, backend, cache_mb: float = DEFAULT_BUDGET_MB, use_f0_cache: bool = True):
+        self.backend = backend
+        self._lock = threading.Lock()
+        # スレッドセーフでないバックエンドは変換も直列に行う
+        self._convert_lock = threading.Lock() if not getattr(backend, 'THREAD_SAFE', False) else None
+        self.cache = ModelCache(backend.load, int(cache_mb * (1 << 20)), getattr(backend, 'model_size', None))
+        self.f0_cache = None
+        if use_f0_cache and callable(getattr(backend, 'compute_f0', None)):
+            from .f0_cache import F0Cache
+            self.f0_cache = F0Cache()
+        self.started = time.time()
+        self.requests = 0
+
+    def get_model(self, model_path: str, index_path: str):
+        """(モデル, 読み込み秒数, キャッシュヒット)を返す（ヒット時の読み込み秒数は0）"""
+        model, load_sec, hit = self.cache.get(model_path, index_path)
+        if not hit:
+            logger.info(f"モデルを読み込みました: {model_path} ({load_sec:.2f}秒)")
+        return model, load_sec, hit
+
+    def get_f0(self, input_wav: str, f0_method: str):
+        """(F0, 計算秒数, キャッシュヒット)を返す（キャッシュのキーは音声の内容ハッシュと抽出条件）"""
+        from .cache import file_sha256
+        from .f0_cache import F0_HOP_SIZE, F0_SAMPLE_RATE
+
+        hop_size = getattr(self.backend, 'F0_HOP_SIZE', F0_HOP_SIZE)
+        sample_rate = getattr(self.backend, 'F0_SAMPLE_RATE', F0_SAMPLE_RATE)
+        content_hash = file_sha256(input_wav)
+        f0 = self.f0_cache.get(content_hash, f0_method, hop_size, sample_rate)
+        if f0 is not None:
+            return f0, 0.0, True
+        start = time.perf_counter()
+        f0 = self.backend.compute_f0(input_wav, f0_method, hop_size, sample_rate)
+        elapsed = time.perf_counter() - start
+        self.f0_cache.put(content_hash, f0_method, f0, hop_size, sample_rate)
+        return f0, elapsed, False
+
+    def convert(self, request: dict) -> dict:
+        """変換要求を処理し、読み込み時間・F0抽出時間・変換待ち時間・変換時間を分けて返す"""
+        params = {k: request['params'][k] for k in CONVERT_PARAMS if k in request.get('params', {})}
+        model, load_sec, hit = self.get_model(request['model'], request.get('index'))
+        f0_sec, f0_hit = 0.0, None
+        if self.f0_cache is not None:
+            params['f0'], f0_sec, f0_hit = self.get_f0(request['input'], params.get('f0_method', 'rmvpe'))
+        wait_start = time.perf_counter()
+        # スレッドセーフでないバックエンドでは、他の要求の変換が終わるまでの待ち時間を変換時間に含めない
+        with self._convert_lock or contextlib.nullcontext():
+            start = time.perf_counter()
+            self.backend.convert(model, request['input'], request['out'], params)
+            convert_sec = time.perf_counter() - start
+        with self._lock:
+            self.requests += 1
+        return {'ok': True, 'load_sec': load_sec, 'f0_sec': f0_sec, 'wait_sec': start - wait_start,
+                'convert_sec': convert_sec, 'cache_hit': hit, 'f0_cache_hit': f0_hit}
+
+    def ping(self) -> dict:
+        return {
+            'ok': True,
+            'pid': os.getpid(),
+            'uptime': time.time() - self.started,
+            'requests': self.requests,
+        }
+
+    def stats(self) -> dict:
+        stats = {**self.ping(), 'cache': self.cache.stats()}
+        if self.f0_cache is not None:
+            stats['f0_cache'] = self.f0_cache.stats()
+        return stats
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """1行1リクエストのJSONを処理する"""
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            op = None
+            try:
+                request = json.loads(line)
+                op = request.get('op')
+                if op == 'convert':
+                    response = self.server.worker.convert(request)
+                elif op == 'ping':
+                    response = self.server.worker.ping()
+                elif op == 'stats':
+                    response = self.server.worker.stats()
+                elif op == 'shutdown':
+                    response = {'ok': True}
+                else:
+                    response = {'ok': False, 'error': f"未対応の要求です: {op}"}
+            except Exception as e:
+                logger.error(f"要求の処理に失敗しました: {e}")
+                response = {'ok': False, 'error': str(e)}
+            self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode('utf-8'))
+            self.wfile.flush()
+            if op == 'shutdown':
+                # 応答を返してから停止する
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, worker: InferenceWorker):
+        self.worker = worker
+        super().__init__(socket_path, _RequestHandler)
+
+
+def serve(backend_path: str, socket_path: str = None, model_path: str = None, index_path: str = None,
+          ready=None, cache_mb: float = DEFAULT_BUDGET_MB):
+    """推論サーバーを起動し、停止するまで要求を処理する
+
+    model_pathを指定した場合は起動時に読み込む。readyは待ち受け開始時に呼ばれる。
+    cache_mbはモデルキャッシュのメモリ予算（MB）。
+    """
+    socket_path = socket_path or default_socket_path()
+    if os.path.exists(socket_path):
+        if is_running(socket_path):
+            raise RuntimeError(f"推論サーバーは既に起動しています: {socket_path}")
+        # 前回の異常終了で残ったソケットファイル
+        os.remove(socket_path)
+
+    worker = InferenceWorker(load_backend(backend_path), cache_mb)
+    if model_path:
+        _, load_sec, _ = worker.get_model(model_path, index_path)
+        logger.info(f"初回読み込み: {load_sec:.2f}秒")
+
+    server = InferenceServer(socket_path, worker)
+    try:
+        logger.info(f"推論サーバーを起動しました: {socket_path}")
+        if ready:
+            ready()
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        logger.info("推論サーバーを停止しました")
+
+
+class InferenceClient:
+    """推論サーバーへの要求を送るクライアント"""
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or default_socket_path()
+        self.timeout = timeout
+
+    def request(self, payload: dict) -> dict:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall((json.dumps(payload, ensure_ascii=False) + "\n").encode('utf-8'))
+            with sock.makefile('rb') as f:
+                line = f.readline()
+        if not line:
+            raise ConnectionError("推論サーバーから応答がありません")
+        return json.loads(line)
+
+    def ping(self) -> dict:
+        return self.request({'op': 'ping'})
+
+    def stats(self) -> dict:
+        return self.request({'op': 'stats'})
+
+    def shutdown(self) -> dict:
+        return self.request({'op': 'shutdown'})
+
+    def convert(self, input_wav: str, out_path: str, model_path: str, index_path: str = None,
+                **params) -> dict:
+        """変換を要求し、応答（load_sec, convert_sec）に往復時間（round_trip_sec）を加えて返す"""
+        start = time.perf_counter()
+        response = self.request({
+            'op': 'convert',
+            'input': os.path.abspath(input_wav),
+            'out': os.path.abspath(out_path),
+            'model': os.path.abspath(model_path),
+            'index': os.path.abspath(index_path) if index_path else None,
+            'params': params,
+        })
+        response['round_trip_sec'] = time.perf_counter() - start
+        if not response.get('ok'):
+            raise RuntimeError(response.get('error', "推論サーバーでエラーが発生しました"))
+        return response
+
+
+def is_running(socket_path: str = None) -> bool:
+    """推論サーバーが応答するか"""
+    socket_path = socket_path or default_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return False
+    try:
+        return bool(InferenceClient(socket_path, timeout=1.0).ping().get('ok'))
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,218 @@
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 既定のブロック長・先読み・左側の文脈・ブロック間のクロスフェード（ミリ秒）
+DEFAULT_BLOCK_MS = 200
+DEFAULT_LOOKAHEAD_MS = 50
+DEFAULT_CONTEXT_MS = 300
+DEFAULT_CROSSFADE_MS = 20
+# 読み込みスレッドと変換の間で保持するブロック数の上限
+QUEUE_BLOCKS = 16
+
+
+class StreamConverter:
+    """ブロック単位の逐次変換
+
+    各ブロックの変換には、直前のcontextサンプルと直後のlookaheadサンプルを加えた区間を渡し、
+    ブロックに対応する部分だけを出力する。ブロック境界は先読み区間の変換結果とクロスフェードする。
+    出力は入力よりlookaheadサンプル遅れるため、先頭のlookaheadサンプルは出力しない
+    （出力の各サンプルは入力の同じ位置に対応する）。
+    アルゴリズム遅延はブロック長 + 先読み。
+    """
+
+    def __init__(self, convert_fn: Callable[[np.ndarray], np.ndarray], sample_rate: int,
+                 block_size: int, lookahead: int = 0, context: int = 0, crossfade: int = 0):
+        if block_size <= 0:
+            raise ValueError("ブロック長は正の値にしてください")
+        self.convert_fn = convert_fn
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.lookahead = lookahead
+        self.context = context
+        # クロスフェードは先読み区間の変換結果を使うため、先読みより長くできない
+        self.crossfade = min(crossfade, lookahead, block_size)
+        self._buffer = np.zeros(context + lookahead, dtype=np.float32)
+        self._tail = None
+        self._skip = lookahead
+        self.process_sec: List[float] = []
+
+    @property
+    def latency_samples(self) -> int:
+        """アルゴリズム遅延（サンプル）: ブロックが揃うまでの待ちと先読み"""
+        return self.block_size + self.lookahead
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """block_sizeサンプルのブロックを入力し、確定した出力を返す"""
+        from .audio_utils import crossfade
+
+        window = self.context + self.block_size + self.lookahead
+        self._buffer = np.concatenate([self._buffer, block])[-window:]
+
+        start = time.perf_counter()
+        converted = np.asarray(self.convert_fn(self._buffer), dtype=np.float32)
+        self.process_sec.append(time.perf_counter() - start)
+        # 変換器による数サンプルの長さの差を吸収
+        if len(converted) < window:
+            converted = np.concatenate([converted, np.zeros(window - len(converted), dtype=np.float32)])
+
+        begin = self.context
+        out = converted[begin:begin + self.block_size].copy()
+        n = self.crossfade
+        if n:
+            if self._tail is not None:
+                # 同じ入力区間に対する前回（先読み）と今回の変換結果をつなぐ
+                out[:n] = crossfade(self._tail, out[:n], curve='linear')
+            self._tail = converted[begin + self.block_size:begin + self.block_size + n].copy()
+        if self._skip:
+            drop = min(self._skip, len(out))
+            out = out[drop:]
+            self._skip -= drop
+        return out
+
+
+def make_block_converter(backend_path: str, model_path: str, index_path: Optional[str],
+                         sample_rate: int, params: dict) -> Callable[[np.ndarray], np.ndarray]:
+    """推論バックエンドのconvert_blockで1区間を変換する関数を返す
+
+    バックエンドは convert_block(model, audio, sample_rate, params) -> np.ndarray を定義する必要がある。
+    """
+    from .server import load_backend, CONVERT_PARAMS
+
+    backend = load_backend(backend_path)
+    if not callable(getattr(backend, 'convert_block', None)):
+        raise ValueError(f"推論バックエンドにconvert_block()がありません: {backend_path}")
+    start = time.perf_counter()
+    model = backend.load(model_path, index_path)
+    logger.info(f"モデルを読み込みました: {model_path} ({time.perf_counter() - start:.2f}秒)")
+    params = {k: params[k] for k in CONVERT_PARAMS if k in params}
+
+    def convert(audio: np.ndarray) -> np.ndarray:
+        return backend.convert_block(model, audio, sample_rate, params)
+    return convert
+
+
+def run_stream(in_stream, out_stream, converter: StreamConverter, pcm_format: str = 's16le',
+               queue_blocks: int = QUEUE_BLOCKS) -> dict:
+    """入力ストリームの生PCMを逐次変換して出力ストリームへ書き出し、遅延の統計を返す
+
+    読み込みは別スレッドで行い、変換が一時的に遅れても入力を取りこぼさないようにする。
+    入力終了後は先読み分を無音で押し出し、出力の長さを入力と揃える。
+    """
+    from .audio_utils import read_pcm_blocks, float_to_pcm
+
+    block_size = converter.block_size
+    blocks = queue.Queue(maxsize=queue_blocks)
+    errors = []
+
+    def reader():
+        try:
+            for block in read_pcm_blocks(in_stream, block_size, 1, pcm_format):
+                blocks.put((block, time.perf_counter()))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            blocks.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+
+    total_in = 0
+    total_out = 0
+    end_to_end = []
+    max_queue = 0
+
+    def emit(out: np.ndarray):
+        nonlocal total_out
+        # 最後のブロックを埋めた無音の分は書き出さず、出力を入力の長さで打ち切る
+        out = out[:max(0, total_in - total_out)]
+        out_stream.write(float_to_pcm(out, pcm_format))
+        out_stream.flush()
+        total_out += len(out)
+
+    while True:
+        max_queue = max(max_queue, blocks.qsize())
+        item = blocks.get()
+        if item is None:
+            break
+        block, arrived = item
+        total_in += len(block)
+        if len(block) < block_size:
+            block = np.concatenate([block, np.zeros(block_size - len(block), dtype=np.float32)])
+        emit(converter.process(block))
+        # ブロックが揃ってから出力を書き終えるまでの時間（変換と待ち行列を含む）
+        end_to_end.append(time.perf_counter() - arrived)
+    thread.join()
+    if errors:
+        raise errors[0]
+
+    # 先読みとブロックの端数の分を押し出す
+    silence = np.zeros(block_size, dtype=np.float32)
+    while total_out < total_in:
+        emit(converter.process(silence))
+
+    return stream_stats(converter, total_in, end_to_end, max_queue)
+
+
+def stream_stats(converter: StreamConverter, total_in: int, end_to_end: List[float],
+                 max_queue: int = 0) -> dict:
+    """遅延と処理時間の統計（ミリ秒）"""
+    sr = converter.sample_rate
+    block_ms = converter.block_size / sr * 1000
+    process_ms = np.array(converter.process_sec) * 1000
+    e2e_ms = np.array(end_to_end) * 1000
+
+    def percentiles(values):
+        if len(values) == 0:
+            return {'p50': 0.0, 'p99': 0.0, 'max': 0.0}
+        return {'p50': float(np.percentile(values, 50)), 'p99': float(np.percentile(values, 99)),
+                'max': float(values.max())}
+
+    return {
+        'sample_rate': sr,
+        'blocks': len(process_ms),
+        'audio_sec': total_in / sr,
+        'block_ms': block_ms,
+        'lookahead_ms': converter.lookahead / sr * 1000,
+        'context_ms': converter.context / sr * 1000,
+        'crossfade_ms': converter.crossfade / sr * 1000,
+        'algorithmic_latency_ms': converter.latency_samples / sr * 1000,
+        'process_ms': percentiles(process_ms),
+        'end_to_end_ms': percentiles(e2e_ms),
+        # 変換がブロック長より長くかかったブロック数（実時間に追いつけない）
+        'overruns': int(np.sum(process_ms > block_ms)),
+        'max_queue_blocks': max_queue,
+        'histogram': latency_histogram(process_ms),
+    }
+
+
+def latency_histogram(values_ms: np.ndarray, bins: int = 10) -> List[dict]:
+    """処理時間のヒストグラム（各ビンの下限・上限（ミリ秒）と件数）"""
+    if len(values_ms) == 0:
+        return []
+    counts, edges = np.histogram(values_ms, bins=bins)
+    return [{'lo': float(lo), 'hi': float(hi), 'count': int(c)} for lo, hi, c in zip(edges[:-1], edges[1:], counts)]
+
+
+def format_stats(stats: dict, width: int = 40) -> List[str]:
+    """統計を表示用の行にする"""
+    p, e = stats['process_ms'], stats['end_to_end_ms']
+    lines = [
+        f"ブロック: {stats['blocks']}個 x {stats['block_ms']:.1f}ms / 音声 {stats['audio_sec']:.1f}秒",
+        f"アルゴリズム遅延: {stats['algorithmic_latency_ms']:.1f}ms "
+        f"(ブロック {stats['block_ms']:.1f}ms + 先読み {stats['lookahead_ms']:.1f}ms)",
+        f"変換時間: p50 {p['p50']:.2f}ms / p99 {p['p99']:.2f}ms / 最大 {p['max']:.2f}ms",
+        f"ブロック到着から出力まで: p50 {e['p50']:.2f}ms / p99 {e['p99']:.2f}ms / 最大 {e['max']:.2f}ms",
+        f"ブロック長を超えた変換: {stats['overruns']}回 / 待ち行列の最大: {stats['max_queue_blocks']}ブロック",
+    ]
+    histogram = stats['histogram']
+    peak = max((b['count'] for b in histogram), default=0)
+    for b in histogram:
+        bar = '#' * (round(b['count'] / peak * width) if peak else 0)
+        lines.append(f"  {b['lo']:8.2f}-{b['hi']:8.2f}ms {b['count']:6d} {bar}")
+    return lines
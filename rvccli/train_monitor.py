@@ -0,0 +1,247 @@
+import os
+import re
+import glob
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterator, List, Optional
+
+# 末尾から読み戻すブロックの大きさ（バイト）
+TAIL_BLOCK = 64 * 1024
+# 起動時に読み込むログの末尾（バイト, 直近の速度とイベントを求めるのに使う）
+INITIAL_TAIL_BYTES = 4 * 1024 * 1024
+# 時系列として保持するイベント数の上限
+MAX_EVENTS = 10000
+# 学習速度を求める区間（直近のステップイベント数）
+RATE_WINDOW = 50
+# この秒数ステップが進まなければ停止とみなす
+DEFAULT_STALL_SEC = 600.0
+
+# Mangio-RVC-Forkの学習ログの書式: "<日時>\t<名前>\t<レベル>\t<メッセージ>"
+_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})(?:,(\d{3}))?')
+_STEP = re.compile(r'^\[(\d+), ([-+\d.eE]+)\]$')
+_STEP_GENERIC = re.compile(r'\b(?:global_step|step)\s*[=:]\s*(\d+)')
+_EPOCH = re.compile(r'(?:Train Epoch|====> Epoch):\s*(\d+)')
+_LOSS = re.compile(r'\b(loss_\w+|loss)\s*=\s*([-+\d.eE]+|nan|inf)')
+_CHECKPOINT = re.compile(r'(?:Saving model and optimizer state at (?:epoch|iteration) (\d+) to (\S+)'
+                         r'|saving ckpt (\S+))')
+
+
+def tail_lines(path: str, n: int = 10, block_size: int = TAIL_BLOCK) -> List[str]:
+    """ファイル末尾のn行（末尾から逆向きにブロック単位で読み、ファイル全体は読まない）"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b''
+        while pos > 0 and data.count(b'\n') <= n:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            data = f.read(size) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    return lines[-n:] if n else []
+
+
+def _parse_time(line: str) -> Optional[float]:
+    """行頭の日時（ローカル時刻）をUNIX時刻に変換"""
+    match = _TIMESTAMP.match(line)
+    if not match:
+        return None
+    try:
+        ts = time.mktime(datetime.strptime(match.group(1), '%Y-%m-%d %H:%M:%S').timetuple())
+    except ValueError:
+        return None
+    return ts + int(match.group(2) or 0) / 1000
+
+
+def parse_line(line: str) -> Optional[dict]:
+    """ログの1行をイベント（step / loss / epoch / checkpoint）に変換。該当しなければNone"""
+    message = line.rstrip('\r\n').rsplit('\t', 1)[-1].strip()
+    event = None
+    match = _STEP.match(message)
+    if match:
+        event = {'type': 'step', 'step': int(match.group(1)), 'lr': float(match.group(2))}
+    elif 'loss' in message and _LOSS.search(message):
+        event = {'type': 'loss', 'losses': {k: float(v) for k, v in _LOSS.findall(message)}}
+        match = _STEP_GENERIC.search(message)
+        if match:
+            event['step'] = int(match.group(1))
+    elif 'aving' in message and _CHECKPOINT.search(message):
+        match = _CHECKPOINT.search(message)
+        event = {'type': 'checkpoint', 'path': match.group(2) or match.group(3)}
+    elif 'Epoch' in message and _EPOCH.search(message):
+        event = {'type': 'epoch', 'epoch': int(_EPOCH.search(message).group(1))}
+    elif 'step' in message:
+        match = _STEP_GENERIC.search(message)
+        if match:
+            event = {'type': 'step', 'step': int(match.group(1))}
+    if event is None:
+        return None
+    # 日時の解析は比較的重いため、イベントの行だけで行う
+    event['time'] = _parse_time(line)
+    return event
+
+
+class TrainingMonitor:
+    """学習ログのイベントを時系列に集め、速度・残り時間・停止を求める
+
+    ログに日時がない行は、読み込んだ時刻を代わりに使う。
+    """
+
+    def __init__(self, total_steps: int = 0, stall_sec: float = DEFAULT_STALL_SEC,
+                 max_events: int = MAX_EVENTS):
+        self.total_steps = total_steps
+        self.stall_sec = stall_sec
+        self.series = deque(maxlen=max_events)
+        self.steps = deque(maxlen=max(RATE_WINDOW, 2))
+        self.step = None
+        self.epoch = None
+        self.lr = None
+        self.losses = {}
+        self.checkpoints = deque(maxlen=20)
+
+    def feed(self, line: str, now: float = None) -> Optional[dict]:
+        event = parse_line(line)
+        if event is None:
+            return None
+        if event['time'] is None:
+            event['time'] = now if now is not None else time.time()
+
+        kind = event['type']
+        if kind == 'step' or (kind == 'loss' and 'step' in event):
+            if self.step is None or event['step'] != self.step:
+                self.steps.append((event['time'], event['step']))
+            self.step = event['step']
+            self.lr = event.get('lr', self.lr)
+        if kind == 'loss':
+            self.losses = event['losses']
+            # ステップとその直後の損失を1件の点にまとめる
+            if self.series and self.series[-1].get('step') == self.step and 'losses' not in self.series[-1]:
+                self.series[-1]['losses'] = event['losses']
+                return event
+        elif kind == 'epoch':
+            self.epoch = event['epoch']
+        elif kind == 'checkpoint':
+            self.checkpoints.append({'time': event['time'], 'step': self.step, 'path': event['path']})
+        point = {'time': event['time'], 'type': kind}
+        if self.step is not None:
+            point['step'] = self.step
+        if self.epoch is not None:
+            point['epoch'] = self.epoch
+        for key in ('lr', 'losses', 'path'):
+            if key in event:
+                point[key] = event[key]
+        self.series.append(point)
+        return event
+
+    def steps_per_sec(self) -> Optional[float]:
+        """直近RATE_WINDOW件のステップイベントから求めた学習速度"""
+        if len(self.steps) < 2:
+            return None
+        (t0, s0), (t1, s1) = self.steps[0], self.steps[-1]
+        if t1 <= t0 or s1 <= s0:
+            return None
+        return (s1 - s0) / (t1 - t0)
+
+    def summary(self, now: float = None) -> dict:
+        now = time.time() if now is None else now
+        rate = self.steps_per_sec()
+        last_step_time = self.steps[-1][0] if self.steps else None
+        remaining = max(self.total_steps - self.step, 0) if self.total_steps and self.step is not None else None
+        finished = bool(self.total_steps and self.step is not None and self.step >= self.total_steps)
+        idle = now - last_step_time if last_step_time is not None else None
+        return {
+            'step': self.step,
+            'total_steps': self.total_steps or None,
+            'epoch': self.epoch,
+            'lr': self.lr,
+            'losses': self.losses,
+            'steps_per_sec': rate,
+            'eta_sec': remaining / rate if remaining is not None and rate else None,
+            'last_step_age_sec': idle,
+            'stalled': bool(not finished and idle is not None and idle > self.stall_sec),
+            'last_checkpoint': self.checkpoints[-1] if self.checkpoints else None,
+            'events': len(self.series),
+        }
+
+
+def read_recent(path: str, monitor: TrainingMonitor, max_bytes: int = INITIAL_TAIL_BYTES) -> int:
+    """ログの末尾max_bytesを読んでmonitorに渡し、読み終えた位置（バイト）を返す"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        start = max(0, size - max_bytes)
+        f.seek(start)
+        if start:
+            # 途中から読む場合は最初の不完全な行を捨てる
+            f.readline()
+        mtime = os.path.getmtime(path)
+        end = f.tell()
+        for raw in f:
+            if not raw.endswith(b'\n'):
+                break
+            end = f.tell()
+            monitor.feed(raw.decode('utf-8', errors='replace'), now=mtime)
+    return end
+
+
+def follow(path: str, monitor: TrainingMonitor, interval: float = 5.0,
+           max_bytes: int = INITIAL_TAIL_BYTES) -> Iterator[dict]:
+    """ログの末尾から追記を読み続け、interval秒ごとに集計を返すジェネレータ
+
+    最初は末尾max_bytesだけを読み、以降は前回の位置からの追記分だけを読む。
+    ファイルが短くなった（作り直された）場合は先頭から読み直す。
+    """
+    pos = read_recent(path, monitor, max_bytes)
+    pending = b''
+    yield monitor.summary()
+    while True:
+        time.sleep(interval)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            yield monitor.summary()
+            continue
+        if size < pos:
+            pos, pending = 0, b''
+        if size > pos:
+            with open(path, 'rb') as f:
+                f.seek(pos)
+                data = pending + f.read(size - pos)
+            pos = size
+            lines = data.split(b'\n')
+            pending = lines.pop()
+            now = time.time()
+            for raw in lines:
+                monitor.feed(raw.decode('utf-8', errors='replace'), now=now)
+        yield monitor.summary()
+
+
+def latest_log(out_dir: str) -> Optional[str]:
+    """出力ディレクトリ内で最も新しい.logファイル"""
+    candidates = glob.glob(os.path.join(out_dir, '*.log'))
+    return max(candidates, key=os.path.getmtime) if candidates else None
+
+
+def format_duration(sec: Optional[float]) -> str:
+    if sec is None:
+        return "-"
+    sec = int(sec)
+    return f"{sec // 3600}:{sec % 3600 // 60:02d}:{sec % 60:02d}"
+
+
+def format_summary(summary: dict) -> str:
+    """集計を1行にする"""
+    step = summary['step']
+    total = summary['total_steps']
+    parts = [f"ステップ {step if step is not None else '-'}" + (f"/{total}" if total else "")]
+    if summary['epoch'] is not None:
+        parts.append(f"エポック {summary['epoch']}")
+    rate = summary['steps_per_sec']
+    parts.append(f"{rate:.2f} steps/s" if rate else "- steps/s")
+    parts.append(f"残り {format_duration(summary['eta_sec'])}")
+    if summary['losses']:
+        parts.append(' '.join(f"{k}={v:.3f}" for k, v in summary['losses'].items()))
+    if summary['stalled']:
+        parts.append(f"⚠ 停止の可能性（{format_duration(summary['last_step_age_sec'])}ステップが進んでいません）")
+    return ' | '.join(parts)
@@ -0,0 +1,180 @@
+import os
+import sys
+import glob
+import time
+import shutil
+import logging
+import platform
+import tempfile
+from dataclasses import replace
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 最大スループットのこの割合に届く最小のワーカー数を選ぶ（コアを使い切っても速くならない分は残す）
+DEFAULT_TOLERANCE = 0.05
+# データローダーの代わりに計算するスペクトログラム（32kHzの学習設定と同じ窓・ホップ）
+SPEC_N_FFT = 1024
+SPEC_HOP = 320
+
+
+def worker_candidates(max_workers: int, include_zero: bool = False) -> List[int]:
+    """1, 2, 4, …（2の累乗）とmax_workers（include_zeroの場合は0=メインプロセスも）"""
+    candidates = [0] if include_zero else []
+    n = 1
+    while n < max_workers:
+        candidates.append(n)
+        n *= 2
+    candidates.append(max(1, max_workers))
+    return sorted(set(candidates))
+
+
+def make_corpus(out_dir: str, n_files: int, seconds: float, sample_rate: int = 44100) -> List[str]:
+    """計測用の合成音声（音声バーストと無音の混合, 16bit WAV）"""
+    import soundfile as sf
+    from .synth import make_mixture
+    os.makedirs(out_dir, exist_ok=True)
+    files = []
+    for i in range(n_files):
+        audio, _ = make_mixture(seconds, sample_rate, seed=i)
+        path = os.path.join(out_dir, f"tune_{i:04d}.wav")
+        sf.write(path, audio, sample_rate, subtype='PCM_16')
+        files.append(path)
+    return files
+
+
+def choose(curve: List[dict], key: str, tolerance: float = DEFAULT_TOLERANCE) -> int:
+    """最大スループットの(1 - tolerance)倍以上になる最小のワーカー数"""
+    best = max(point[key] for point in curve)
+    return min(point['workers'] for point in curve if point[key] >= best * (1 - tolerance))
+
+
+def bench_prep(audio_files: List[str], audio_cfg, candidates: List[int], work_dir: str) -> List[dict]:
+    """ワーカー数ごとの前処理（デコード・VAD・LUFS正規化・分割）のスループット"""
+    from . import preprocess
+    # 毎回同じ処理量になるよう、VADのキャッシュとマニフェストは使わない
+    audio_cfg = replace(audio_cfg, vad_cache=False)
+    # 依存モジュールの読み込みなど初回だけの処理を計測に含めない
+    list(preprocess.run_prep(audio_files[:1], os.path.join(work_dir, 'prep_warmup'), audio_cfg, 1, force=True))
+    curve = []
+    for workers in candidates:
+        out_dir = os.path.join(work_dir, f"prep_{workers}")
+        start = time.perf_counter()
+        results = list(preprocess.run_prep(audio_files, out_dir, audio_cfg, workers, force=True))
+        summary = preprocess.summarize(results, time.perf_counter() - start)
+        if summary['failed']:
+            error = next(r['error'] for r in results if r['error'])
+            raise RuntimeError(f"前処理の計測に失敗しました: {error}")
+        point = {'workers': workers, 'sec': summary['wall_time'], 'files_per_sec': summary['files_per_sec'],
+                 'audio_sec_per_sec': summary['audio_sec_per_sec']}
+        logger.info(f"prep workers={workers}: {point['files_per_sec']:.2f} files/s, "
+                    f"{point['audio_sec_per_sec']:.1f} 音声秒/s")
+        curve.append(point)
+    return curve
+
+
+def load_item(path: str) -> np.ndarray:
+    """学習データローダーの1件分（WAVの読み込みと振幅スペクトログラムの計算）"""
+    import soundfile as sf
+    audio, _ = sf.read(path, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    audio = np.pad(audio, (SPEC_N_FFT // 2, SPEC_N_FFT // 2), mode='reflect')
+    n_frames = 1 + (len(audio) - SPEC_N_FFT) // SPEC_HOP
+    frames = np.lib.stride_tricks.as_strided(
+        audio, (n_frames, SPEC_N_FFT), (audio.strides[0] * SPEC_HOP, audio.strides[0]))
+    return np.abs(np.fft.rfft(frames * np.hanning(SPEC_N_FFT).astype(np.float32), axis=1)).astype(np.float32).T
+
+
+def bench_loader(chunk_files: List[str], candidates: List[int], items: int, batch_size: int = 4) -> List[dict]:
+    """num_workersごとのデータローダーのスループット
+
+    num_workers=0はメインプロセスで読み込み、1以上はその数のプロセスでバッチ単位に読み込んで受け取る
+    （PyTorchのDataLoaderと同じ分担）。プロセスの起動は計測に含めない。
+    """
+    paths = [chunk_files[i % len(chunk_files)] for i in range(items)]
+    curve = []
+    for workers in candidates:
+        executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+        try:
+            if executor:
+                list(executor.map(load_item, paths[:workers]))
+                start = time.perf_counter()
+                n = sum(1 for _ in executor.map(load_item, paths, chunksize=batch_size))
+            else:
+                start = time.perf_counter()
+                n = sum(1 for _ in map(load_item, paths))
+            elapsed = time.perf_counter() - start
+        finally:
+            if executor:
+                executor.shutdown()
+        point = {'workers': workers, 'sec': elapsed, 'items_per_sec': n / max(elapsed, 1e-9)}
+        logger.info(f"loader num_workers={workers}: {point['items_per_sec']:.1f} items/s")
+        curve.append(point)
+    return curve
+
+
+def tune(cfg, in_dir: Optional[str] = None, max_workers: int = 0, files: int = 0, seconds: float = 20.0,
+         loader_items: int = 0, tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """このマシンで前処理とデータローダーのワーカー数を計測し、最適値と計測結果を返す
+
+    in_dirを指定した場合はその音声（先頭のfiles個）で、指定しない場合は合成音声で計測する。
+    """
+    from . import preprocess
+    max_workers = max_workers or os.cpu_count() or 1
+    prep_candidates = worker_candidates(max_workers)
+    loader_candidates = worker_candidates(max_workers, include_zero=True)
+    # 最大のワーカー数でも全員に2ファイル以上行き渡る量
+    files = files or max(8, 2 * max_workers)
+    loader_items = loader_items or max(64, 8 * max_workers)
+
+    work_dir = tempfile.mkdtemp(prefix='rvccli_tune_')
+    try:
+        if in_dir:
+            audio_files = preprocess.collect_audio_files(in_dir)[:files]
+            if not audio_files:
+                raise FileNotFoundError(f"音声ファイルが見つかりません: {in_dir}")
+        else:
+            logger.info(f"計測用の音声を合成します: {files}ファイル × {seconds:.0f}秒")
+            audio_files = make_corpus(os.path.join(work_dir, 'corpus'), files, seconds)
+
+        prep_curve = bench_prep(audio_files, cfg.audio, prep_candidates, work_dir)
+        chunk_files = sorted(glob.glob(os.path.join(work_dir, f"prep_{prep_candidates[0]}", '*_chunks', '*.wav')))
+        if not chunk_files:
+            raise RuntimeError("前処理の出力がないため、データローダーを計測できません")
+        loader_curve = bench_loader(chunk_files, loader_candidates, loader_items, cfg.training.batch_size)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'machine': {'cpu_count': os.cpu_count(), 'platform': platform.platform(),
+                    'python': sys.version.split()[0]},
+        'params': {'files': len(audio_files), 'seconds': seconds if not in_dir else None,
+                   'loader_items': loader_items, 'batch_size': cfg.training.batch_size,
+                   'tolerance': tolerance},
+        'prep': prep_curve,
+        'loader': loader_curve,
+        'best': {'audio.workers': choose(prep_curve, 'files_per_sec', tolerance),
+                 'training.num_workers': choose(loader_curve, 'items_per_sec', tolerance)},
+    }
+
+
+def apply(cfg, report: dict):
+    """計測結果の最適値を設定に反映"""
+    cfg.audio.workers = report['best']['audio.workers']
+    cfg.training.num_workers = report['best']['training.num_workers']
+    return cfg
+
+
+def format_curve(curve: List[dict], key: str, unit: str, best: int) -> List[str]:
+    """計測結果の表（最大値に対する割合の棒グラフ付き）"""
+    peak = max(point[key] for point in curve) or 1.0
+    lines = []
+    for point in curve:
+        bar = '#' * int(round(30 * point[key] / peak))
+        mark = ' <- 採用' if point['workers'] == best else ''
+        lines.append(f"  {point['workers']:>4}  {point[key]:10.2f} {unit:<8} {bar}{mark}")
+    return lines
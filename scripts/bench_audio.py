@@ -0,0 +1,316 @@
+"""audio_utils・prep・rvc_wrapperのベンチマークとベースラインとの比較
+
+長さ×サンプリングレートの組み合わせごとに合成音声（音声バースト+無音, 同じseedなら同じ内容）を作り、
+audio_utilsの各関数とprepコマンド全体の実時間比（RTF = 処理時間 / 音声の長さ）・files/s・ピークRSSを計測する。
+ピークRSSを関数ごとに測るため、各ケースは別プロセスで実行する。rvc_wrapperの関数は
+scripts/stubs のスクリプト（処理時間0）をフォークの代わりに呼び出し、1回あたりの時間（=サブプロセスの起動コスト）を測る。
+--baselineを指定すると、保存済みの結果より--toleranceを超えて遅い・メモリが多いケースがあれば終了コード1を返す。
+
+    python scripts/bench_audio.py --json bench_audio.json
+    python scripts/bench_audio.py --baseline bench_audio.json --tolerance 0.2
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, ROOT)
+STUBS_DIR = os.path.join(ROOT, 'scripts', 'stubs')
+
+# webrtcvadが受け付けるサンプリングレート
+WEBRTC_RATES = (8000, 16000, 32000, 48000)
+
+
+def _read(entry):
+    import soundfile as sf
+    audio, _ = sf.read(entry['path'], dtype='float32')
+    return audio
+
+
+def _out(tmp, entry, suffix='.wav'):
+    return os.path.join(tmp, os.path.basename(entry['path']).replace('.wav', suffix))
+
+
+def _case_loudness_meter(audio, sr):
+    from rvccli import audio_utils
+    meter = audio_utils.LoudnessMeter(sr)
+    block = sr * 10
+    for i in range(0, len(audio), block):
+        meter.update(audio[i:i + block])
+    return meter.integrated_loudness()
+
+
+def _cases():
+    """ケース名 -> (準備, 計測する処理, 対象のサンプリングレート)
+
+    準備は計測に含めない（ファイルを読む関数は準備なしでファイルパスを渡す）。
+    """
+    from rvccli import audio_utils as au
+
+    path = lambda entry, tmp: entry  # noqa: E731
+    array = lambda entry, tmp: (_read(entry), entry['sample_rate'])  # noqa: E731
+    return {
+        'decode_to_array': (path, lambda e, tmp: au.decode_to_array(e['path']), None),
+        'iter_decode_blocks': (path, lambda e, tmp: sum(len(b) for b in au.iter_decode_blocks(e['path'])), None),
+        'convert_to_32k_mono': (path, lambda e, tmp: au.convert_to_32k_mono(e['path'], _out(tmp, e)), None),
+        'compute_speech_mask[webrtc]': (array, lambda a, tmp: au.compute_speech_mask(*a, backend='webrtc'),
+                                        WEBRTC_RATES),
+        'compute_speech_mask[numpy]': (array, lambda a, tmp: au.compute_speech_mask(*a, backend='numpy'), None),
+        'trim_silence_vad': (path, lambda e, tmp: au.trim_silence_vad(e['path'], _out(tmp, e)), WEBRTC_RATES),
+        'detect_speech_segments': (path, lambda e, tmp: au.detect_speech_segments(e['path'], use_cache=False),
+                                   WEBRTC_RATES),
+        'normalize_lufs_array': (array, lambda a, tmp: au.normalize_lufs_array(*a), None),
+        'normalize_lufs': (path, lambda e, tmp: au.normalize_lufs(e['path'], _out(tmp, e)), None),
+        'LoudnessMeter': (array, lambda a, tmp: _case_loudness_meter(*a), None),
+        'split_audio': (path, lambda e, tmp: au.split_audio(e['path'], _out(tmp, e, '_chunks')), None),
+        'split_audio[snap]': (path, lambda e, tmp: au.split_audio(e['path'], _out(tmp, e, '_snap'),
+                                                                  snap_to_silence=True), WEBRTC_RATES),
+        'apply_fade': (path, lambda e, tmp: au.apply_fade(e['path'], _out(tmp, e)), None),
+        'get_audio_info': (path, lambda e, tmp: au.get_audio_info(e['path']), None),
+    }
+
+
+def run_case(name: str, corpus: list, repeat: int) -> dict:
+    """1つのケースを実行して計測（子プロセス内で呼ばれる）"""
+    import contextlib
+    import io
+    setup, fn, rates = _cases()[name]
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    tmp = tempfile.mkdtemp(prefix='bench_audio_case_')
+    files = []
+    try:
+        for entry in corpus:
+            if rates and entry['sample_rate'] not in rates:
+                continue
+            arg = setup(entry, tmp)
+            times = []
+            for _ in range(repeat):
+                with contextlib.redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    fn(arg, tmp)
+                    times.append(time.perf_counter() - start)
+            files.append({'path': os.path.basename(entry['path']), 'sec': min(times),
+                          'rtf': min(times) / entry['duration']})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    sec = sum(f['sec'] for f in files)
+    audio_sec = sum(e['duration'] for e in corpus if not rates or e['sample_rate'] in rates)
+    return {
+        'case': name,
+        'files': len(files),
+        'audio_sec': audio_sec,
+        'sec': sec,
+        'rtf': sec / audio_sec if audio_sec else 0.0,
+        'files_per_sec': len(files) / sec if sec else 0.0,
+        'base_rss_mb': base_rss,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'per_file': files,
+    }
+
+
+def run_prep(corpus_dir: str, corpus: list, workers: int, stream: bool) -> dict:
+    """prepコマンド全体の計測（子プロセス内で呼ばれ、prepのプロセスのピークRSSを返す）"""
+    out_dir = tempfile.mkdtemp(prefix='bench_audio_prep_')
+    cmd = [sys.executable, '-m', 'rvccli', 'prep', '--in-dir', corpus_dir, '--out-dir', out_dir,
+           '--force', '--no-vad-cache', '--workers', str(workers)] + (['--stream'] if stream else [])
+    try:
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+        sec = time.perf_counter() - start
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+    audio_sec = sum(e['duration'] for e in corpus)
+    return {
+        'case': 'prep[stream]' if stream else 'prep',
+        'files': len(corpus),
+        'audio_sec': audio_sec,
+        'sec': sec,
+        'rtf': sec / audio_sec,
+        'files_per_sec': len(corpus) / sec,
+        'workers': workers,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def run_wrapper(corpus: list, repeat: int) -> list:
+    """rvc_wrapperの関数1回あたりの時間（スタブの処理時間は0, 子プロセス内で呼ばれる）"""
+    import logging
+    import soundfile as sf
+    from rvccli import rvc_wrapper
+
+    logging.disable(logging.CRITICAL)
+    for key in ('STUB_LOAD_SEC', 'STUB_RTF', 'STUB_F0_RTF', 'STUB_TRAIN_SEC'):
+        os.environ[key] = '0'
+    os.environ[rvc_wrapper.FORK_DIR_ENV] = STUBS_DIR
+    tmp = tempfile.mkdtemp(prefix='bench_audio_wrapper_')
+    try:
+        # 最も短い入力の先頭1秒を推論・学習の入力にする
+        entry = min(corpus, key=lambda e: (e['duration'], e['sample_rate']))
+        audio, sr = sf.read(entry['path'], dtype='float32')
+        dataset = os.path.join(tmp, 'dataset')
+        os.makedirs(dataset)
+        wav = os.path.join(dataset, 'chunk_0000.wav')
+        sf.write(wav, audio[:sr], sr, subtype='PCM_16')
+        model = os.path.join(tmp, 'model.pth')
+        index = os.path.join(tmp, 'model.index')
+        for p in (model, index):
+            with open(p, 'wb') as f:
+                f.write(b'\0' * 1024)
+
+        calls = {
+            'python': lambda: subprocess.run([sys.executable, '-c', 'pass'], check=True),
+            'infer': lambda: rvc_wrapper.infer(wav, model, index, 0, 'rmvpe', 0.25, 3, 0,
+                                               os.path.join(tmp, 'out.wav'), use_server=False),
+            'extract_features': lambda: rvc_wrapper.extract_features(dataset, 'rmvpe', use_f0_cache=False),
+            'train': lambda: rvc_wrapper.train(dataset, sr, 'rmvpe', 4, 1, False, os.path.join(tmp, 'outputs'),
+                                               0.75, 1, use_f0_cache=False),
+        }
+        results = []
+        for name, call in calls.items():
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with open(os.devnull, 'w') as devnull:
+                    stdout = os.dup(1)
+                    os.dup2(devnull.fileno(), 1)
+                    try:
+                        ok = call()
+                    finally:
+                        os.dup2(stdout, 1)
+                        os.close(stdout)
+                times.append(time.perf_counter() - start)
+                if ok is False:
+                    raise RuntimeError(f"rvc_wrapper.{name}が失敗しました")
+            results.append({'case': f"rvc_wrapper.{name}" if name != 'python' else 'python -c pass',
+                            'wall_ms': statistics.median(times) * 1000, 'min_ms': min(times) * 1000})
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def compare(results: dict, baseline: dict, tolerance: float, rss_tolerance: float, min_delta_ms: float) -> list:
+    """ベースラインより悪化したケース（RTF・1回の時間はtolerance、ピークRSSはrss_toleranceを超えたもの）"""
+    regressions = []
+    base_cases = {r['case']: r for section in ('cases', 'prep', 'wrapper') for r in baseline.get(section, [])}
+    for section in ('cases', 'prep', 'wrapper'):
+        for r in results[section]:
+            base = base_cases.get(r['case'])
+            if not base:
+                continue
+            checks = [('min_ms', tolerance, 1.0)] if section == 'wrapper' else \
+                [('rtf', tolerance, r['audio_sec'] * 1000), ('peak_rss_mb', rss_tolerance, None)]
+            for key, tol, to_ms in checks:
+                old, new = base[key], r[key]
+                if old <= 0 or new <= old * (1 + tol):
+                    continue
+                # 数ミリ秒の差は計測誤差として扱う
+                if to_ms is not None and (new - old) * to_ms < min_delta_ms:
+                    continue
+                regressions.append({'case': r['case'], 'metric': key, 'baseline': old, 'current': new,
+                                    'ratio': new / old})
+    return regressions
+
+
+def child(args) -> dict:
+    with open(args.corpus_json, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+    if args.child == 'prep' or args.child == 'prep[stream]':
+        return run_prep(os.path.dirname(corpus[0]['path']), corpus, args.prep_workers, args.child != 'prep')
+    if args.child == 'wrapper':
+        return run_wrapper(corpus, args.repeat)
+    return run_case(args.child, corpus, args.repeat)
+
+
+def spawn(name: str, args, corpus_json: str, env: dict):
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', name, '--corpus-json', corpus_json,
+           '--repeat', str(args.repeat), '--prep-workers', str(args.prep_workers)]
+    out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True, env=env).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lengths', type=float, nargs='+', default=[5.0, 30.0, 120.0], help='音声の長さ（秒）')
+    parser.add_argument('--sample-rates', type=int, nargs='+', default=[16000, 32000, 44100, 48000])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5, help='各ファイルの計測回数（最小値を使う）')
+    parser.add_argument('--cases', nargs='+', help='計測するaudio_utilsのケース（既定: すべて）')
+    parser.add_argument('--prep-workers', type=int, default=1, help='prepの並列ワーカー数')
+    parser.add_argument('--skip', nargs='+', default=[], choices=['cases', 'prep', 'wrapper'],
+                        help='計測しない区分')
+    parser.add_argument('--json', help='結果をJSONで保存するパス（次回の--baselineに使える）')
+    parser.add_argument('--baseline', help='比較するベースライン（以前の--jsonの出力）')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='RTF・1回の時間の悪化の許容割合')
+    parser.add_argument('--rss-tolerance', type=float, default=0.15, help='ピークRSSの増加の許容割合')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0, help='これより小さい時間差は悪化とみなさない')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--corpus-json', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(child(args), ensure_ascii=False))
+        return
+
+    from rvccli import synth
+
+    root = tempfile.mkdtemp(prefix='bench_audio_')
+    env = dict(os.environ, RVCCLI_CACHE_DIR=os.path.join(root, 'cache'))
+    params = {'lengths': args.lengths, 'sample_rates': args.sample_rates, 'seed': args.seed,
+              'repeat': args.repeat, 'prep_workers': args.prep_workers}
+    results = {'params': params, 'cases': [], 'prep': [], 'wrapper': []}
+    try:
+        print(f"合成音声を作成中: {len(args.lengths)}種類の長さ × {len(args.sample_rates)}種類のサンプリングレート")
+        corpus = synth.write_corpus(os.path.join(root, 'corpus'), args.lengths, args.sample_rates, args.seed)
+        corpus_json = os.path.join(root, 'corpus.json')
+        with open(corpus_json, 'w', encoding='utf-8') as f:
+            json.dump(corpus, f)
+
+        if 'cases' not in args.skip:
+            print(f"\n{'case':<28} {'files':>5} {'RTF':>9} {'files/s':>9} {'RSS(MB)':>8}")
+            for name in args.cases or list(_cases()):
+                r = spawn(name, args, corpus_json, env)
+                results['cases'].append(r)
+                print(f"{name:<28} {r['files']:>5} {r['rtf']:>9.5f} {r['files_per_sec']:>9.1f} "
+                      f"{r['peak_rss_mb']:>8.1f}")
+        if 'prep' not in args.skip:
+            for name in ('prep', 'prep[stream]'):
+                r = spawn(name, args, corpus_json, env)
+                results['prep'].append(r)
+                print(f"{name:<28} {r['files']:>5} {r['rtf']:>9.5f} {r['files_per_sec']:>9.1f} "
+                      f"{r['peak_rss_mb']:>8.1f}")
+        if 'wrapper' not in args.skip:
+            results['wrapper'] = spawn('wrapper', args, corpus_json, env)
+            print(f"\n{'rvc_wrapper':<28} {'中央値(ms)':>10} {'最小(ms)':>9}")
+            for r in results['wrapper']:
+                print(f"{r['case']:<28} {r['wall_ms']:>10.1f} {r['min_ms']:>9.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('params') != params:
+            print(f"\n警告: ベースラインと計測条件が異なります: {baseline.get('params')}")
+        regressions = compare(results, baseline, args.tolerance, args.rss_tolerance, args.min_delta_ms)
+        print(f"\nベースライン {args.baseline} との比較（許容: 時間 +{args.tolerance:.0%}, RSS +{args.rss_tolerance:.0%}）")
+        for r in regressions:
+            print(f"  NG {r['case']:<28} {r['metric']:<12} {r['baseline']:.5g} -> {r['current']:.5g} "
+                  f"({r['ratio']:.2f}倍)")
+        if regressions:
+            sys.exit(1)
+        print("  悪化したケースはありません")
+
+
+if __name__ == '__main__':
+    main()
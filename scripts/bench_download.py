@@ -0,0 +1,147 @@
+"""モデルのダウンロード（rvccli download-models）の速度と再開・検証の確認
+
+ローカルのHTTPサーバー（scripts/stubs/model_server.py）に乱数のモデルを置き、帯域を制限して
+従来の方法（1ファイルずつ8KB単位）と並列取得を比べる。あわせて、途中で切れた接続の再開、
+途中で切れたファイルの検出、共有キャッシュからの配置、記録したSHA-256との不一致の検出を確認する。
+
+    python scripts/bench_download.py --size-mb 20 --rate-mbps 10
+"""
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'stubs'))
+
+
+def sha256(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def legacy_download(url: str, path: str):
+    """従来の方法（8KB単位で1ファイルずつ）"""
+    import requests
+    r = requests.get(url, stream=True)
+    r.raise_for_status()
+    with open(path, "wb") as f:
+        for chunk in r.iter_content(chunk_size=8192):
+            f.write(chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size-mb', type=float, default=20)
+    parser.add_argument('--rate-mbps', type=float, default=10, help='1接続あたりの帯域（MB/s）')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    from model_server import serve
+    from rvccli import download_models as dm
+
+    root = tempfile.mkdtemp(prefix='bench_download_')
+    quiet = contextlib.redirect_stdout(io.StringIO())
+    results = {}
+    try:
+        src = os.path.join(root, 'src')
+        os.makedirs(src)
+        sizes = {name: args.size_mb * scale for name, scale in zip(dm.MODELS, (1.0, 0.5, 0.25))}
+        for name, mb in sizes.items():
+            with open(os.path.join(src, name), 'wb') as f:
+                f.write(os.urandom(int(mb * (1 << 20))))
+        expected = {name: sha256(os.path.join(src, name)) for name in dm.MODELS}
+
+        server, handler = serve(src, rate_mbps=args.rate_mbps)
+        mirror = f"http://127.0.0.1:{server.server_address[1]}"
+
+        def check(models_dir):
+            return all(sha256(os.path.join(models_dir, n)) == expected[n] for n in dm.MODELS)
+
+        # 1. 従来の方法と並列取得
+        legacy_dir = os.path.join(root, 'legacy')
+        os.makedirs(legacy_dir)
+        start = time.perf_counter()
+        for name in dm.MODELS:
+            legacy_download(f"{mirror}/{name}", os.path.join(legacy_dir, name))
+        results['legacy_sec'] = time.perf_counter() - start
+
+        models_dir = os.path.join(root, 'models')
+        start = time.perf_counter()
+        with quiet:
+            dm.ensure_models(models_dir, mirror)
+        results['parallel_sec'] = time.perf_counter() - start
+        results['parallel_ok'] = check(models_dir)
+        print(f"従来（逐次, 8KB）: {results['legacy_sec']:.2f}秒 / 並列: {results['parallel_sec']:.2f}秒 "
+              f"一致 {results['parallel_ok']}")
+
+        # 2. 途中で切れたファイルの検出（記録したサイズと異なる）
+        path = os.path.join(models_dir, 'contentvec.pth')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) // 3)
+        with quiet:
+            status = dm.ensure_model('contentvec.pth', models_dir, mirror)
+        results['truncated_redownloaded'] = status == 'downloaded' and check(models_dir)
+        print(f"途中で切れたファイルを取得し直す: {results['truncated_redownloaded']}")
+
+        # 3. 接続が切れた場合の再開（各ファイルの最初の応答を1/4で切るサーバー）
+        drop_server, drop_handler = serve(src, drop_after=int(args.size_mb * (1 << 20) / 4))
+        resume_dir = os.path.join(root, 'resume')
+        with quiet:
+            dm.ensure_models(resume_dir, f"http://127.0.0.1:{drop_server.server_address[1]}")
+        total = sum(os.path.getsize(os.path.join(src, n)) for n in dm.MODELS)
+        results['resume_ok'] = check(resume_dir)
+        results['resume_overhead'] = drop_handler.stats['bytes'] / total
+        print(f"切断後の再開: 一致 {results['resume_ok']}, Range要求 {drop_handler.stats['range_requests']}件, "
+              f"送信量 {results['resume_overhead']:.2f}倍")
+        drop_server.shutdown()
+
+        # 4. 共有キャッシュ（2台目のノードはサーバーから取得しない）
+        cache_dir = os.path.join(root, 'shared')
+        with quiet:
+            dm.ensure_models(os.path.join(root, 'node1'), mirror, cache_dir)
+        sent = handler.stats['bytes']
+        with quiet:
+            statuses = dm.ensure_models(os.path.join(root, 'node2'), mirror, cache_dir)
+        results['cache_bytes_from_server'] = handler.stats['bytes'] - sent
+        results['cache_ok'] = check(os.path.join(root, 'node2')) and set(statuses.values()) == {'cached'}
+        print(f"共有キャッシュ: 2台目の受信 {results['cache_bytes_from_server']}バイト, 一致 {results['cache_ok']}")
+
+        # 5. 記録したSHA-256と異なるファイルの拒否
+        with open(os.path.join(src, 'rmvpe.pt'), 'r+b') as f:
+            f.write(b'tampered')
+        os.remove(os.path.join(models_dir, 'rmvpe.pt'))
+        with quiet:
+            status = dm._ensure_or_report('rmvpe.pt', models_dir, mirror)
+        results['tamper_rejected'] = status == 'failed' and not os.path.exists(os.path.join(models_dir, 'rmvpe.pt'))
+        print(f"SHA-256の不一致を拒否: {results['tamper_rejected']}")
+        server.shutdown()
+
+        # 6. 記録のない初回の取得でも、取得元が公開するSHA-256（X-Linked-Etag）と照合する
+        published = {n: (expected[n], int(sizes[n] * (1 << 20))) for n in dm.MODELS}
+        etag_server, _ = serve(src, published=published)
+        fresh_dir = os.path.join(root, 'fresh')
+        with quiet:
+            statuses = dm.ensure_models(fresh_dir, f"http://127.0.0.1:{etag_server.server_address[1]}")
+        results['published_hash_checked'] = (
+            statuses['rmvpe.pt'] == 'failed' and not os.path.exists(os.path.join(fresh_dir, 'rmvpe.pt'))
+            and all(statuses[n] == 'downloaded' for n in dm.MODELS if n != 'rmvpe.pt'))
+        print(f"初回の取得を公開されたSHA-256と照合: {results['published_hash_checked']}")
+        etag_server.shutdown()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""長尺入力の窓分割・並列変換（infer --long）のベンチマーク
+
+合成した長い音声をテスト用の推論バックエンド（scripts/stubs）で変換し、
+同時実行数ごとの処理時間・速度向上率・ピークメモリと、窓のつなぎ目以外が入力と一致するかを表示する。
+各設定は別プロセスで実行し、ピークメモリ（/proc/self/statusのVmHWM）を測る。
+
+    python scripts/bench_longform.py --minutes 10 --workers 1 2 4 8
+"""
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+sys.path.insert(0, ROOT)
+
+
+def run_one(input_path: str, out_path: str, model_path: str, workers: int, window_sec: float) -> dict:
+    """子プロセスで1設定を実行し、統計とピークメモリを返す"""
+    code = (
+        "import json, resource, sys\n"
+        "from rvccli import batch, longform\n"
+        "inp, out, model, workers, window = sys.argv[1:6]\n"
+        "params = dict(transpose=0, f0_method='rmvpe', rms_mix_rate=0.25, filter_radius=3, resample_sr=0)\n"
+        "conv = batch.make_converter(model, None, params, use_server=False)\n"
+        "stats = longform.convert_long(inp, out, conv, workers=int(workers), window_sec=float(window))\n"
+        # ru_maxrssはexec前の親プロセスの値を引き継ぐため、プロセス自身の最大値を読む
+        "hwm = [l for l in open('/proc/self/status') if l.startswith('VmHWM')]\n"
+        "stats['peak_rss_mb'] = (int(hwm[0].split()[1]) if hwm else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss) / 1024\n"
+        "print(json.dumps(stats))\n"
+    )
+    proc = subprocess.run([sys.executable, '-c', code, input_path, out_path, model_path, str(workers),
+                           str(window_sec)], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--window-sec', type=float, default=30.0)
+    parser.add_argument('--rtf', type=float, default=0.05, help='バックエンドの変換の実時間比')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    import numpy as np
+    import soundfile as sf
+    from rvccli import synth
+
+    os.environ.update({'RVCCLI_FORK_DIR': STUBS_DIR, 'STUB_LOAD_SEC': '0', 'STUB_RTF': str(args.rtf)})
+    work_dir = tempfile.mkdtemp(prefix="bench_longform_")
+    try:
+        input_path = os.path.join(work_dir, "long.wav")
+        audio, _ = synth.make_mixture(args.minutes * 60, 32000, seed=0)
+        sf.write(input_path, audio, 32000, subtype='PCM_16')
+        reference, _ = sf.read(input_path, dtype='float32')
+        del audio
+        model_path = os.path.join(work_dir, "voice.pth")
+        with open(model_path, 'wb') as f:
+            f.write(os.urandom(1 << 20))
+
+        results = []
+        for workers in args.workers:
+            out_path = os.path.join(work_dir, f"out_{workers}.wav")
+            stats = run_one(input_path, out_path, model_path, workers, args.window_sec)
+            converted, _ = sf.read(out_path, dtype='float32')
+            # スタブは入力をそのまま返すため、クロスフェード区間以外は入力と一致する
+            diff = np.abs(converted[:len(reference)] - reference[:len(converted)])
+            stats.update(workers=workers, length_match=len(converted) == len(reference),
+                         changed_ratio=float(np.mean(diff > 1e-3)))
+            results.append(stats)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    base = results[0]['wall_time']
+    print(f"[長尺変換ベンチマーク] {args.minutes:.1f}分, 窓 {args.window_sec:.0f}秒, 実時間比 {args.rtf}")
+    for r in results:
+        print(f"同時実行 {r['workers']}: 合計 {r['wall_time']:.2f}秒 (変換 {r['convert_sec']:.2f}秒) "
+              f"速度 x{base / r['wall_time']:.2f} / 窓 {r['windows']} / ピーク {r['peak_rss_mb']:.0f}MB / "
+              f"長さ一致 {r['length_match']} / つなぎ目の変化 {r['changed_ratio']:.3%}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""モデルキャッシュ（LRU + メモリ予算）のヒット率ベンチマーク
+
+複数の音声モデルへのZipf分布のアクセス列を生成し、メモリ予算ごとのヒット率・読み込み回数・
+読み込み時間の合計を表示する。読み込みは所定の時間待つだけの模擬で、モデルの実体は作らない。
+
+    python scripts/bench_model_cache.py --voices 20 --requests 2000 --budget-mb 500 1000 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from rvccli.model_cache import ModelCache  # noqa: E402
+
+
+def make_models(work_dir: str, voices: int) -> list:
+    """キャッシュのキーになる小さなダミーファイル（モデルとインデックス）を作成"""
+    paths = []
+    for i in range(voices):
+        model_path = os.path.join(work_dir, f"voice_{i:02d}.pth")
+        index_path = os.path.join(work_dir, f"voice_{i:02d}.index")
+        for path in (model_path, index_path):
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1024))
+        paths.append((model_path, index_path))
+    return paths
+
+
+def run(models: list, requests: np.ndarray, budget_mb: float, model_mb: float, load_sec: float) -> dict:
+    def loader(model_path, index_path):
+        time.sleep(load_sec)
+        return model_path
+
+    cache = ModelCache(loader, int(budget_mb * (1 << 20)), size_of=lambda _: int(model_mb * (1 << 20)))
+    start = time.perf_counter()
+    for i in requests:
+        cache.get(*models[i])
+    stats = cache.stats()
+    stats['wall_sec'] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--voices', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--zipf', type=float, default=1.2, help='アクセス分布の偏り（大きいほど上位に集中）')
+    parser.add_argument('--model-mb', type=float, default=300.0, help='1モデル（+インデックス）の見積もりサイズ')
+    parser.add_argument('--load-sec', type=float, default=0.01, help='模擬する読み込み時間')
+    parser.add_argument('--budget-mb', type=float, nargs='+', default=[300.0, 1000.0, 2000.0, 4096.0])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    weights = 1.0 / np.arange(1, args.voices + 1) ** args.zipf
+    requests = rng.choice(args.voices, size=args.requests, p=weights / weights.sum())
+    # 上位3モデルだけを切り替えるアクセス列
+    top3 = np.tile([0, 1, 2], args.requests // 3)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_model_cache_") as work_dir:
+        models = make_models(work_dir, args.voices)
+        for budget in args.budget_mb:
+            for name, seq in (('zipf', requests), ('top3', top3)):
+                stats = run(models, seq, budget, args.model_mb, args.load_sec)
+                results.append({'pattern': name, 'budget_mb': budget, **stats})
+
+    print(f"[モデルキャッシュ] {args.voices}モデル x {args.model_mb:.0f}MB, {args.requests}リクエスト")
+    print(f"{'pattern':<7} {'budget(MB)':>10} {'hit rate':>9} {'loads':>6} {'evict':>6} {'load(s)':>8}")
+    for r in results:
+        print(f"{r['pattern']:<7} {r['budget_mb']:>10.0f} {r['hit_rate']:>9.1%} {r['loads']:>6} "
+              f"{r['evictions']:>6} {r['load_sec']:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""モデルのパッケージング（rvccli pack）の処理時間とサイズのベンチマーク
+
+学習結果（乱数のチェックポイント・テキストのログと設定）と事前学習モデルの代わりのファイルを作り、
+すべてをZIP_DEFLATEDで圧縮する従来の方法と、無圧縮格納＋並列圧縮・参照・増分の各方法を比べる。
+作成したパッケージはマニフェストと照合する。
+
+    python scripts/bench_pack.py --checkpoint-mb 200 --base-mb 300 --log-mb 50 --workers 4
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def write_random(path: str, mb: float):
+    with open(path, 'wb') as f:
+        for _ in range(int(mb)):
+            f.write(os.urandom(1 << 20))
+
+
+def write_log(path: str, mb: float):
+    line = "2024-01-01 00:00:00,000\tvoice\tINFO\tloss_disc=3.512, loss_gen=2.104, loss_mel=17.250\n"
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(line * int(mb * (1 << 20) / len(line)))
+
+
+def make_tree(root: str, args):
+    outputs = os.path.join(root, 'outputs')
+    run_dir = os.path.join(outputs, 'voice')
+    models = os.path.join(root, 'models')
+    os.makedirs(run_dir)
+    os.makedirs(models)
+    write_random(os.path.join(run_dir, 'G_20000.pth'), args.checkpoint_mb)
+    write_random(os.path.join(run_dir, 'D_20000.pth'), args.checkpoint_mb)
+    write_log(os.path.join(run_dir, 'train.log'), args.log_mb)
+    with open(os.path.join(run_dir, 'config.json'), 'w') as f:
+        json.dump({'train': {'batch_size': 4, 'epochs': 100}, 'data': {'sampling_rate': 32000}}, f)
+    for name, mb in (('contentvec.pth', args.base_mb), ('rmvpe.pt', args.base_mb / 2)):
+        write_random(os.path.join(models, name), mb)
+    return outputs, models
+
+
+def legacy_pack(outputs: str, models: str, package_dir: str) -> str:
+    """従来の方法（すべてをZIP_DEFLATEDで1ファイルずつ圧縮）"""
+    from rvccli.packaging import REQUIRED_MODELS, latest_output
+    latest = os.path.join(outputs, latest_output(outputs))
+    path = os.path.join(package_dir, 'legacy.zip')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(latest):
+            for file in files:
+                zf.write(os.path.join(root, file), os.path.relpath(os.path.join(root, file), outputs))
+        for model in REQUIRED_MODELS:
+            if os.path.exists(os.path.join(models, model)):
+                zf.write(os.path.join(models, model), f"models/{model}")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checkpoint-mb', type=float, default=100)
+    parser.add_argument('--base-mb', type=float, default=200)
+    parser.add_argument('--log-mb', type=float, default=30)
+    parser.add_argument('--workers', type=int, default=0)
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    from rvccli import packaging
+
+    root = tempfile.mkdtemp(prefix='bench_pack_')
+    try:
+        outputs, models = make_tree(root, args)
+        package_dir = os.path.join(root, 'packages')
+        os.makedirs(package_dir)
+        results = []
+
+        def measure(name, fn):
+            start = time.perf_counter()
+            path = fn()
+            elapsed = time.perf_counter() - start
+            verify = packaging.verify_package(path, models) if name != 'legacy' else None
+            result = {'mode': name, 'sec': elapsed, 'size_mb': os.path.getsize(path) / (1 << 20),
+                      'verified': verify is None or not verify['errors']}
+            results.append(result)
+            print(f"{name:<12} {elapsed:7.2f}秒  {result['size_mb']:8.1f}MB  検証 {result['verified']}")
+            # 次のパッケージと作成日時が重ならないようにする
+            time.sleep(1.1)
+
+        measure('legacy', lambda: legacy_pack(outputs, models, package_dir))
+        os.remove(os.path.join(package_dir, 'legacy.zip'))
+        measure('copy', lambda: packaging.package_model(outputs, models, package_dir, args.workers)[0])
+        measure('incremental', lambda: packaging.package_model(outputs, models, package_dir, args.workers,
+                                                               incremental=True)[0])
+        measure('ref', lambda: packaging.package_model(outputs, models, package_dir, args.workers,
+                                                       base_models='ref')[0])
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""推論サーバー（rvccli serve）と1回1プロセスの推論の比較
+
+テスト用の推論バックエンド（scripts/stubs）を使い、短いクリップを繰り返し変換して
+1回目のモデル読み込みコストとリクエストごとのレイテンシを分けて表示する。
+
+    python scripts/bench_serve.py --clips 10 --load-sec 3
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+STUBS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stubs')
+sys.path.insert(0, ROOT)
+
+
+def make_clips(work_dir: str, clips: int, clip_sec: float) -> list:
+    import soundfile as sf
+    from rvccli import synth
+
+    paths = []
+    for i in range(clips):
+        audio, _ = synth.make_mixture(clip_sec, 32000, seed=i)
+        path = os.path.join(work_dir, f"clip_{i:03d}.wav")
+        sf.write(path, audio, 32000, subtype='PCM_16')
+        paths.append(path)
+    return paths
+
+
+def latency_stats(values: list) -> dict:
+    return {
+        'count': len(values),
+        'mean': statistics.mean(values),
+        'p50': statistics.median(values),
+        'max': max(values),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clips', type=int, default=10)
+    parser.add_argument('--clip-sec', type=float, default=3.0)
+    parser.add_argument('--load-sec', type=float, default=3.0, help='バックエンドのモデル読み込み時間（秒）')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    os.environ['STUB_LOAD_SEC'] = str(args.load_sec)
+    os.environ['RVCCLI_FORK_DIR'] = STUBS_DIR
+    from rvccli import rvc_wrapper, server
+
+    work_dir = tempfile.mkdtemp(prefix="bench_serve_")
+    socket_path = os.path.join(work_dir, "rvccli.sock")
+    try:
+        clips = make_clips(work_dir, args.clips, args.clip_sec)
+        model_path = os.path.join(work_dir, "voice.pth")
+        index_path = os.path.join(work_dir, "voice.index")
+        for path in (model_path, index_path):
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1 << 20))
+        params = dict(transpose=0, f0_method='rmvpe', rms_mix_rate=0.25, filter_radius=3, resample_sr=0)
+
+        # 1. 従来の経路: 毎回infer.pyを起動してモデルを読み込む
+        subprocess_sec = []
+        for clip in clips:
+            start = time.perf_counter()
+            ok = rvc_wrapper.infer(clip, model_path, index_path, out_path=clip + ".sub.wav",
+                                   socket_path=socket_path, use_server=False, **params)
+            if not ok:
+                raise RuntimeError("推論に失敗しました")
+            subprocess_sec.append(time.perf_counter() - start)
+
+        # 2. 推論サーバー: 1回だけモデルを読み込む
+        start = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, '-m', 'rvccli', 'serve',
+                                 '--backend', os.path.join(STUBS_DIR, server.BACKEND_NAME),
+                                 '--socket', socket_path], cwd=ROOT,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            while not server.is_running(socket_path):
+                if proc.poll() is not None:
+                    raise RuntimeError("推論サーバーの起動に失敗しました")
+                time.sleep(0.05)
+            startup_sec = time.perf_counter() - start
+
+            client = server.InferenceClient(socket_path)
+            load_sec = 0.0
+            request_sec = []
+            for clip in clips:
+                response = client.convert(clip, clip + ".srv.wav", model_path, index_path, **params)
+                load_sec += response['load_sec']
+                # 初回の読み込み時間を除いたリクエストごとのレイテンシ
+                request_sec.append(response['round_trip_sec'] - response['load_sec'])
+            client.shutdown()
+            proc.wait(timeout=10)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'clips': args.clips,
+        'clip_sec': args.clip_sec,
+        'subprocess': latency_stats(subprocess_sec),
+        'server': {
+            'startup_sec': startup_sec,
+            'load_sec': load_sec,
+            'request': latency_stats(request_sec),
+            'total_sec': startup_sec + load_sec + sum(request_sec),
+        },
+    }
+
+    print(f"[推論ベンチマーク] {args.clips}クリップ x {args.clip_sec:.1f}秒, 読み込み {args.load_sec:.1f}秒")
+    sub = results['subprocess']
+    print(f"1回1プロセス: 平均 {sub['mean']:.2f}秒 / p50 {sub['p50']:.2f}秒 / 合計 {sum(subprocess_sec):.2f}秒")
+    srv = results['server']
+    print(f"推論サーバー: 起動 {srv['startup_sec']:.2f}秒 + モデル読み込み {srv['load_sec']:.2f}秒（1回のみ）")
+    print(f"              リクエスト 平均 {srv['request']['mean'] * 1000:.1f}ms / "
+          f"p50 {srv['request']['p50'] * 1000:.1f}ms / 合計 {srv['total_sec']:.2f}秒")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
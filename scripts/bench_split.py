@@ -0,0 +1,134 @@
+"""split_audioのベンチマーク（従来のpydub実装とsoundfile実装の比較）
+
+合成した長時間WAV（既定は1時間, 32kHz/mono）を各実装で分割し、
+チャンク/秒とピークメモリ（RSS, tracemalloc）を表示する。
+ピークRSSを実装ごとに測るため、各実装は別プロセスで実行する。
+
+    python scripts/bench_split.py --duration 3600
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+VARIANTS = ['pydub', 'soundfile', 'soundfile-threads', 'soundfile-snap']
+
+
+def split_audio_pydub(input_path: str, out_dir: str, chunk_sec: float = 12.0):
+    """比較用: pydubによる従来のsplit_audio実装"""
+    from pydub import AudioSegment
+
+    os.makedirs(out_dir, exist_ok=True)
+    audio = AudioSegment.from_file(input_path)
+    chunk_ms = int(chunk_sec * 1000)
+    chunks = []
+    for i in range(0, len(audio), chunk_ms):
+        chunk = audio[i:i + chunk_ms]
+        chunk_path = os.path.join(out_dir, f"chunk_{i // chunk_ms:04d}.wav")
+        chunk.export(chunk_path, format="wav")
+        chunks.append(chunk_path)
+    return chunks
+
+
+def make_input(path: str, duration: float, sample_rate: int):
+    """1分の合成信号を繰り返して長時間のWAVを作成"""
+    import numpy as np
+    import soundfile as sf
+    from rvccli import synth
+
+    block, _ = synth.make_mixture(min(duration, 60.0), sample_rate, seed=0)
+    with sf.SoundFile(path, 'w', sample_rate, 1, 'PCM_16') as f:
+        remaining = int(duration * sample_rate)
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def run_variant(variant: str, input_path: str, chunk_sec: float) -> dict:
+    """1つの実装を実行して計測（子プロセス内で呼ばれる）"""
+    from rvccli import audio_utils
+
+    out_dir = tempfile.mkdtemp(prefix=f"bench_split_{variant}_")
+    try:
+        tracemalloc.start()
+        start = time.perf_counter()
+        if variant == 'pydub':
+            chunks = split_audio_pydub(input_path, out_dir, chunk_sec)
+        elif variant == 'soundfile':
+            chunks = audio_utils.split_audio(input_path, out_dir, chunk_sec)
+        elif variant == 'soundfile-threads':
+            chunks = audio_utils.split_audio(input_path, out_dir, chunk_sec, workers=4)
+        elif variant == 'soundfile-snap':
+            chunks = audio_utils.split_audio(input_path, out_dir, chunk_sec, snap_to_silence=True)
+        else:
+            raise ValueError(variant)
+        elapsed = time.perf_counter() - start
+        _, traced_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+    return {
+        'variant': variant,
+        'chunks': len(chunks),
+        'seconds': elapsed,
+        'chunks_per_sec': len(chunks) / elapsed,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'traced_peak_mb': traced_peak / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=3600.0, help='入力の長さ（秒）')
+    parser.add_argument('--sample-rate', type=int, default=32000)
+    parser.add_argument('--chunk-sec', type=float, default=12.0)
+    parser.add_argument('--variants', nargs='+', default=VARIANTS, choices=VARIANTS)
+    parser.add_argument('--input', help='既存のWAVを使う場合のパス')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_variant(args.child, args.input, args.chunk_sec)))
+        return
+
+    tmp_dir = None
+    input_path = args.input
+    if not input_path:
+        tmp_dir = tempfile.mkdtemp(prefix="bench_split_")
+        input_path = os.path.join(tmp_dir, "input.wav")
+        print(f"入力を生成中: {args.duration:.0f}秒, {args.sample_rate}Hz")
+        make_input(input_path, args.duration, args.sample_rate)
+
+    results = []
+    try:
+        for variant in args.variants:
+            cmd = [sys.executable, __file__, '--child', variant, '--input', input_path,
+                   '--chunk-sec', str(args.chunk_sec)]
+            out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True).stdout
+            results.append(json.loads(out.strip().splitlines()[-1]))
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    print(f"{'variant':<18} {'chunks':>6} {'time(s)':>8} {'chunks/s':>9} {'RSS(MB)':>8} {'traced(MB)':>10}")
+    for r in results:
+        print(f"{r['variant']:<18} {r['chunks']:>6} {r['seconds']:>8.2f} {r['chunks_per_sec']:>9.1f} "
+              f"{r['peak_rss_mb']:>8.1f} {r['traced_peak_mb']:>10.1f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
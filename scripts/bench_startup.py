@@ -0,0 +1,154 @@
+"""CLIの起動時間とコマンドごとのimportコストの計測（python -X importtime）
+
+各コマンドを別プロセスで起動し、起動から終了までの時間（中央値）と、-X importtime の出力から
+importの合計時間・累積時間の大きいモジュール・読み込まれた重い依存（numpy, scipy など）を表示する。
+--budget-msを超えたコマンドや、--forbidで指定した依存を読み込んだコマンドがあれば終了コード1を返す。
+
+    python scripts/bench_startup.py --repeat 5
+    python scripts/bench_startup.py --budget-ms 300 --forbid status=numpy --forbid=--help=numpy,rich
+"""
+import argparse
+import json
+import math
+import os
+import shlex
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# 読み込みに時間がかかる依存（トップレベルのモジュール名）
+HEAVY_MODULES = ('numpy', 'scipy', 'soundfile', 'pyloudnorm', 'webrtcvad', 'pydub', 'librosa',
+                 'requests', 'yaml', 'faiss', 'torch', 'rich')
+
+
+def write_inputs(root: str) -> dict:
+    """コマンドに渡す小さな入力（1秒の正弦波と学習ログ）"""
+    wav = os.path.join(root, 'tone.wav')
+    with wave.open(wav, 'wb') as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(32000)
+        wf.writeframes(b''.join(struct.pack('<h', int(8000 * math.sin(2 * math.pi * 220 * i / 32000)))
+                                for i in range(32000)))
+    log = os.path.join(root, 'train.log')
+    with open(log, 'w', encoding='utf-8') as f:
+        for step in range(0, 1000, 100):
+            f.write(f"2024-01-01 00:00:{step // 100:02d},000\tvoice\tINFO\t[{step}, 0.0001]\n")
+            f.write(f"2024-01-01 00:00:{step // 100:02d},000\tvoice\tINFO\tloss_disc=3.5, loss_gen=2.1, "
+                    f"loss_fm=5.0,loss_mel=17.2, loss_kl=1.2\n")
+    return {'wav': wav, 'log': log}
+
+
+def default_commands(inputs: dict) -> list:
+    return [
+        '--help',
+        'help',
+        f"status --log {inputs['log']}",
+        'prep --help',
+        'run --help',
+        f"info --wav {inputs['wav']} --vad-backend numpy --no-vad-cache",
+    ]
+
+
+def parse_importtime(stderr: str) -> list:
+    """-X importtime の出力を (モジュール名, 自身のμs, 累積μs, 深さ) のリストにする"""
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return modules
+
+
+def run_command(args: list, env: dict, importtime: bool = False):
+    cmd = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-m', 'rvccli'] + args
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          text=True)
+    return time.perf_counter() - start, proc.returncode, proc.stderr
+
+
+def measure(command: str, repeat: int, env: dict, top: int, forbidden=()) -> dict:
+    args = shlex.split(command)
+    _, returncode, stderr = run_command(args, env, importtime=True)
+    modules = parse_importtime(stderr)
+    walls = [run_command(args, env)[0] for _ in range(repeat)]
+    loaded = {name.split('.')[0] for name, _, _, _ in modules}
+    # 直接importされたモジュール（深さ0）の累積時間が大きい順
+    roots = sorted((m for m in modules if m[3] == 0), key=lambda m: m[2], reverse=True)
+    return {
+        'command': command,
+        'returncode': returncode,
+        'wall_ms': statistics.median(walls) * 1000,
+        'wall_min_ms': min(walls) * 1000,
+        'import_ms': sum(m[1] for m in modules) / 1000,
+        'modules': len(modules),
+        'heavy': [name for name in HEAVY_MODULES if name in loaded],
+        'forbidden': [name for name in forbidden if name in loaded],
+        'top': [{'module': name, 'cumulative_ms': cumulative / 1000} for name, _, cumulative, _ in roots[:top]],
+    }
+
+
+def parse_forbid(values: list) -> dict:
+    """「コマンド=モジュール,モジュール」の指定を {コマンドの最初の語: [モジュール]} にする"""
+    forbid = {}
+    for value in values:
+        command, _, modules = value.rpartition('=')
+        forbid.setdefault(command, []).extend(m for m in modules.split(',') if m)
+    return forbid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--command', action='append', dest='commands',
+                        help='計測するコマンド（rvccli以降の引数, 複数指定可, 既定: 主要なコマンド）')
+    parser.add_argument('--repeat', type=int, default=5, help='起動時間の計測回数（中央値を使う）')
+    parser.add_argument('--top', type=int, default=5, help='表示する累積時間の大きいモジュールの数')
+    parser.add_argument('--budget-ms', type=float, help='起動時間（中央値）の上限')
+    parser.add_argument('--forbid', action='append', default=[],
+                        help='読み込んではいけない依存（"コマンドの最初の語=モジュール,モジュール", 複数指定可）')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ, RVCCLI_CACHE_DIR=os.path.join(root, 'cache'))
+    env.pop('PYTHONPROFILEIMPORTTIME', None)
+    forbid = parse_forbid(args.forbid)
+    results = []
+    failures = []
+    try:
+        commands = args.commands or default_commands(write_inputs(root))
+        for command in commands:
+            result = measure(command, args.repeat, env, args.top, forbid.get(shlex.split(command)[0], []))
+            results.append(result)
+            print(f"{command[:60]:<60} {result['wall_ms']:7.0f}ms  import {result['import_ms']:6.0f}ms  "
+                  f"{result['modules']:4d}モジュール  終了コード {result['returncode']}")
+            print(f"    重い依存: {', '.join(result['heavy']) or 'なし'}")
+            for entry in result['top']:
+                print(f"    {entry['cumulative_ms']:8.1f}ms  {entry['module']}")
+            if args.budget_ms is not None and result['wall_ms'] > args.budget_ms:
+                failures.append(f"{command}: {result['wall_ms']:.0f}ms > {args.budget_ms:.0f}ms")
+            for module in result['forbidden']:
+                failures.append(f"{command}: {module} を読み込んでいます")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    for failure in failures:
+        print(f"NG: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""ストリーミング変換（rvccli stream）のブロック長・先読みごとの遅延ベンチマーク
+
+外部モデルの代わりに、入力をそのまま返して所定の実時間比だけ待つ変換関数を使い、
+入力をパイプへ実時間で書き込みながら変換して、アルゴリズム遅延・変換時間・到着から出力までの時間を表示する。
+出力が入力と一致するか（バッファリングとクロスフェードの検証）も確認する。
+
+    python scripts/bench_stream.py --seconds 10 --blocks 100 200 --lookaheads 0 50
+"""
+import argparse
+import io
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+def stand_in(rtf: float, sample_rate: int):
+    """入力をそのまま返し、区間の長さ x 実時間比だけ待つ変換関数"""
+    def convert(audio):
+        time.sleep(len(audio) / sample_rate * rtf)
+        return audio.copy()
+    return convert
+
+
+def feed(write_fd: int, data: bytes, bytes_per_sec: float, chunk_bytes: int):
+    """データをchunk_bytesずつ実時間で書き込む（音声の入力デバイスの代わり）"""
+    start = time.perf_counter()
+    with os.fdopen(write_fd, 'wb') as f:
+        for offset in range(0, len(data), chunk_bytes):
+            wait = start + offset / bytes_per_sec - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            f.write(data[offset:offset + chunk_bytes])
+            f.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--sample-rate', type=int, default=32000)
+    parser.add_argument('--blocks', type=int, nargs='+', default=[100, 200, 400], help='ブロック長（ミリ秒）')
+    parser.add_argument('--lookaheads', type=int, nargs='+', default=[0, 50], help='先読み（ミリ秒）')
+    parser.add_argument('--context-ms', type=int, default=300)
+    parser.add_argument('--crossfade-ms', type=int, default=20)
+    parser.add_argument('--rtf', type=float, default=0.3, help='変換関数の実時間比（区間の長さに対して）')
+    parser.add_argument('--no-realtime', action='store_true', help='入力を待たずに一度に流す（スループット測定）')
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    import numpy as np
+    from rvccli import synth, streaming
+    from rvccli.audio_utils import float_to_pcm
+
+    sr = args.sample_rate
+    audio, _ = synth.make_mixture(args.seconds, sr, seed=0)
+    data = float_to_pcm(audio)
+    reference = np.frombuffer(data, dtype='<i2')
+    ms = lambda v: int(sr * v / 1000)
+
+    results = []
+    print(f"[ストリーミング変換ベンチマーク] {args.seconds:.0f}秒, 文脈 {args.context_ms}ms, "
+          f"クロスフェード {args.crossfade_ms}ms, 実時間比 {args.rtf}")
+    for block_ms, lookahead_ms in itertools.product(args.blocks, args.lookaheads):
+        converter = streaming.StreamConverter(stand_in(args.rtf, sr), sr, ms(block_ms), ms(lookahead_ms),
+                                              ms(args.context_ms), ms(args.crossfade_ms))
+        read_fd, write_fd = os.pipe()
+        rate = float('inf') if args.no_realtime else sr * 2
+        # 入力デバイスのように10msずつ届ける
+        feeder = threading.Thread(target=feed, args=(write_fd, data, rate, ms(10) * 2), daemon=True)
+        with os.fdopen(read_fd, 'rb') as in_stream:
+            collected = io.BytesIO()
+            feeder.start()
+            stats = streaming.run_stream(in_stream, collected, converter)
+            feeder.join()
+        output = np.frombuffer(collected.getvalue(), dtype='<i2')
+        stats['output_match'] = bool(len(output) == len(reference) and np.array_equal(output, reference))
+        results.append(stats)
+
+        p, e = stats['process_ms'], stats['end_to_end_ms']
+        print(f"ブロック {block_ms:4d}ms / 先読み {lookahead_ms:3d}ms: 遅延 {stats['algorithmic_latency_ms']:6.1f}ms, "
+              f"変換 p50 {p['p50']:6.1f}ms p99 {p['p99']:6.1f}ms, 到着→出力 p50 {e['p50']:6.1f}ms "
+              f"p99 {e['p99']:6.1f}ms, 超過 {stats['overruns']}, 一致 {stats['output_match']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""VADバックエンドの速度と判定一致率のベンチマーク
+
+合成した音声バースト+無音の混合信号で、各バックエンドの処理時間と
+正解マスクに対する精度、バックエンド間の一致率を表示する。
+
+    python scripts/bench_vad.py --duration 600 --noise-db -60 -45 -30
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from rvccli import audio_utils, synth  # noqa: E402
+
+# (表示名, backend, energy_gate_db)
+VARIANTS = [
+    ('webrtc', 'webrtc', audio_utils.VAD_ENERGY_GATE_DB),
+    ('webrtc-nogate', 'webrtc', None),
+    ('numpy', 'numpy', None),
+]
+
+
+def score(mask: np.ndarray, truth: np.ndarray) -> dict:
+    """正解マスクに対する正解率・適合率・再現率"""
+    tp = np.sum(mask & truth)
+    precision = tp / max(np.sum(mask), 1)
+    recall = tp / max(np.sum(truth), 1)
+    return {
+        'accuracy': float(np.mean(mask == truth)),
+        'precision': float(precision),
+        'recall': float(recall),
+    }
+
+
+def run(duration: float, sample_rate: int, noise_levels, aggressiveness: int, seed: int) -> list:
+    results = []
+    for i, noise_db in enumerate(noise_levels):
+        audio, truth = synth.make_mixture(duration, sample_rate, noise_db=noise_db, seed=seed + i)
+        # 実際の前処理と同じく16bit量子化した信号で比較する
+        audio = audio_utils.int16_to_float(audio_utils.float_to_int16(audio))
+
+        masks = {}
+        for name, backend, gate in VARIANTS:
+            start = time.perf_counter()
+            mask = audio_utils.compute_speech_mask(audio, sample_rate, aggressiveness, backend, gate)
+            elapsed = time.perf_counter() - start
+            masks[name] = mask
+            results.append({
+                'noise_db': noise_db,
+                'backend': name,
+                'seconds': elapsed,
+                'realtime_factor': elapsed / duration,
+                **score(mask, truth),
+            })
+
+        names = [name for name, _, _ in VARIANTS]
+        for a in range(len(names)):
+            for b in range(a + 1, len(names)):
+                results.append({
+                    'noise_db': noise_db,
+                    'agreement': f"{names[a]} vs {names[b]}",
+                    'ratio': float(np.mean(masks[names[a]] == masks[names[b]])),
+                })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=600.0, help='合成信号の長さ（秒）')
+    parser.add_argument('--sample-rate', type=int, default=32000)
+    parser.add_argument('--noise-db', type=float, nargs='+', default=[-60.0, -45.0, -30.0],
+                        help='無音区間のノイズレベル（dBFS）')
+    parser.add_argument('--aggressiveness', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='結果をJSONで保存するパス')
+    args = parser.parse_args()
+
+    results = run(args.duration, args.sample_rate, args.noise_db, args.aggressiveness, args.seed)
+
+    print(f"[VADベンチマーク] 長さ: {args.duration:.0f}秒, {args.sample_rate}Hz, "
+          f"アグレッシブネス: {args.aggressiveness}")
+    print(f"{'noise':>7} {'backend':<15} {'time(s)':>8} {'xRT':>8} {'acc':>6} {'prec':>6} {'rec':>6}")
+    for r in results:
+        if 'backend' in r:
+            print(f"{r['noise_db']:>7.0f} {r['backend']:<15} {r['seconds']:>8.3f} "
+                  f"{1.0 / max(r['realtime_factor'], 1e-9):>8.0f} "
+                  f"{r['accuracy']:>6.3f} {r['precision']:>6.3f} {r['recall']:>6.3f}")
+    print()
+    print("[バックエンド間の一致率]")
+    for r in results:
+        if 'agreement' in r:
+            print(f"{r['noise_db']:>7.0f} {r['agreement']:<32} {r['ratio']:.3f}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
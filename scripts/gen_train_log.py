@@ -0,0 +1,125 @@
+"""学習ログ（Mangio-RVC-Forkのtrain.logの書式）の合成と、status の読み込み時間の比較
+
+ステップ・損失・エポック・チェックポイントの行を書き出す。--size-mbで詰め物の行を加えて巨大なログを作り、
+--benchでログ全体を読む従来の方法と、末尾だけを読む方法（rvccli status）の時間を比べる。
+--liveでは実時間で追記し続ける（rvccli status --follow の確認用, --stall-afterで途中から止める）。
+
+    python scripts/gen_train_log.py --out /tmp/train.log --steps 20000 --size-mb 2048 --bench
+    python scripts/gen_train_log.py --out /tmp/train.log --steps 2000 --live --rate 20 --stall-after 1000
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+FILLER = "\tvoice\tDEBUG\t" + "x" * 200 + "\n"
+
+
+def stamp(t: float) -> str:
+    return datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S,') + f"{int(t * 1000) % 1000:03d}"
+
+
+def step_lines(step: int, t: float, steps_per_epoch: int, save_every: int, out_dir: str):
+    """1ステップ分のログ行（エポックの区切り・チェックポイントを含む）"""
+    epoch = step // steps_per_epoch + 1
+    loss = 40.0 / (1 + step / 1000)
+    ts = stamp(t)
+    lines = []
+    if step % steps_per_epoch == 0:
+        lines.append(f"{ts}\tvoice\tINFO\tTrain Epoch: {epoch} [0%]\n")
+    lines.append(f"{ts}\tvoice\tINFO\t[{step}, 0.0001]\n")
+    lines.append(f"{ts}\tvoice\tINFO\tloss_disc={3.5 + loss / 40:.3f}, loss_gen={2.0 + loss / 20:.3f}, "
+                 f"loss_fm={5 + loss / 4:.3f},loss_mel={15 + loss:.3f}, loss_kl={1 + loss / 10:.3f}\n")
+    if step and step % save_every == 0:
+        lines.append(f"{ts}\tvoice\tINFO\tSaving model and optimizer state at epoch {epoch} to "
+                     f"{out_dir}/G_{step}.pth\n")
+    if (step + 1) % steps_per_epoch == 0:
+        lines.append(f"{ts}\tvoice\tINFO\t====> Epoch: {epoch} [{ts}]\n")
+    return lines
+
+
+def generate(args):
+    """ログ全体を一度に書き出す（日時は現在からさかのぼって--rateの速度になるようにする）"""
+    filler_per_step = 0
+    if args.size_mb:
+        base = sum(len(l) for l in step_lines(1, 0, args.steps_per_epoch, args.save_every, '.')) + 24
+        filler_per_step = max(0, int(args.size_mb * (1 << 20) / args.steps / (len(FILLER) + 24)) -
+                              base // (len(FILLER) + 24))
+    start = time.time() - args.steps / args.rate
+    with open(args.out, 'w', encoding='utf-8') as f:
+        for step in range(args.steps):
+            t = start + step / args.rate
+            f.writelines(step_lines(step, t, args.steps_per_epoch, args.save_every, os.path.dirname(args.out)))
+            if filler_per_step:
+                f.write((stamp(t) + FILLER) * filler_per_step)
+
+
+def live(args):
+    """--rateの速度で追記し続ける"""
+    with open(args.out, 'a', encoding='utf-8') as f:
+        start = time.time()
+        for step in range(args.steps):
+            if args.stall_after and step >= args.stall_after:
+                print(f"ステップ{step}で停止します（ログは書き続けない）", flush=True)
+                time.sleep(3600)
+                return
+            wait = start + step / args.rate - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            f.writelines(step_lines(step, time.time(), args.steps_per_epoch, args.save_every,
+                                    os.path.dirname(args.out)))
+            f.flush()
+
+
+def bench(path: str):
+    from rvccli import train_monitor
+
+    def timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        return time.perf_counter() - start, result
+
+    def readlines_tail():
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.readlines()[-10:]
+
+    size_mb = os.path.getsize(path) / (1 << 20)
+    old_sec, old = timed(readlines_tail)
+    tail_sec, tail = timed(lambda: train_monitor.tail_lines(path, 10))
+    monitor = train_monitor.TrainingMonitor(total_steps=0)
+    recent_sec, _ = timed(lambda: train_monitor.read_recent(path, monitor))
+    summary = monitor.summary()
+    print(f"ログ: {size_mb:.0f}MB")
+    print(f"全体を読み込んで末尾10行: {old_sec * 1000:9.1f}ms")
+    print(f"末尾から10行:           {tail_sec * 1000:9.1f}ms  一致: {[l.rstrip() for l in old] == tail}")
+    print(f"末尾{train_monitor.INITIAL_TAIL_BYTES >> 20}MBのイベント集計:   {recent_sec * 1000:9.1f}ms  "
+          f"ステップ {summary['step']}, {summary['steps_per_sec'] or 0:.2f} steps/s, {summary['events']}件")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--steps-per-epoch', type=int, default=200)
+    parser.add_argument('--save-every', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=5.0, help='学習速度（steps/s）')
+    parser.add_argument('--size-mb', type=float, default=0, help='詰め物の行を加えたおおよそのログの大きさ')
+    parser.add_argument('--live', action='store_true', help='実時間で追記し続ける')
+    parser.add_argument('--stall-after', type=int, default=0, help='--liveでこのステップ以降の追記を止める')
+    parser.add_argument('--bench', action='store_true', help='書き出したログの読み込み時間を比べる')
+    args = parser.parse_args()
+
+    if args.live:
+        live(args)
+        return
+    generate(args)
+    if args.bench:
+        bench(args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Mangio-RVC-Forkのextract_feature.pyの代わりに使うテスト用スクリプト
+
+データセット内のWAVごとにF0（2b-f0nsf: 連続値 / 2a_f0: 量子化）と特徴量（3_feature768）を書き出す。
+RVCと同じく、F0ファイルが既にある音声はF0の抽出を省く。
+環境変数 STUB_EXTRACT_FAIL を設定すると、名前にその文字列を含むファイルで異常終了する（再実行の確認用）。
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_f0 import estimate_f0  # noqa: E402
+
+F0_SAMPLE_RATE = 16000
+HOP_SIZE = 160
+OUTPUT_DIRS = ("2a_f0", "2b-f0nsf", "3_feature768")
+
+
+def coarse(f0):
+    mel_min, mel_max = 1127 * np.log(1 + 50 / 700), 1127 * np.log(1 + 1100 / 700)
+    mel = 1127 * np.log(1 + f0.astype(np.float64) / 700)
+    voiced = mel > 0
+    mel[voiced] = (mel[voiced] - mel_min) * 254 / (mel_max - mel_min) + 1
+    return np.rint(np.clip(mel, 1, 255)).astype(np.int64)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dataset', required=True)
+    parser.add_argument('--f0_method', default='rmvpe')
+    args = parser.parse_args()
+
+    for name in OUTPUT_DIRS:
+        os.makedirs(os.path.join(args.dataset, name), exist_ok=True)
+
+    extracted = skipped = 0
+    for root, dirs, files in os.walk(args.dataset):
+        dirs[:] = sorted(d for d in dirs if d not in OUTPUT_DIRS)
+        for wav in sorted(f for f in files if f.lower().endswith('.wav')):
+            path = os.path.join(root, wav)
+            if os.environ.get("STUB_EXTRACT_FAIL") and os.environ["STUB_EXTRACT_FAIL"] in wav:
+                print(f"抽出に失敗しました: {path}", file=sys.stderr)
+                sys.exit(1)
+            name = os.path.relpath(path, args.dataset).replace(os.sep, '_') + ".npy"
+            f0_path = os.path.join(args.dataset, "2b-f0nsf", name)
+            coarse_path = os.path.join(args.dataset, "2a_f0", name)
+            audio, sr = sf.read(path, dtype='float32')
+            # 16kHzに線形補間でリサンプル
+            n = int(len(audio) * F0_SAMPLE_RATE / sr)
+            audio = np.interp(np.arange(n) * sr / F0_SAMPLE_RATE, np.arange(len(audio)), audio)
+
+            if os.path.exists(f0_path) and os.path.exists(coarse_path):
+                skipped += 1
+            else:
+                f0 = estimate_f0(audio, F0_SAMPLE_RATE, HOP_SIZE)
+                np.save(f0_path, f0)
+                np.save(coarse_path, coarse(f0))
+                extracted += 1
+
+            # 特徴量は軽い処理（フレームごとのエネルギーを768次元に複製）で代用する
+            frames = len(audio) // 320 + 1
+            energy = np.add.reduceat(np.square(audio), np.arange(0, len(audio), 320))[:frames]
+            np.save(os.path.join(args.dataset, "3_feature768", name),
+                    np.repeat(energy[:, None], 768, axis=1).astype(np.float32))
+
+    print(f"F0抽出: {extracted}件 / スキップ: {skipped}件")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""Mangio-RVC-Forkのinfer.pyの代わりに使うテスト用スクリプト
+
+rvc_wrapper.inferが組み立てる引数を受け取り、毎回モデルを読み込んでから変換する（従来の1回1プロセスの経路）。
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import rvccli_backend  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', required=True)
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--index')
+    parser.add_argument('--transpose', type=int, default=0)
+    parser.add_argument('--f0_method', default='rmvpe')
+    parser.add_argument('--rms_mix_rate', type=float, default=0.25)
+    parser.add_argument('--filter_radius', type=int, default=3)
+    parser.add_argument('--resample_sr', type=int, default=0)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    model = rvccli_backend.load(args.model, args.index)
+    load_sec = time.perf_counter() - start
+    params = {k: getattr(args, k) for k in ('transpose', 'f0_method', 'rms_mix_rate', 'filter_radius', 'resample_sr')}
+    rvccli_backend.convert(model, args.input, args.out, params)
+    print(f"load: {load_sec:.2f}s, convert: {time.perf_counter() - start - load_sec:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
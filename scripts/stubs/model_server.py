@@ -0,0 +1,127 @@
+"""モデル配布サーバーの代わりに使うテスト用HTTPサーバー
+
+ディレクトリのファイルをRange（bytes=N-）対応で配信する。帯域の制限と、
+指定したバイト数を送ったところで接続を切る動作（途中で切れたダウンロードの再現）ができる。
+publishedを渡すと、Hugging Faceと同じようにX-Linked-Etag（SHA-256）とX-Linked-Sizeを返す。
+
+    python scripts/stubs/model_server.py --dir /tmp/models_src --port 8765 --drop-after 5000000
+"""
+import argparse
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(root: str, rate_mbps: float = 0.0, drop_after: int = 0, no_range: bool = False,
+                 published: dict = None):
+    """drop_afterは各ファイルの最初の応答だけに適用する（再開した要求は最後まで送る）
+
+    publishedはファイル名 -> (SHA-256, サイズ) で、実際の内容と違う値を渡せば改ざんを再現できる
+    """
+    dropped = set()
+    lock = threading.Lock()
+    stats = {'requests': 0, 'range_requests': 0, 'bytes': 0}
+
+    class Handler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=root, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self._serve(send_body=True)
+
+        def do_HEAD(self):
+            self._serve(send_body=False)
+
+        def _serve(self, send_body: bool):
+            path = self.translate_path(self.path)
+            if not os.path.isfile(path):
+                self.send_error(404)
+                return
+            size = os.path.getsize(path)
+            start = 0
+            header = self.headers.get('Range')
+            with lock:
+                stats['requests'] += 1
+                stats['range_requests'] += bool(header)
+            if header and not no_range and header.startswith('bytes='):
+                start = int(header[6:].split('-')[0])
+                if start >= size:
+                    self.send_response(416)
+                    self.send_header('Content-Range', f'bytes */{size}')
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{size - 1}/{size}')
+            else:
+                self.send_response(200)
+            self.send_header('Content-Length', str(size - start))
+            self.send_header('Accept-Ranges', 'bytes')
+            linked = (published or {}).get(os.path.basename(path))
+            if linked:
+                self.send_header('X-Linked-Etag', f'"{linked[0]}"')
+                self.send_header('X-Linked-Size', str(linked[1]))
+            self.end_headers()
+            if not send_body:
+                return
+
+            limit = size - start
+            with lock:
+                if drop_after and path not in dropped:
+                    dropped.add(path)
+                    limit = min(limit, drop_after)
+            sent = 0
+            began = time.perf_counter()
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while sent < limit:
+                    block = f.read(min(256 * 1024, limit - sent))
+                    if not block:
+                        break
+                    self.wfile.write(block)
+                    sent += len(block)
+                    if rate_mbps:
+                        wait = began + sent / (rate_mbps * (1 << 20)) - time.perf_counter()
+                        if wait > 0:
+                            time.sleep(wait)
+            with lock:
+                stats['bytes'] += sent
+            if sent < size - start:
+                # 途中で接続を切る
+                self.close_connection = True
+                self.connection.shutdown(2)
+
+    Handler.stats = stats
+    return Handler
+
+
+def serve(root: str, port: int = 0, **kwargs):
+    """バックグラウンドでサーバーを起動し、(サーバー, ハンドラ)を返す（port=0で空いているポート）"""
+    handler = make_handler(root, **kwargs)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dir', required=True)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--rate-mbps', type=float, default=0.0, help='1接続あたりの帯域（MB/s, 0=無制限）')
+    parser.add_argument('--drop-after', type=int, default=0, help='各ファイルの最初の応答をこのバイト数で切る')
+    parser.add_argument('--no-range', action='store_true', help='Rangeを無視して常に全体を返す')
+    args = parser.parse_args()
+    server, _ = serve(args.dir, args.port, rate_mbps=args.rate_mbps, drop_after=args.drop_after,
+                      no_range=args.no_range)
+    print(f"http://127.0.0.1:{server.server_address[1]}/ で {args.dir} を配信しています")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
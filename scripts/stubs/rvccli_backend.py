@@ -0,0 +1,71 @@
+"""Mangio-RVC-Forkの代わりに使うテスト用の推論バックエンド
+
+モデル読み込みと変換の所要時間だけを模擬する（変換は入力に音程シフト相当のリサンプルをかけて書き出す）。
+RVCCLI_FORK_DIR=scripts/stubs でrvccliから利用できる。
+
+    STUB_LOAD_SEC: モデル読み込みにかかる秒数（既定: 3.0）
+    STUB_RTF: 変換にかかる時間の実時間比（既定: 0.05）
+    STUB_F0_RTF: F0抽出にかかる時間の実時間比（既定: 0.2）
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from stub_f0 import estimate_f0  # noqa: E402
+
+# 変換は待機のみで状態を持たないため、並行して呼び出してよい
+THREAD_SAFE = True
+
+
+def load(model_path, index_path):
+    """モデルとインデックスを読み込む（ファイルを読み、所定の時間待つ）"""
+    time.sleep(float(os.environ.get("STUB_LOAD_SEC", "3.0")))
+    model = {'model_path': model_path, 'index_path': index_path, 'weights': b''}
+    with open(model_path, 'rb') as f:
+        model['weights'] = f.read()
+    if index_path:
+        with open(index_path, 'rb') as f:
+            model['index'] = f.read()
+    return model
+
+
+def compute_f0(input_wav, f0_method, hop_size, sample_rate):
+    """F0を求める（rvccliがF0キャッシュに保存し、次回からはparams['f0']として渡す）"""
+    audio, sr = sf.read(input_wav, dtype='float32')
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    n = int(len(audio) * sample_rate / sr)
+    audio = np.interp(np.arange(n) * sr / sample_rate, np.arange(len(audio)), audio)
+    return estimate_f0(audio, sample_rate, hop_size)
+
+
+def convert(model, input_wav, out_path, params):
+    """音声を変換して書き出す"""
+    audio, sample_rate = sf.read(input_wav, dtype='float32')
+    start = time.perf_counter()
+
+    ratio = 2.0 ** (params.get('transpose', 0) / 12.0)
+    if ratio != 1.0:
+        positions = np.arange(0, len(audio), ratio)
+        audio = np.interp(positions, np.arange(len(audio)), audio if audio.ndim == 1 else audio.mean(axis=1))
+
+    # 実時間比に合わせて待つ
+    remaining = len(audio) / sample_rate * float(os.environ.get("STUB_RTF", "0.05")) - (time.perf_counter() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    sf.write(out_path, audio.astype(np.float32), params.get('resample_sr') or sample_rate, subtype='PCM_16')
+
+
+def convert_block(model, audio, sample_rate, params):
+    """ストリーミング変換用: 1区間の配列を変換して同じ長さの配列を返す（入力をそのまま返す）"""
+    start = time.perf_counter()
+    out = np.array(audio, dtype=np.float32)
+    remaining = len(audio) / sample_rate * float(os.environ.get("STUB_RTF", "0.05")) - (time.perf_counter() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+    return out
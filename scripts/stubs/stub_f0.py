@@ -0,0 +1,34 @@
+"""テスト用スタブ共通のF0推定（自己相関による簡易推定）
+
+本来のF0抽出（rmvpe/crepeなど）の重さは、環境変数 STUB_F0_RTF（実時間比, 既定: 0.2）の待機で模擬する。
+"""
+import os
+import time
+
+import numpy as np
+
+
+def estimate_f0(audio, sample_rate, hop_size=160, f0_min=50.0, f0_max=1100.0):
+    """hop_sizeサンプルごとのF0（Hz, 無声は0）"""
+    start = time.perf_counter()
+    audio = np.asarray(audio, dtype=np.float32)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    frame = hop_size * 4
+    n_frames = len(audio) // hop_size + 1
+    padded = np.pad(audio, (frame // 2, frame))
+    idx = np.arange(frame)[None, :] + hop_size * np.arange(n_frames)[:, None]
+    frames = padded[idx] * np.hanning(frame).astype(np.float32)
+
+    # FFTで自己相関を求め、探索範囲で最大のラグをF0とする
+    spec = np.fft.rfft(frames, 2 * frame)
+    corr = np.fft.irfft(np.abs(spec) ** 2)[:, :frame]
+    lo, hi = int(sample_rate / f0_max), min(int(sample_rate / f0_min), frame - 1)
+    lag = lo + np.argmax(corr[:, lo:hi], axis=1)
+    peak = corr[np.arange(n_frames), lag] / np.maximum(corr[:, 0], 1e-9)
+    f0 = np.where((peak > 0.3) & (corr[:, 0] > 1e-4), sample_rate / lag, 0.0).astype(np.float32)
+
+    remaining = len(audio) / sample_rate * float(os.environ.get("STUB_F0_RTF", "0.2")) - (time.perf_counter() - start)
+    if remaining > 0:
+        time.sleep(remaining)
+    return f0
@@ -0,0 +1,34 @@
+"""Mangio-RVC-Forkのtrain.pyの代わりに使うテスト用スクリプト
+
+データセットの特徴量を読み、<out>/stub/G_<steps>.pth（データセットから決まる内容）を書き出す。
+環境変数 STUB_TRAIN_SEC で所要時間（秒）を指定する。
+"""
+import argparse
+import hashlib
+import os
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    for name in ('--dataset', '--sr', '--f0_method', '--batch', '--steps', '--fp16', '--out',
+                 '--index_rate', '--save_every_n'):
+        parser.add_argument(name, required=True)
+    args = parser.parse_args()
+
+    digest = hashlib.sha256(f"{args.sr}:{args.f0_method}:{args.steps}".encode())
+    feature_dir = os.path.join(args.dataset, '3_feature768')
+    for name in sorted(os.listdir(feature_dir)):
+        with open(os.path.join(feature_dir, name), 'rb') as f:
+            digest.update(f.read())
+    time.sleep(float(os.environ.get('STUB_TRAIN_SEC', '0')))
+
+    out_dir = os.path.join(args.out, 'stub')
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, f"G_{args.steps}.pth"), 'wb') as f:
+        f.write(digest.digest() * 1024)
+    print(f"学習が完了しました: {out_dir}")
+
+
+if __name__ == '__main__':
+    main()